@@ -10,6 +10,11 @@ from app.database import Base, engine, ensure_no_realiza_column
 from app.limiter import limiter
 from app.models import db_models  # noqa: F401 - para registrar modelos
 from app.routers import auth, catalog, generator, proposal, prices
+from app.services.generation_jobs import generation_jobs
+from app.services.price_import_jobs import price_import_jobs
+from app.services.provincia_max_service import ensure_provincia_max_prices
+from app.services.render_pool import render_pool
+from app.utils.compression import CompressionMiddleware
 
 
 def _get_cors_origins():
@@ -25,8 +30,12 @@ async def lifespan(app: FastAPI):
     """Eventos de inicio/fin de la aplicación."""
     Base.metadata.create_all(bind=engine)
     ensure_no_realiza_column()  # migración: columna no_realiza en prices (evita 500 en list)
+    ensure_provincia_max_prices()  # tabla materializada de máximos provincia al día
+    render_pool.start()  # workers de render (RENDER_WORKERS > 0) con la plantilla precargada
     yield
-    # cleanup si hiciera falta
+    generation_jobs.shutdown()
+    price_import_jobs.shutdown()
+    render_pool.shutdown()
 
 
 app = FastAPI(title="Cotizador EMOs API", lifespan=lifespan)
@@ -40,6 +49,8 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# gzip/brotli para respuestas JSON grandes (catálogo, listado de precios); umbral COMPRESSION_MIN_SIZE
+app.add_middleware(CompressionMiddleware)
 
 
 @app.get("/")
@@ -59,6 +59,28 @@ class Price(Base):
     )
 
 
+class ProvinciaMaxPrice(Base):
+    """Máximo por prueba entre todas las sedes en provincia (clinic_id NOT NULL).
+    Tabla materializada: la mantienen las escrituras de precios (ver provincia_max_service)."""
+    __tablename__ = "provincia_max_prices"
+    test_id = Column(Integer, ForeignKey("tests.id"), primary_key=True)
+    ingreso = Column(Float, nullable=False, default=0)
+    periodico = Column(Float, nullable=False, default=0)
+    retiro = Column(Float, nullable=False, default=0)
+
+
+class CatalogChange(Base):
+    """Registro de cambios del catálogo (delta-sync). id = revisión, monótona creciente.
+    entity: 'test' | 'clinic' | 'price' | 'catalog' (catalog/reset = cambio masivo, pedir snapshot)."""
+    __tablename__ = "catalog_changes"
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    entity = Column(String(16), nullable=False)
+    op = Column(String(16), nullable=False)  # 'upsert' | 'delete' | 'reset'
+    test_id = Column(Integer, nullable=True, index=True)  # sin FK: la prueba puede haberse borrado
+    clinic_id = Column(Integer, nullable=True)
+    created_at = Column(String(32), nullable=False)
+
+
 class AuditLog(Base):
     """Auditoría: generación de cotización (y opcional guardado de protocolo)."""
     __tablename__ = "audit_log"
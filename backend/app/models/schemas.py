@@ -1,4 +1,4 @@
-from typing import List, Literal, Optional, Dict
+from typing import List, Literal, Optional, Dict, Union
 from pydantic import BaseModel
 
 PriceType = Literal['ingreso','periodico','retiro']
@@ -42,3 +42,43 @@ class GenerationRequest(BaseModel):
     clinics: Optional[List[str]] = None      # clínicas de Provincia para totales por clínica
     clinic_totals: Optional[List[ClinicTotal]] = None  # calculado en backend si Provincia + clinics
     margin: Optional[float] = 20.0           # margen % para Provincia
+    # {prueba: {sede: {tipo: precio}}} para la comparación del XLSX; calculado en backend si hay clinics
+    clinic_prices: Optional[Dict[str, Dict[str, Dict[PriceType, float]]]] = None
+
+
+class BatchRecipient(BaseModel):
+    """Portada de una propuesta del lote; ejecutivo/puesto opcionales (si no, los del lote)."""
+    company: str
+    recipient: str
+    proposal_number: str
+    executive: Optional[str] = None
+    executive_title: Optional[str] = None
+
+
+class BatchGenerationRequest(BaseModel):
+    """Mismas pruebas/protocolos cotizados a varias empresas: una propuesta por destinatario."""
+    executive: str
+    executive_title: Optional[str] = None
+    location: str
+    selections: List[Selection]
+    protocols: List[Protocol]
+    images: List[ImageCfg] = []
+    clinics: Optional[List[str]] = None
+    clinic_totals: Optional[List[ClinicTotal]] = None
+    margin: Optional[float] = 20.0
+    recipients: List[BatchRecipient]
+
+
+class SimulationItem(BaseModel):
+    """Prueba de la selección a simular (mismos campos que Selection para el total)."""
+    name: str
+    testId: Optional[int] = None
+    types: List[PriceType]
+    classification: Optional[str] = None
+    overrides: Optional[Dict[PriceType, float]] = None
+
+
+class SimulationRequest(BaseModel):
+    selections: List[SimulationItem]
+    margins: List[float] = [20.0]                        # margen % (mínimo efectivo 20)
+    clinics: Union[List[str], Literal["all"]] = "all"   # sedes provincia o "all"
@@ -1,8 +1,22 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from typing import List
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 from pydantic import BaseModel
 
 from app.dependencies import require_user
-from app.services.catalog_service import get_catalog, get_clinics, get_clinics_with_ids, create_clinic
+from app.models.schemas import SimulationRequest
+from app.services.price_matrix import MATRIX_AVAILABLE, simulate_quote
+from app.utils.http_cache import compute_etag, not_modified
+from app.utils.responses import json_response
+from app.services.catalog_service import (
+    get_catalog,
+    get_catalog_cache_stats,
+    get_catalog_changes,
+    get_catalogs_bulk,
+    get_clinics,
+    get_clinics_with_ids,
+    create_clinic,
+)
 
 router = APIRouter()
 
@@ -11,28 +25,106 @@ class CreateClinicBody(BaseModel):
     name: str
 
 
+CATALOG_TABLES_DEPS = ("tests", "clinics", "prices")
+
+
 @router.get("")
 def fetch_catalog(
+    request: Request,
+    response: Response,
     location: str = Query(..., description="Lima = sede Lima | Provincia = sedes en provincia"),
     clinic: str | None = Query(None, description="Sede en provincia (nombre clínica)"),
     margin: float | None = Query(None, ge=0, description="Margen % para sedes en provincia"),
     _: tuple = Depends(require_user),
 ):
-    """Catálogo según sede: Lima (sede Lima) o Provincia (sedes en provincia, por clínica)."""
+    """Catálogo según sede: Lima (sede Lima) o Provincia (sedes en provincia, por clínica).
+    Responde 304 si If-None-Match coincide con el ETag actual."""
+    if location not in ("Lima", "Provincia"):
+        raise HTTPException(status_code=400, detail="Ubicación no válida.")
+    etag = compute_etag(CATALOG_TABLES_DEPS, "catalog", location, clinic or "", margin or 0.0)
+    cached = not_modified(request, response, etag)
+    if cached is not None:
+        return cached
+    try:
+        return json_response({"catalog": get_catalog(location, clinic, margin or 0.0)}, response)
+    except Exception:
+        raise HTTPException(status_code=500, detail="Error al cargar el catálogo.")
+
+
+@router.get("/bulk")
+def fetch_catalogs_bulk(
+    request: Request,
+    response: Response,
+    clinics: List[str] = Query(..., description="Sedes en provincia (repetir el parámetro por sede)"),
+    location: str = Query("Provincia", description="Lima = sede Lima | Provincia = sedes en provincia"),
+    margin: float | None = Query(None, ge=0, description="Margen % para sedes en provincia"),
+    _: tuple = Depends(require_user),
+):
+    """Catálogos de varias sedes en una sola llamada: { catalogs: { sede: catálogo } }."""
     if location not in ("Lima", "Provincia"):
         raise HTTPException(status_code=400, detail="Ubicación no válida.")
+    etag = compute_etag(CATALOG_TABLES_DEPS, "bulk", location, tuple(clinics), margin or 0.0)
+    cached = not_modified(request, response, etag)
+    if cached is not None:
+        return cached
     try:
-        return {"catalog": get_catalog(location, clinic, margin or 0.0)}
+        return json_response({"catalogs": get_catalogs_bulk(location, clinics, margin or 0.0)}, response)
     except Exception:
         raise HTTPException(status_code=500, detail="Error al cargar el catálogo.")
 
 
+@router.get("/changes")
+def fetch_catalog_changes(
+    since: int = Query(0, ge=0, description="Revisión ya conocida por el cliente"),
+    location: str = Query(..., description="Lima = sede Lima | Provincia = sedes en provincia"),
+    clinic: str | None = Query(None, description="Sede en provincia (nombre clínica)"),
+    margin: float | None = Query(None, ge=0, description="Margen % para sedes en provincia"),
+    _: tuple = Depends(require_user),
+):
+    """Delta-sync: pruebas actualizadas/eliminadas desde la revisión since (o snapshot completo si full=True)."""
+    if location not in ("Lima", "Provincia"):
+        raise HTTPException(status_code=400, detail="Ubicación no válida.")
+    try:
+        return json_response(get_catalog_changes(since, location, clinic, margin or 0.0))
+    except Exception:
+        raise HTTPException(status_code=500, detail="Error al cargar el catálogo.")
+
+
+@router.post("/simulate")
+def simulate(body: SimulationRequest, _: tuple = Depends(require_user)):
+    """What-if para Provincia: totales de la selección para cada margen × sede en una pasada,
+    excluyendo C/R/A como en la cotización. Filas ordenadas por total."""
+    if not MATRIX_AVAILABLE:
+        raise HTTPException(status_code=500, detail="Simulación no disponible (falta numpy).")
+    if not body.margins:
+        raise HTTPException(status_code=400, detail="Indica al menos un margen.")
+    if any(m < 0 for m in body.margins):
+        raise HTTPException(status_code=400, detail="El margen no puede ser negativo.")
+    clinics = None if body.clinics == "all" else body.clinics
+    try:
+        return simulate_quote(body.selections, clinics, body.margins)
+    except Exception:
+        raise HTTPException(status_code=500, detail="Error al simular la cotización.")
+
+
+@router.get("/cache-stats")
+def catalog_cache_stats(_: tuple = Depends(require_user)):
+    """Contadores de la caché de catálogo: revisión, entradas, hits, misses, evictions."""
+    return get_catalog_cache_stats()
+
+
 @router.get("/clinics")
 def list_clinics(
+    request: Request,
+    response: Response,
     with_ids: bool = Query(False, description="Si True, devuelve [{ id, name }]"),
     _: tuple = Depends(require_user),
 ):
     """Lista las clínicas. with_ids=True devuelve [{ id, name }] para selector múltiple."""
+    etag = compute_etag(("clinics",), "clinics", with_ids)
+    cached = not_modified(request, response, etag)
+    if cached is not None:
+        return cached
     try:
         if with_ids:
             return {"clinics": get_clinics_with_ids()}
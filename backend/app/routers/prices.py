@@ -1,16 +1,33 @@
 """API: descarga de plantilla XLSX, importación y listado/edición 1x1 de precios."""
 import io
-from typing import List, Dict, Any, Optional, Literal
+import os
+from typing import List, Optional, Literal
 
-from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, Query
-from fastapi.responses import StreamingResponse
+from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, Query, Request, Response
+from fastapi.responses import FileResponse, StreamingResponse
 from pydantic import BaseModel
 from sqlalchemy.orm import Session
 
 from app.database import get_db
 from app.dependencies import require_user
 from app.models.db_models import Test, Clinic, Price
-from app.services.price_import_service import import_prices_from_rows, validate_import_rows
+from app.services.catalog_cache import bump_catalog_revision
+from app.services.catalog_changes_service import record_catalog_change
+from app.services.provincia_max_service import refresh_provincia_max
+from app.services.price_import_jobs import ImportQueueFull, price_import_jobs
+from app.services.price_import_service import (
+    ImportFileError,
+    import_prices_from_xlsx,
+    PREVIEW_DIFF_LIMIT,
+    iter_xlsx_rows,
+    preview_import_rows,
+    spool_to_temp,
+    spooled_upload,
+)
+from app.services.price_upsert_service import PriceCell, apply_price_cells
+from app.services.test_search import get_search_index
+from app.utils.http_cache import compute_etag, not_modified
+from app.utils.responses import json_response
 
 try:
     from openpyxl import Workbook
@@ -20,6 +37,9 @@ except ImportError:
 
 router = APIRouter()
 
+PRICES_BULK_MAX_CELLS = int(os.getenv("PRICES_BULK_MAX_CELLS", "5000"))
+PREVIEW_DIFF_MAX_LIMIT = 1000
+
 
 class PriceUpdateBody(BaseModel):
     test_id: int
@@ -89,59 +109,6 @@ def _build_template_xlsx() -> bytes:
     return buf.getvalue()
 
 
-def _parse_xlsx_rows(content: bytes) -> List[Dict[str, Any]]:
-    from openpyxl import load_workbook
-
-    wb = load_workbook(io.BytesIO(content), read_only=True, data_only=True)
-    ws = wb.active
-    if ws is None:
-        return []
-    rows_iter = ws.iter_rows(values_only=True)
-    header = next(rows_iter, None)
-    if not header:
-        return []
-    # Normalizar nombres de columna (minúsculas, sin espacios)
-    col_names = [str(h).strip().lower() if h is not None else "" for h in header]
-    # Índices por nombre esperado
-    idx = {}
-    for name in ["prueba", "categoria", "clinica", "ingreso", "periodico", "retiro"]:
-        try:
-            idx[name] = col_names.index(name)
-        except ValueError:
-            pass
-    if "prueba" not in idx or "categoria" not in idx:
-        return []
-    out = []
-    for row in rows_iter:
-        if row is None:
-            continue
-        row_list = list(row) if not isinstance(row, (list, tuple)) else row
-        if len(row_list) <= max(idx.values()):
-            continue
-        prueba_val = row_list[idx["prueba"]] if idx["prueba"] < len(row_list) else None
-        if prueba_val is None or (isinstance(prueba_val, str) and not prueba_val.strip()):
-            continue
-        def _cell(key: str, default: Any = "") -> Any:
-            if key not in idx or idx[key] >= len(row_list):
-                return default
-            v = row_list[idx[key]]
-            if v is None and default == 0:
-                return 0
-            if v is None:
-                return ""
-            return v
-
-        out.append({
-            "prueba": _cell("prueba", ""),
-            "categoria": _cell("categoria", ""),
-            "clinica": _cell("clinica", ""),
-            "ingreso": _cell("ingreso", 0),
-            "periodico": _cell("periodico", 0),
-            "retiro": _cell("retiro", 0),
-        })
-    return out
-
-
 @router.get("/template")
 def download_template(_: tuple = Depends(require_user)):
     """Descarga plantilla XLSX para importar precios."""
@@ -161,18 +128,21 @@ def search_tests(
     db: Session = Depends(get_db),
     _: tuple = Depends(require_user),
 ):
-    """Busca pruebas por nombre. Devuelve clínicas con precios y clínicas sin precio."""
+    """Busca pruebas por nombre (sin tildes, ordenadas por relevancia).
+    Devuelve clínicas con precios y clínicas sin precio."""
     q_trim = (q or "").strip()
     if len(q_trim) < 2:
         return {"tests": []}
-    tests = db.query(Test).filter(Test.name.ilike(f"%{q_trim}%")).order_by(Test.category, Test.name).limit(50).all()
+    index = get_search_index()
+    tests = index.search(q_trim, limit=50)
     if not tests:
         return {"tests": []}
     test_ids = [t.id for t in tests]
     prices = db.query(Price).filter(Price.test_id.in_(test_ids)).all()
     clinic_ids = {p.clinic_id for p in prices if p.clinic_id is not None}
     clinics = {c.id: c.name for c in db.query(Clinic).filter(Clinic.id.in_(clinic_ids)).all()} if clinic_ids else {}
-    all_clinic_names = ["Lima"] + [c.name for c in db.query(Clinic.name).order_by(Clinic.name).all()]
+    all_clinic_names = ["Lima"] + index.clinic_names
+    all_clinic_set = set(all_clinic_names)
     prices_by_test = {}
     for p in prices:
         key = p.test_id
@@ -189,8 +159,8 @@ def search_tests(
     result = []
     for t in tests:
         with_prices = prices_by_test.get(t.id, [])
-        clinics_with_price = {row["clinic_name"] for row in with_prices}
-        clinics_without_price = [c for c in all_clinic_names if c not in clinics_with_price]
+        missing = all_clinic_set - {row["clinic_name"] for row in with_prices}
+        clinics_without_price = [c for c in all_clinic_names if c in missing]
         result.append({
             "test_id": t.id,
             "test_name": t.name,
@@ -198,16 +168,23 @@ def search_tests(
             "clinics_with_price": with_prices,
             "clinics_without_price": clinics_without_price,
         })
-    return {"tests": result}
+    return json_response({"tests": result})
 
 
 @router.get("/list")
 def list_prices_by_clinic(
+    request: Request,
+    response: Response,
     clinic: str = Query(..., description="Lima o nombre de la sede en provincia"),
     db: Session = Depends(get_db),
     _: tuple = Depends(require_user),
 ):
-    """Lista todos los exámenes con sus precios para la sede indicada (Lima o nombre de clínica)."""
+    """Lista todos los exámenes con sus precios para la sede indicada (Lima o nombre de clínica).
+    Responde 304 si If-None-Match coincide con el ETag actual."""
+    etag = compute_etag(("tests", "clinics", "prices"), "prices-list", clinic.strip())
+    cached = not_modified(request, response, etag)
+    if cached is not None:
+        return cached
     is_lima = clinic.strip().lower() in ("lima", "")
     clinic_id: Optional[int] = None
     if not is_lima:
@@ -228,7 +205,10 @@ def list_prices_by_clinic(
             rows.append(PriceRow(test_id=t.id, test_name=t.name, category=t.category, price_id=p.id, ingreso=p.ingreso, periodico=p.periodico, retiro=p.retiro, no_realiza=getattr(p, "no_realiza", False)))
         else:
             rows.append(PriceRow(test_id=t.id, test_name=t.name, category=t.category, price_id=None, ingreso=0, periodico=0, retiro=0, no_realiza=False))
-    return {"clinic": "Lima" if is_lima else clinic.strip(), "clinic_id": clinic_id, "tests": [r.model_dump() for r in rows]}
+    return json_response(
+        {"clinic": "Lima" if is_lima else clinic.strip(), "clinic_id": clinic_id, "tests": [r.model_dump() for r in rows]},
+        response,
+    )
 
 
 def _target_clinic_ids(scope: str, clinic_id: Optional[int], clinic_ids: Optional[List[int]], include_lima: bool, db: Session) -> List[Optional[int]]:
@@ -297,7 +277,10 @@ def add_price(
                 )
                 db.add(new_price)
                 count += 1
+        refresh_provincia_max(db, [test.id])
+        record_catalog_change(db, "price", test_ids=[test.id])
         db.commit()
+        bump_catalog_revision("tests", "prices")
         return {"id": test.id, "test_id": test.id, "test_name": test.name, "category": test.category, "count": count}
     except HTTPException:
         db.rollback()
@@ -325,7 +308,10 @@ def update_price(
             existing.periodico = max(0, float(body.periodico))
             existing.retiro = max(0, float(body.retiro))
             existing.no_realiza = bool(body.no_realiza)
+            refresh_provincia_max(db, [existing.test_id])
+            record_catalog_change(db, "price", test_ids=[existing.test_id], clinic_id=existing.clinic_id)
             db.commit()
+            bump_catalog_revision("prices")
             return {"id": existing.id, "test_id": existing.test_id, "clinic_id": existing.clinic_id, "ingreso": existing.ingreso, "periodico": existing.periodico, "retiro": existing.retiro, "no_realiza": existing.no_realiza}
         test = db.query(Test).filter(Test.id == body.test_id).first()
         if not test:
@@ -343,7 +329,10 @@ def update_price(
             no_realiza=bool(body.no_realiza),
         )
         db.add(new_price)
+        refresh_provincia_max(db, [body.test_id])
+        record_catalog_change(db, "price", test_ids=[body.test_id], clinic_id=body.clinic_id)
         db.commit()
+        bump_catalog_revision("prices")
         db.refresh(new_price)
         return {"id": new_price.id, "test_id": new_price.test_id, "clinic_id": new_price.clinic_id, "ingreso": new_price.ingreso, "periodico": new_price.periodico, "retiro": new_price.retiro, "no_realiza": new_price.no_realiza}
     except HTTPException:
@@ -354,26 +343,68 @@ def update_price(
         raise HTTPException(status_code=500, detail="Error al guardar. Intenta de nuevo.")
 
 
+@router.patch("/bulk")
+def update_prices_bulk(
+    body: List[PriceUpdateBody],
+    db: Session = Depends(get_db),
+    _: tuple = Depends(require_user),
+):
+    """Guarda varias celdas de la grilla en una transacción (upsert nativo por test_id + clinic_id).
+    Celdas con prueba o sede inexistente vuelven con status "error" y no frenan al resto."""
+    if not body:
+        raise HTTPException(status_code=400, detail="No hay celdas para guardar.")
+    if len(body) > PRICES_BULK_MAX_CELLS:
+        raise HTTPException(status_code=400, detail=f"Máximo {PRICES_BULK_MAX_CELLS} celdas por envío.")
+    cells = [
+        PriceCell(c.test_id, c.clinic_id, c.ingreso, c.periodico, c.retiro, c.no_realiza) for c in body
+    ]
+    try:
+        results, counts = apply_price_cells(db, cells)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise HTTPException(status_code=500, detail="Error al guardar. Intenta de nuevo.")
+    if counts.inserted or counts.updated:
+        bump_catalog_revision("prices")
+    return {
+        "results": results,
+        "inserted": counts.inserted,
+        "updated": counts.updated,
+        "errors": sum(1 for r in results if r["status"] == "error"),
+    }
+
+
+_NO_ROWS_DETAIL = "El archivo no tiene filas de datos. Usa la plantilla con los encabezados indicados."
+
+
+def _check_xlsx_upload(file: UploadFile) -> None:
+    if not file.filename or not file.filename.lower().endswith(".xlsx"):
+        raise HTTPException(status_code=400, detail="Debes subir un archivo .xlsx")
+
+
 @router.post("/preview")
 def preview_import(
     file: UploadFile = File(...),
+    diff_offset: int = Query(0, ge=0),
+    diff_limit: int = Query(PREVIEW_DIFF_LIMIT, ge=1, le=PREVIEW_DIFF_MAX_LIMIT),
+    diff_status: Optional[Literal["inserted", "changed", "unchanged"]] = Query(None),
     db: Session = Depends(get_db),
     _: tuple = Depends(require_user),
 ):
-    """Parsea el XLSX y devuelve filas con validación (sin guardar). Para previsualización."""
-    if not file.filename or not file.filename.lower().endswith(".xlsx"):
-        raise HTTPException(status_code=400, detail="Debes subir un archivo .xlsx")
-    content = file.file.read()
-    try:
-        rows = _parse_xlsx_rows(content)
-    except Exception:
-        raise HTTPException(status_code=400, detail="El archivo no es válido.")
-    if not rows:
-        raise HTTPException(status_code=400, detail="El archivo no tiene filas de datos. Usa la plantilla con los encabezados indicados.")
-    validated = validate_import_rows(db, rows)
-    valid_count = sum(1 for r in validated if r.get("valid"))
-    invalid_count = len(validated) - valid_count
-    return {"rows": validated, "validCount": valid_count, "invalidCount": invalid_count}
+    """Parsea el XLSX y devuelve filas con validación y el diff por celda contra los precios
+    actuales (sin guardar). El diff se pagina con diff_offset/diff_limit (y filtro diff_status);
+    diff.summary trae los totales."""
+    _check_xlsx_upload(file)
+    with spooled_upload(file.file) as path:
+        try:
+            preview = preview_import_rows(
+                db, iter_xlsx_rows(path), diff_offset=diff_offset, diff_limit=diff_limit, diff_status=diff_status
+            )
+        except ImportFileError:
+            raise HTTPException(status_code=400, detail="El archivo no es válido.")
+    if not preview["rows"]:
+        raise HTTPException(status_code=400, detail=_NO_ROWS_DETAIL)
+    return json_response(preview)
 
 
 @router.post("/import")
@@ -382,23 +413,84 @@ def import_prices(
     db: Session = Depends(get_db),
     _: tuple = Depends(require_user),
 ):
-    """Carga precios desde un archivo XLSX (mismo formato que la plantilla)."""
-    if not file.filename or not file.filename.lower().endswith(".xlsx"):
-        raise HTTPException(status_code=400, detail="Debes subir un archivo .xlsx")
-    content = file.file.read()
-    try:
-        rows = _parse_xlsx_rows(content)
-    except Exception:
-        raise HTTPException(status_code=400, detail="El archivo no es válido.")
-    if not rows:
-        raise HTTPException(status_code=400, detail="El archivo no tiene filas de datos. Usa la plantilla con los encabezados indicados.")
+    """Carga precios desde un archivo XLSX (mismo formato que la plantilla).
+    Lectura en streaming y escritura por bloques; todo o nada (un solo commit)."""
+    _check_xlsx_upload(file)
+    with spooled_upload(file.file) as path:
+        try:
+            importer = import_prices_from_xlsx(db, path)
+        except ImportFileError:
+            db.rollback()
+            raise HTTPException(status_code=400, detail="El archivo no es válido.")
+        except Exception:
+            db.rollback()
+            raise HTTPException(status_code=500, detail="Error al importar. Intenta de nuevo.")
+    if not importer.rows_parsed:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=_NO_ROWS_DETAIL)
     try:
-        rows_done, errors = import_prices_from_rows(db, rows)
         db.commit()
-        return {"imported": rows_done, "errors": errors}
     except Exception:
         db.rollback()
         raise HTTPException(status_code=500, detail="Error al importar. Intenta de nuevo.")
+    bump_catalog_revision("tests", "prices")
+    return {
+        "imported": importer.cells_applied,
+        "errors": importer.errors,
+        "errorCount": importer.error_count,
+        "rowsParsed": importer.rows_parsed,
+    }
+
+
+@router.post("/import-jobs", status_code=202)
+def create_import_job(file: UploadFile = File(...), user: tuple = Depends(require_user)):
+    """Encola la importación del XLSX y devuelve el id al instante; consultar GET /import-jobs/{id}."""
+    _check_xlsx_upload(file)
+    path = spool_to_temp(file.file)
+    try:
+        job = price_import_jobs.submit(path, owner=user[0], file_name=file.filename)
+    except ImportQueueFull:
+        raise HTTPException(status_code=503, detail="Hay muchas importaciones en cola. Intenta en unos minutos.")
+    return job.to_dict()
+
+
+@router.get("/import-jobs/stats")
+def import_job_stats(_: tuple = Depends(require_user)):
+    """Cola de importaciones: profundidad, en curso, completadas, fallidas, canceladas y caducadas."""
+    return price_import_jobs.stats()
+
+
+def _owned_import_job(job_id: str, user: tuple):
+    job = price_import_jobs.get(job_id)
+    if job is None or job.owner != user[0]:
+        raise HTTPException(status_code=404, detail="Importación no encontrada o caducada")
+    return job
+
+
+@router.get("/import-jobs/{job_id}")
+def get_import_job(job_id: str, user: tuple = Depends(require_user)):
+    return _owned_import_job(job_id, user).to_dict()
+
+
+@router.post("/import-jobs/{job_id}/cancel")
+def cancel_import_job(job_id: str, user: tuple = Depends(require_user)):
+    """Cancela la importación; si ya estaba escribiendo, se deshace entera (rollback)."""
+    job = _owned_import_job(job_id, user)
+    if job.status in ("done", "error"):
+        raise HTTPException(status_code=409, detail="La importación ya terminó")
+    price_import_jobs.cancel(job)
+    return job.to_dict()
+
+
+@router.get("/import-jobs/{job_id}/errors")
+def download_import_errors(job_id: str, user: tuple = Depends(require_user)):
+    """Reporte CSV (fila, error) con todos los errores de la importación."""
+    job = _owned_import_job(job_id, user)
+    report = job.report_path
+    if job.status not in ("done", "error", "cancelled") or not report:
+        raise HTTPException(status_code=409, detail="El reporte aún no está listo")
+    stem = (job.file_name or "precios").rsplit(".", 1)[0]
+    return FileResponse(report, media_type="text/csv; charset=utf-8", filename=f"errores_{stem}.csv")
 
 
 @router.delete("")
@@ -441,14 +533,19 @@ def delete_price(
             deleted_count = db.query(Price).filter(
                 Price.test_id == body.test_id
             ).delete()
+            refresh_provincia_max(db, [body.test_id])
             # Si no quedan precios para este test, eliminar el test también
             remaining = db.query(Price).filter(Price.test_id == body.test_id).count()
             if remaining == 0:
                 db.delete(test)
         else:
             raise HTTPException(status_code=400, detail="scope inválido. Usa: clinic, lima, all_provincia, all.")
-        
+        if body.scope != "all":
+            refresh_provincia_max(db, [body.test_id])
+        record_catalog_change(db, "price", op="delete", test_ids=[body.test_id], clinic_id=body.clinic_id)
+
         db.commit()
+        bump_catalog_revision("tests", "prices")
         return {"deleted": deleted_count, "test_name": test.name}
     except HTTPException:
         db.rollback()
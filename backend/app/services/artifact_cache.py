@@ -0,0 +1,172 @@
+# app/services/artifact_cache.py
+"""Caché en disco de ZIPs de cotización, direccionada por contenido.
+
+La clave es un hash de la cotización ya preparada para docgen (ver
+generator_service.quote_cache_key): si alguien vuelve a pulsar "Generar" con los mismos
+datos, se sirve el ZIP guardado en vez de renderizar PPTX + XLSX otra vez. Un archivo
+por clave en ARTIFACT_CACHE_DIR; LRU por bytes con tope ARTIFACT_CACHE_MAX_BYTES
+(0 = desactivada). El orden LRU usa el mtime, así el índice se rehace al reiniciar.
+"""
+import logging
+import os
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+from typing import BinaryIO, Dict, Iterable, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+ARTIFACT_CACHE_DIR = os.getenv("ARTIFACT_CACHE_DIR", os.path.join(tempfile.gettempdir(), "cotizador_artifacts"))
+ARTIFACT_CACHE_MAX_BYTES = int(os.getenv("ARTIFACT_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+
+CHUNK_SIZE = 64 * 1024
+_STALE_TMP_SECONDS = 3600
+
+
+class ArtifactCache:
+    """LRU en disco thread-safe: clave (hex) -> archivo <clave>.zip."""
+
+    def __init__(self, directory: str = ARTIFACT_CACHE_DIR, max_bytes: int = ARTIFACT_CACHE_MAX_BYTES):
+        self.directory = Path(directory)
+        self.max_bytes = max(0, max_bytes)
+        self._lock = threading.Lock()
+        self._index: Optional["OrderedDict[str, int]"] = None  # clave -> tamaño, de menos a más reciente
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{key}.zip"
+
+    def _load_index(self) -> "OrderedDict[str, int]":
+        """Índice desde disco (con el lock tomado); borra temporales huérfanos de escrituras cortadas."""
+        if self._index is None:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            entries = []
+            now = time.time()
+            for p in self.directory.iterdir():
+                try:
+                    st = p.stat()
+                    if p.suffix == ".zip":
+                        entries.append((st.st_mtime, p.stem, st.st_size))
+                    elif p.suffix == ".tmp" and now - st.st_mtime > _STALE_TMP_SECONDS:
+                        p.unlink()
+                except OSError:
+                    continue
+            self._index = OrderedDict((key, size) for _, key, size in sorted(entries))
+            self._evict()
+        return self._index
+
+    def _evict(self) -> None:
+        index = self._index
+        total = sum(index.values())
+        while index and total > self.max_bytes:
+            key, size = index.popitem(last=False)
+            total -= size
+            self.evictions += 1
+            try:
+                self._path(key).unlink()
+            except OSError:
+                pass
+
+    def open(self, key: str) -> Optional[BinaryIO]:
+        """Archivo del ZIP guardado (abierto, al inicio) o None."""
+        if not self.enabled:
+            return None
+        with self._lock:
+            index = self._load_index()
+            if key not in index:
+                self.misses += 1
+                return None
+            try:
+                f = open(self._path(key), "rb")
+                os.utime(self._path(key))  # LRU persistente
+            except OSError:
+                del index[key]  # borrado por fuera (otro proceso o limpieza)
+                self.misses += 1
+                return None
+            index.move_to_end(key)
+            self.hits += 1
+            return f
+
+    def put(self, key: str, data: bytes) -> None:
+        for _ in self.tee(key, [data]):
+            pass
+
+    def tee(self, key: str, chunks: Iterable[bytes]) -> Iterator[bytes]:
+        """Entrega chunks tal cual y a la vez los guarda bajo key. Solo se publica si el
+        iterador se consume entero (una descarga cortada no deja un ZIP a medias)."""
+        if not self.enabled:
+            yield from chunks
+            return
+        with self._lock:
+            self._load_index()
+        tmp = self.directory / f"{key}.{uuid.uuid4().hex}.tmp"
+        size = 0
+        try:
+            with open(tmp, "wb") as f:
+                for chunk in chunks:
+                    f.write(chunk)
+                    size += len(chunk)
+                    yield chunk
+            if size > self.max_bytes:
+                return
+            os.replace(tmp, self._path(key))
+            with self._lock:
+                index = self._load_index()
+                index[key] = size
+                index.move_to_end(key)
+                self.stores += 1
+                self._evict()
+        finally:
+            try:
+                tmp.unlink()
+            except OSError:
+                pass
+
+    def clear(self) -> None:
+        with self._lock:
+            index = self._load_index()
+            for key in list(index):
+                try:
+                    self._path(key).unlink()
+                except OSError:
+                    pass
+            index.clear()
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            index = self._index or {}
+            return {
+                "enabled": self.enabled,
+                "entries": len(index),
+                "bytes": sum(index.values()),
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "stores": self.stores,
+                "evictions": self.evictions,
+            }
+
+
+def iter_file(fileobj: BinaryIO, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    """Bloques de un archivo abierto; lo cierra al terminar o si se corta la descarga."""
+    try:
+        while True:
+            block = fileobj.read(chunk_size)
+            if not block:
+                break
+            yield block
+    finally:
+        fileobj.close()
+
+
+artifact_cache = ArtifactCache()
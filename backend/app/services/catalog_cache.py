@@ -0,0 +1,133 @@
+# app/services/catalog_cache.py
+"""Caché en proceso del catálogo resuelto, invalidada por revisión global.
+
+Cada escritura que afecta al catálogo (precios, pruebas, sedes) llama a
+bump_catalog_revision(); las entradas guardadas con una revisión anterior se
+descartan en la siguiente lectura. LRU acotado por CATALOG_CACHE_MAX_ENTRIES.
+
+Las escrituras de otros procesos (scripts, otros workers) no pasan por aquí, pero todas
+registran su cambio en catalog_changes: cada lectura de revisión compara, como mucho cada
+CATALOG_REVISION_CHECK_SECONDS, la revisión persistente por tabla y sube la local si cambió.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+from app.database import SessionLocal
+from app.services.catalog_changes_service import catalog_table_revisions
+
+CATALOG_CACHE_MAX_ENTRIES = int(os.getenv("CATALOG_CACHE_MAX_ENTRIES", "256"))
+CATALOG_REVISION_CHECK_SECONDS = float(os.getenv("CATALOG_REVISION_CHECK_SECONDS", "1"))
+
+CATALOG_TABLES = ("tests", "clinics", "prices")
+
+_revision_lock = threading.Lock()
+_revision = 0
+_table_revisions: Dict[str, int] = {t: 0 for t in CATALOG_TABLES}
+_persistent: Dict[str, int] = {}
+_checked_at: Optional[float] = None
+
+
+def _sync_persistent() -> None:
+    """Trae la revisión persistente (catalog_changes) si toca y, si cambió, invalida las tablas afectadas."""
+    global _revision, _checked_at
+    now = time.monotonic()
+    checked_at = _checked_at
+    if checked_at is not None and now - checked_at < CATALOG_REVISION_CHECK_SECONDS:
+        return
+    with SessionLocal() as db:
+        persistent = catalog_table_revisions(db)
+    with _revision_lock:
+        changed = [t for t in CATALOG_TABLES if persistent[t] != _persistent.get(t)]
+        if changed:
+            for t in changed:
+                _table_revisions[t] += 1
+            _revision += 1
+            _persistent.update(persistent)
+        _checked_at = now
+
+
+def get_catalog_revision() -> int:
+    """Revisión global del catálogo (se incrementa en cada escritura, de este u otro proceso)."""
+    _sync_persistent()
+    return _revision
+
+
+def get_table_revisions(*tables: str) -> Tuple[int, ...]:
+    """Revisión por tabla (tests, clinics, prices), en el orden pedido. Solo vale en este proceso."""
+    _sync_persistent()
+    with _revision_lock:
+        return tuple(_table_revisions[t] for t in tables)
+
+
+def get_persistent_revisions(*tables: str) -> Tuple[int, ...]:
+    """Revisión persistente por tabla (id en catalog_changes): la misma en todos los workers
+    y tras un reinicio; para ETags."""
+    _sync_persistent()
+    with _revision_lock:
+        return tuple(_persistent[t] for t in tables)
+
+
+def bump_catalog_revision(*tables: str) -> int:
+    """Invalida el catálogo en caché. Llamar tras hacer commit de una escritura.
+    tables: tablas modificadas (tests, clinics, prices); sin argumentos = todas.
+    La próxima lectura vuelve a mirar la revisión persistente (incluye este cambio)."""
+    global _revision, _checked_at
+    with _revision_lock:
+        for t in tables or CATALOG_TABLES:
+            _table_revisions[t] += 1
+        _revision += 1
+        _checked_at = None
+        return _revision
+
+
+class CatalogCache:
+    """LRU thread-safe de catálogos resueltos: key -> (revisión, catálogo)."""
+
+    def __init__(self, max_entries: int = CATALOG_CACHE_MAX_ENTRIES):
+        self.max_entries = max(1, max_entries)
+        self._entries: "OrderedDict[Hashable, Tuple[int, List[Dict[str, Any]]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable, revision: int) -> Optional[List[Dict[str, Any]]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != revision:
+                if entry is not None:
+                    del self._entries[key]  # revisión antigua: ya no sirve
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: Hashable, revision: int, catalog: List[Dict[str, Any]]) -> None:
+        with self._lock:
+            self._entries[key] = (revision, catalog)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "revision": _revision,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+catalog_cache = CatalogCache()
@@ -0,0 +1,93 @@
+# app/services/catalog_changes_service.py
+"""Registro de cambios del catálogo y delta-sync (cambios desde la revisión N).
+
+Las escrituras llaman a record_catalog_change dentro de su transacción; el id
+autoincremental de catalog_changes es la revisión que ve el cliente. El registro
+se trunca a CATALOG_CHANGES_KEEP filas: si el cliente pide desde una revisión ya
+truncada (o hubo un cambio masivo), recibe un snapshot completo.
+"""
+import os
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.models.db_models import CatalogChange
+
+CATALOG_CHANGES_KEEP = int(os.getenv("CATALOG_CHANGES_KEEP", "5000"))
+
+# Tablas del catálogo (ver catalog_cache.CATALOG_TABLES) que invalida cada entity
+ENTITY_TABLES = {
+    "test": ("tests",),
+    "price": ("tests", "prices"),  # un precio puede crear su prueba
+    "clinic": ("clinics",),
+    "catalog": ("tests", "clinics", "prices"),
+}
+
+
+def record_catalog_change(
+    db: Session,
+    entity: str,
+    op: str = "upsert",
+    test_ids: Optional[Iterable[int]] = None,
+    clinic_id: Optional[int] = None,
+) -> None:
+    """Registra un cambio (sin commit). Una fila por prueba afectada; sin test_ids, una sola fila."""
+    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    ids = sorted(set(test_ids or []))
+    if ids:
+        db.add_all([
+            CatalogChange(entity=entity, op=op, test_id=tid, clinic_id=clinic_id, created_at=now)
+            for tid in ids
+        ])
+    else:
+        db.add(CatalogChange(entity=entity, op=op, clinic_id=clinic_id, created_at=now))
+    db.flush()
+    latest = db.query(func.max(CatalogChange.id)).scalar() or 0
+    if latest > CATALOG_CHANGES_KEEP:
+        db.query(CatalogChange).filter(CatalogChange.id <= latest - CATALOG_CHANGES_KEEP).delete(
+            synchronize_session=False
+        )
+
+
+def record_catalog_reset(db: Session) -> None:
+    """Cambio masivo (importación): los clientes deben pedir un snapshot completo."""
+    record_catalog_change(db, "catalog", op="reset")
+
+
+def latest_catalog_revision(db: Session) -> int:
+    """Revisión persistente del catálogo (id del último cambio); sobrevive a reinicios."""
+    return db.query(func.max(CatalogChange.id)).scalar() or 0
+
+
+def catalog_table_revisions(db: Session) -> Dict[str, int]:
+    """Revisión persistente por tabla: id del último cambio que la afecta. Si ese cambio ya se
+    truncó, cuenta el más antiguo que queda − 1 (así nunca retrocede). Igual en todos los
+    procesos, incluidos los scripts que escriben directo en la BD."""
+    rows = db.query(CatalogChange.entity, func.max(CatalogChange.id), func.min(CatalogChange.id)).group_by(
+        CatalogChange.entity
+    ).all()
+    floor = min((r[2] for r in rows), default=1) - 1
+    revisions = {t: floor for t in ENTITY_TABLES["catalog"]}
+    for entity, latest, _ in rows:
+        for t in ENTITY_TABLES.get(entity, ENTITY_TABLES["catalog"]):
+            revisions[t] = max(revisions[t], latest)
+    return revisions
+
+
+def changed_test_ids_since(db: Session, since: int) -> Tuple[int, Optional[List[int]]]:
+    """(revisión actual, test_ids cambiados desde since).
+    test_ids = None si hace falta snapshot completo: since truncado/desconocido o hubo un reset."""
+    latest = latest_catalog_revision(db)
+    oldest = db.query(func.min(CatalogChange.id)).scalar()
+    if since > latest or (oldest is not None and since < oldest - 1):
+        return latest, None
+    rows = (
+        db.query(CatalogChange.op, CatalogChange.test_id)
+        .filter(CatalogChange.id > since, CatalogChange.id <= latest)
+        .all()
+    )
+    if any(r.op == "reset" for r in rows):
+        return latest, None
+    return latest, sorted({r.test_id for r in rows if r.test_id is not None})
@@ -1,10 +1,16 @@
 # app/services/catalog_service.py
 from typing import Optional, List, Dict, Any
 from sqlalchemy.orm import Session
-from sqlalchemy import func
 
 from app.database import SessionLocal
-from app.models.db_models import Test, Clinic, Price
+from app.models.db_models import Test, Clinic, Price, ProvinciaMaxPrice
+from app.services.catalog_cache import catalog_cache, get_catalog_revision, bump_catalog_revision
+from app.services.catalog_changes_service import (
+    changed_test_ids_since,
+    latest_catalog_revision,
+    record_catalog_change,
+)
+from app.services.price_matrix import MATRIX_AVAILABLE, get_price_matrix, round_price
 
 
 def _prices_row_to_dict(ingreso: float, periodico: float, retiro: float) -> Dict[str, float]:
@@ -45,8 +51,11 @@ def create_clinic(name: str) -> str:
             raise ValueError("Ya existe una sede con ese nombre.")
         clinic = Clinic(name=n)
         db.add(clinic)
+        db.flush()
+        record_catalog_change(db, "clinic", clinic_id=clinic.id)
         db.commit()
-        return n
+    bump_catalog_revision("clinics")
+    return n
 
 
 def _apply_margin(prices: Dict[str, float], margin: float) -> Dict[str, float]:
@@ -54,29 +63,115 @@ def _apply_margin(prices: Dict[str, float], margin: float) -> Dict[str, float]:
     if margin <= 0:
         return dict(prices)
     return {
-        k: round(v * (1 + margin / 100), 2)
+        k: round_price(v * (1 + margin / 100))
         for k, v in prices.items()
     }
 
 
 def get_catalog(location: str, clinic: Optional[str], margin: float) -> List[Dict[str, Any]]:
-    """location: Lima = sede Lima; Provincia = sedes en provincia (clinic = nombre sede)."""
-    with SessionLocal() as db:
-        if location == "Lima":
-            return _get_catalog_lima(db)
+    """location: Lima = sede Lima; Provincia = sedes en provincia (clinic = nombre sede).
+    Resultado cacheado por (location, clinic, margin) hasta la próxima escritura; no mutar."""
+    if location == "Lima":
+        key = ("Lima", "", 0.0)
+    else:
         # Sedes en provincia: margen mínimo 20% sobre el costo
-        margin_prov = max(margin or 0, 20.0)
-        return _get_catalog_provincia(db, clinic or "", margin_prov)
+        key = ("Provincia", clinic or "", max(margin or 0, 20.0))
+    revision = get_catalog_revision()
+    cached = catalog_cache.get(key, revision)
+    if cached is not None:
+        return cached
+    if location != "Lima" and MATRIX_AVAILABLE:
+        catalog = get_price_matrix().catalogs([key[1]], key[2])[key[1]]
+    else:
+        with SessionLocal() as db:
+            if location == "Lima":
+                catalog = _get_catalog_lima(db)
+            else:
+                catalog = _get_catalog_provincia(db, key[1], key[2])
+    catalog_cache.put(key, revision, catalog)
+    return catalog
+
+
+def get_catalogs_bulk(location: str, clinics: List[str], margin: float) -> Dict[str, List[Dict[str, Any]]]:
+    """Catálogos de varias sedes de una vez: {nombre sede: catálogo}.
+    Reutiliza la caché; las sedes no cacheadas se resuelven juntas (pruebas y máximos una vez)."""
+    names = list(dict.fromkeys(c or "" for c in clinics))
+    if location == "Lima":
+        catalog = get_catalog("Lima", None, 0)
+        return {n: catalog for n in names}
+    margin_prov = max(margin or 0, 20.0)
+    revision = get_catalog_revision()
+    result: Dict[str, List[Dict[str, Any]]] = {}
+    missing: List[str] = []
+    for n in names:
+        cached = catalog_cache.get(("Provincia", n, margin_prov), revision)
+        if cached is not None:
+            result[n] = cached
+        else:
+            missing.append(n)
+    if missing:
+        if MATRIX_AVAILABLE:
+            built = get_price_matrix().catalogs(missing, margin_prov)
+        else:
+            with SessionLocal() as db:
+                built = _get_catalogs_provincia_bulk(db, missing, margin_prov)
+        for n in missing:
+            catalog_cache.put(("Provincia", n, margin_prov), revision, built[n])
+            result[n] = built[n]
+    return {n: result[n] for n in names}
+
+
+def get_catalog_change_revision() -> int:
+    """Revisión persistente del catálogo (misma que devuelve /changes)."""
+    with SessionLocal() as db:
+        return latest_catalog_revision(db)
+
+
+def get_catalog_changes(
+    since: int, location: str, clinic: Optional[str], margin: float
+) -> Dict[str, Any]:
+    """
+    Delta-sync: cambios del catálogo desde la revisión since, resueltos con las mismas
+    reglas Lima / Provincia (fallback y margen) que get_catalog.
+    - { revision, full: False, upserted: [entradas], deleted: [test_id] }
+    - { revision, full: True, catalog: [...] } si el registro se truncó o hubo cambio masivo.
+    """
+    upserted: List[Dict[str, Any]] = []
+    with SessionLocal() as db:
+        revision, test_ids = changed_test_ids_since(db, since)
+        if test_ids and location == "Lima":
+            upserted = _get_catalog_lima(db, test_ids=test_ids)
+    if test_ids is None:
+        return {"revision": revision, "full": True, "catalog": get_catalog(location, clinic, margin)}
+    if test_ids and location != "Lima":
+        # Mismo resolvedor que el snapshot (matriz o SQL): delta y catálogo completo coinciden
+        wanted = set(test_ids)
+        upserted = [e for e in get_catalog(location, clinic, margin) if e["id"] in wanted]
+    found = {e["id"] for e in upserted}
+    return {
+        "revision": revision,
+        "full": False,
+        "upserted": upserted,
+        "deleted": [tid for tid in test_ids if tid not in found],
+    }
+
+
+def get_catalog_cache_stats() -> Dict[str, int]:
+    """Contadores de la caché de catálogo (hits, misses, evictions, entradas)."""
+    return catalog_cache.stats()
 
 
-def _get_catalog_lima(db: Session) -> List[Dict[str, Any]]:
-    """Sede Lima: precios finales directos (sin margen). clinic_id NULL."""
-    rows = (
+def _get_catalog_lima(db: Session, test_ids: Optional[List[int]] = None) -> List[Dict[str, Any]]:
+    """Sede Lima: precios finales directos (sin margen). clinic_id NULL.
+    test_ids: limitar a esas pruebas (delta-sync)."""
+    q = (
         db.query(Test.id, Test.name, Test.category, Price.ingreso, Price.periodico, Price.retiro)
         .join(Price, Test.id == Price.test_id)
         .filter(Price.clinic_id.is_(None))
-        .all()
     )
+    if test_ids is not None:
+        q = q.filter(Test.id.in_(test_ids))
+    rows = q.all()
     return [
         {
             "id": r.id,
@@ -97,57 +192,76 @@ def _get_catalog_provincia(
     - Si no: usar el MAYOR precio de esa prueba entre todas las sedes provincia.
     - Si ninguna sede en provincia tiene precio: usar 0 (no se usa Lima).
     """
-    clinic_id = None
-    if clinic_name:
-        c = db.query(Clinic.id).filter(Clinic.name == clinic_name).first()
-        clinic_id = c.id if c else None
+    return _get_catalogs_provincia_bulk(db, [clinic_name], margin)[clinic_name]
 
-    all_tests = db.query(Test).order_by(Test.category, Test.name).all()
 
-    # 1) Precios de la clínica seleccionada (por test_id)
-    clinic_by_test: Dict[int, Dict[str, float]] = {}
-    if clinic_id:
-        rows = (
-            db.query(Price.test_id, Price.ingreso, Price.periodico, Price.retiro)
-            .filter(Price.clinic_id == clinic_id)
-            .all()
-        )
-        for r in rows:
-            clinic_by_test[r.test_id] = _prices_row_to_dict(r.ingreso, r.periodico, r.retiro)
+def _get_catalogs_provincia_bulk(
+    db: Session,
+    clinic_names: List[str],
+    margin: float,
+) -> Dict[str, List[Dict[str, Any]]]:
+    """Catálogo provincia de varias sedes: pruebas y máximos se cargan una vez,
+    precios de las sedes en una sola consulta IN (...). Mismas reglas que _get_catalog_provincia."""
+    names = [n for n in clinic_names if n]
+    clinic_ids: Dict[str, int] = {}
+    if names:
+        rows = db.query(Clinic.id, Clinic.name).filter(Clinic.name.in_(names)).all()
+        clinic_ids = {r.name: r.id for r in rows}
 
-    # 2) Máximo por prueba en Provincia (clinic_id IS NOT NULL) — solo provincia, nunca Lima
-    max_prov = (
+    # Pruebas + máximo provincia precalculado (provincia_max_prices): un join, sin agregación
+    q_tests = (
         db.query(
-            Price.test_id,
-            func.max(Price.ingreso).label("ingreso"),
-            func.max(Price.periodico).label("periodico"),
-            func.max(Price.retiro).label("retiro"),
+            Test.id,
+            Test.name,
+            Test.category,
+            ProvinciaMaxPrice.ingreso,
+            ProvinciaMaxPrice.periodico,
+            ProvinciaMaxPrice.retiro,
         )
-        .filter(Price.clinic_id.isnot(None))
-        .group_by(Price.test_id)
-        .all()
+        .outerjoin(ProvinciaMaxPrice, ProvinciaMaxPrice.test_id == Test.id)
+        .order_by(Test.category, Test.name)
     )
-    max_prov_by_test: Dict[int, Dict[str, float]] = {
-        r.test_id: _prices_row_to_dict(r.ingreso or 0, r.periodico or 0, r.retiro or 0)
-        for r in max_prov
-    }
+    rows_tests = q_tests.all()
+
+    # Precios de las clínicas seleccionadas: {clinic_id: {test_id: precios}}
+    by_clinic: Dict[int, Dict[int, Dict[str, float]]] = {cid: {} for cid in clinic_ids.values()}
+    if clinic_ids:
+        q_prices = db.query(
+            Price.clinic_id, Price.test_id, Price.ingreso, Price.periodico, Price.retiro
+        ).filter(Price.clinic_id.in_(list(clinic_ids.values())))
+        rows = q_prices.all()
+        for r in rows:
+            by_clinic[r.clinic_id][r.test_id] = _prices_row_to_dict(r.ingreso, r.periodico, r.retiro)
 
     zero_prices = _prices_row_to_dict(0, 0, 0)
-    result = []
-    for t in all_tests:
-        clinic_prices = clinic_by_test.get(t.id)
-        # Solo comparativo con provincia: sede actual o máximo en provincia; nunca Lima.
-        if clinic_prices is None or _is_all_zeros(clinic_prices):
-            base = max_prov_by_test.get(t.id) or zero_prices
+    fallback_by_test: Dict[int, Dict[str, float]] = {}
+    for t in rows_tests:
+        if t.ingreso is None:
+            base = zero_prices
         else:
-            base = clinic_prices
-        final = _apply_margin(base, margin)
-        result.append({
-            "id": t.id,
-            "name": t.name,
-            "category": t.category,
-            "prices": final,
-        })
+            base = _prices_row_to_dict(t.ingreso or 0, t.periodico or 0, t.retiro or 0)
+        fallback_by_test[t.id] = _apply_margin(base, margin)
+
+    result: Dict[str, List[Dict[str, Any]]] = {}
+    for clinic_name in clinic_names:
+        if clinic_name in result:
+            continue
+        clinic_by_test = by_clinic.get(clinic_ids.get(clinic_name), {})
+        catalog = []
+        for t in rows_tests:
+            clinic_prices = clinic_by_test.get(t.id)
+            # Solo comparativo con provincia: sede actual o máximo en provincia; nunca Lima.
+            if clinic_prices is None or _is_all_zeros(clinic_prices):
+                final = dict(fallback_by_test[t.id])
+            else:
+                final = _apply_margin(clinic_prices, margin)
+            catalog.append({
+                "id": t.id,
+                "name": t.name,
+                "category": t.category,
+                "prices": final,
+            })
+        result[clinic_name] = catalog
     return result
 
 
@@ -168,21 +282,9 @@ def _get_base_prices_provincia(db: Session, test_id: int, clinic_id: Optional[in
         if p:
             return {"ingreso": p.ingreso, "periodico": p.periodico, "retiro": p.retiro}
 
-    # 2) Mayor precio entre todas las clínicas de Provincia
-    provincia_prices = (
-        db.query(
-            func.max(Price.ingreso).label("ingreso"),
-            func.max(Price.periodico).label("periodico"),
-            func.max(Price.retiro).label("retiro"),
-        )
-        .filter(Price.test_id == test_id, Price.clinic_id.isnot(None))
-        .first()
-    )
-    if provincia_prices and (
-        provincia_prices.ingreso is not None
-        or provincia_prices.periodico is not None
-        or provincia_prices.retiro is not None
-    ):
+    # 2) Mayor precio entre todas las clínicas de Provincia (provincia_max_prices)
+    provincia_prices = db.get(ProvinciaMaxPrice, test_id)
+    if provincia_prices is not None:
         return {
             "ingreso": provincia_prices.ingreso or 0,
             "periodico": provincia_prices.periodico or 0,
@@ -199,3 +301,45 @@ def _get_base_prices_provincia(db: Session, test_id: int, clinic_id: Optional[in
         return {"ingreso": lima.ingreso, "periodico": lima.periodico, "retiro": lima.retiro}
 
     return None
+
+
+def resolve_base_prices(
+    db: Session, test_ids: List[int], clinic_id: Optional[int]
+) -> Dict[int, Optional[Dict[str, float]]]:
+    """
+    Versión por lotes de _get_base_prices_provincia: {test_id: costo base | None}.
+    Mismo orden de fallback (precio de la sede -> mayor en provincia -> Lima) con a lo
+    sumo tres consultas IN (...), en lugar de hasta 3 por prueba.
+    """
+    pending = list(dict.fromkeys(test_ids))
+    result: Dict[int, Optional[Dict[str, float]]] = {tid: None for tid in pending}
+
+    # 1) Precio de la clínica específica (si existe)
+    if clinic_id and pending:
+        rows = (
+            db.query(Price.test_id, Price.ingreso, Price.periodico, Price.retiro)
+            .filter(Price.test_id.in_(pending), Price.clinic_id == clinic_id)
+            .all()
+        )
+        for r in rows:
+            result[r.test_id] = _prices_row_to_dict(r.ingreso, r.periodico, r.retiro)
+        pending = [tid for tid in pending if result[tid] is None]
+
+    # 2) Mayor precio entre todas las clínicas de Provincia (provincia_max_prices)
+    if pending:
+        rows = db.query(ProvinciaMaxPrice).filter(ProvinciaMaxPrice.test_id.in_(pending)).all()
+        for r in rows:
+            result[r.test_id] = _prices_row_to_dict(r.ingreso or 0, r.periodico or 0, r.retiro or 0)
+        pending = [tid for tid in pending if result[tid] is None]
+
+    # 3) Fallback: precio Lima
+    if pending:
+        rows = (
+            db.query(Price.test_id, Price.ingreso, Price.periodico, Price.retiro)
+            .filter(Price.test_id.in_(pending), Price.clinic_id.is_(None))
+            .all()
+        )
+        for r in rows:
+            result[r.test_id] = _prices_row_to_dict(r.ingreso, r.periodico, r.retiro)
+
+    return result
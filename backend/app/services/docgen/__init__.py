@@ -1,4 +1,5 @@
 # app/services/docgen - módulo de generación de PPT
 from .build import build_ppt
+from .template_pool import template_pool
 
-__all__ = ["build_ppt"]
+__all__ = ["build_ppt", "template_pool"]
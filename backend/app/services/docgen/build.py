@@ -1,17 +1,23 @@
 # app/services/docgen/build.py
 """Orquestador de generación PPT."""
+import logging
 import unicodedata
 from collections import defaultdict
-from typing import Dict, List, NamedTuple, Optional, Tuple
+from typing import BinaryIO, Dict, List, NamedTuple, Optional, Tuple, Union
 
-from pptx import Presentation
 from pptx.util import Inches
 
 from app.constants import CRA_CLASSIFICATIONS, CLASSIFICATION_LETTER, CRA_DESCRIPTIONS
 from app.models.schemas import GenerationRequest
 
-from .helpers import must_template, find_table_anchor, fill_cover_fields
+from . import config
+from .helpers import take_table_anchor, fill_cover_fields
+from .images import add_image_slides, applicable_images
 from .table_builder import add_unified_table
+from .table_xml import emit_unified_table
+from .template_pool import template_pool
+
+logger = logging.getLogger(__name__)
 
 
 class CRAItem(NamedTuple):
@@ -82,16 +88,86 @@ def _build_cra_items(
     return items
 
 
-def build_ppt(payload: GenerationRequest, out_path: str) -> str:
-    prs = Presentation(must_template())
+class SelectionLookup:
+    """Valores de celda de la tabla unificada por (protocolo, prueba) en O(1).
+    Para cada clave guarda la primera Selection que coincide, igual que el recorrido lineal
+    de by_proto[proto] al que sustituye (y la primera C/R/A para get_cra_price)."""
 
-    fill_cover_fields(prs, payload)
+    def __init__(self, by_proto: Dict[str, List]):
+        self._sel: Dict[Tuple[str, str], object] = {}
+        self._cra: Dict[Tuple[str, str], object] = {}
+        for proto, sels in by_proto.items():
+            for s in sels:
+                self._sel.setdefault((proto, s.name), s)
+                if getattr(s, "classification", None) in CRA_CLASSIFICATIONS:
+                    self._cra.setdefault((proto, s.name), s)
 
-    anchor_slide, anchor_rect, _ = find_table_anchor(prs)
+    def get_val(self, test_name: str, proto: str, t: str) -> str:
+        """Devuelve X, C, R o A según corresponda; nunca precios en la tabla principal."""
+        s = self._sel.get((proto, test_name))
+        if s is None or t not in s.types:
+            return "-"
+        cl = getattr(s, "classification", None) or None
+        if cl in CRA_CLASSIFICATIONS:
+            return CLASSIFICATION_LETTER.get(cl, "X")
+        return "X"
+
+    def get_num_val(self, test_name: str, proto: str, t: str) -> Optional[float]:
+        s = self._sel.get((proto, test_name))
+        if s is None or t not in s.types:
+            return None
+        ov = (s.overrides or {}).get(t)
+        price = ov if ov is not None else s.prices.get(t, 0.0)
+        try:
+            return float(price)
+        except Exception:
+            return None
+
+    def get_cra_price(self, test_name: str, proto: str, t: str) -> str:
+        """Precio para ítem CRA (condicional, requisito, adicional) en la tabla de condicionales."""
+        s = self._cra.get((proto, test_name))
+        if s is None or t not in (s.types or []):
+            return "-"
+        ov = (s.overrides or {}).get(t)
+        price = ov if ov is not None else (s.prices or {}).get(t, 0.0)
+        try:
+            return f"S/ {float(price):.2f}"
+        except Exception:
+            return "-"
+
+    def column_totals(
+        self, group_defs: List[Tuple[str, List[str]]], tests_with_meta: List[Tuple[str, str, bool]]
+    ) -> Dict[Tuple[str, str], float]:
+        """Totales de la fila TOTAL por (protocolo, tipo), sumados en el orden de la tabla."""
+        totals: Dict[Tuple[str, str], float] = {}
+        for proto, tps in group_defs:
+            for t in tps:
+                total = 0.0
+                for _, rn, is_cra in tests_with_meta:
+                    if not is_cra:
+                        v = self.get_num_val(rn, proto, t)
+                        if v is not None:
+                            total += v
+                totals[(proto, t)] = total
+        return totals
+
+
+def build_ppt(payload: GenerationRequest, out_path: Union[str, BinaryIO]) -> Union[str, BinaryIO]:
+    """Genera la cotización en out_path (ruta o archivo binario abierto)."""
+    # Clon de la plantilla en memoria; ancla y marcadores ya ubicados al cargarla
+    prs, template = template_pool.open()
+
+    fill_cover_fields(prs, payload, template.marker_shapes)
+
+    anchor_slide, anchor_rect, _ = take_table_anchor(prs, template.anchor_slide, template.anchor_shape)
     if anchor_rect is None:
         anchor_slide = prs.slides.add_slide(prs.slide_layouts[5])
         anchor_rect = (Inches(0.5), Inches(0.5), Inches(9.0), Inches(2.0))
 
+    # Imágenes (logo, diagramas de protocolo): una slide cada una, tras la de la tabla
+    quoted_types = {t for s in (payload.selections or []) for t in s.types}
+    add_image_slides(prs, applicable_images(payload.images, quoted_types), after_slide=anchor_slide)
+
     by_proto: Dict[str, List] = defaultdict(list)
     proto_order: List[str] = []
 
@@ -138,44 +214,8 @@ def build_ppt(payload: GenerationRequest, out_path: str) -> str:
             continue  # CRA (adicional, requisito, condicional) solo en tabla de condicionales; no suman al total
         tests_with_meta.append((raw_name, raw_name, False))
 
-    def _get_val(test_name: str, proto: str, t: str) -> str:
-        """Devuelve X, C, R o A según corresponda; nunca precios en la tabla principal."""
-        for s in by_proto.get(proto, []):
-            if s.name == test_name:
-                if t not in s.types:
-                    return "-"
-                cl = getattr(s, "classification", None) or None
-                if cl in CRA_CLASSIFICATIONS:
-                    return CLASSIFICATION_LETTER.get(cl, "X")
-                return "X"
-        return "-"
-
-    def _get_num_val(test_name: str, proto: str, t: str) -> Optional[float]:
-        for s in by_proto.get(proto, []):
-            if s.name == test_name:
-                if t not in s.types:
-                    return None
-                ov = (s.overrides or {}).get(t)
-                price = ov if ov is not None else s.prices.get(t, 0.0)
-                try:
-                    return float(price)
-                except Exception:
-                    return None
-        return None
-
-    def _get_cra_price(test_name: str, proto: str, t: str) -> str:
-        """Precio para ítem CRA (condicional, requisito, adicional) en la tabla de condicionales."""
-        for s in by_proto.get(proto, []):
-            if s.name == test_name and getattr(s, "classification", None) in CRA_CLASSIFICATIONS:
-                if t not in (s.types or []):
-                    return "-"
-                ov = (s.overrides or {}).get(t)
-                price = ov if ov is not None else (s.prices or {}).get(t, 0.0)
-                try:
-                    return f"S/ {float(price):.2f}"
-                except Exception:
-                    return "-"
-        return "-"
+    lookup = SelectionLookup(by_proto)
+    column_totals = lookup.column_totals(group_defs, tests_with_meta)
 
     clinic_totals = getattr(payload, "clinic_totals", None) or []
 
@@ -192,18 +232,28 @@ def build_ppt(payload: GenerationRequest, out_path: str) -> str:
         main_table_normalized_names=main_table_normalized_names,
     )
 
-    add_unified_table(
+    table_args = dict(
         slide=anchor_slide,
         anchor_rect=anchor_rect,
         group_defs=group_defs,
         tests_with_meta=tests_with_meta,
-        get_val=_get_val,
-        get_num_val=_get_num_val,
-        get_cra_price=_get_cra_price,
+        get_val=lookup.get_val,
+        get_num_val=lookup.get_num_val,
+        get_cra_price=lookup.get_cra_price,
         skip_total_row=False,
+        column_totals=column_totals,
         clinic_totals=clinic_totals,
         cra_items=cra_items,
     )
+    if config.PPT_TABLE_EMITTER == "xml":
+        try:
+            emit_unified_table(**table_args)
+        except Exception:
+            # El emisor no toca la slide si falla: se dibuja con la API de python-pptx
+            logger.exception("Emisor XML de la tabla falló; se usa el constructor clásico")
+            add_unified_table(**table_args)
+    else:
+        add_unified_table(**table_args)
 
     prs.save(out_path)
     return out_path
@@ -14,6 +14,8 @@ PPT_TEMPLATE = os.getenv(
     str(Path(__file__).resolve().parent.parent.parent / "assets" / "plantilla.pptx"),
 )
 PPT_TABLE_MARKER = os.getenv("PPT_TABLE_MARKER", "{{TABLA}}")
+# Tabla unificada: "xml" = emisor directo (table_xml), "pptx" = API de objetos de python-pptx
+PPT_TABLE_EMITTER = os.getenv("PPT_TABLE_EMITTER", "xml").strip().lower()
 
 ROW_HEIGHT_INCHES = 0.12
 BLANK_ROWS_BETWEEN_SECTIONS = 1
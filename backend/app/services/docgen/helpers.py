@@ -2,7 +2,7 @@
 """Helpers para PPT: plantilla, marcadores, celdas."""
 import logging
 from pathlib import Path
-from typing import Dict, Optional, Tuple
+from typing import Dict, Optional, Sequence, Tuple
 
 from pptx import Presentation
 from pptx.util import Pt
@@ -31,35 +31,52 @@ def find_table_anchor(prs: Presentation) -> Tuple[Optional[object], Optional[Tup
     return None, None, None
 
 
+def take_table_anchor(prs: Presentation, slide_idx: Optional[int], shape_idx: Optional[int]) -> Tuple[Optional[object], Optional[Tuple], Optional[object]]:
+    """Como find_table_anchor, pero con la ubicación ya conocida (ver template_pool)."""
+    if slide_idx is None or shape_idx is None:
+        return None, None, None
+    s = prs.slides[slide_idx]
+    sp = s.shapes[shape_idx]
+    left, top, width, height = sp.left, sp.top, sp.width, sp.height
+    s.shapes._spTree.remove(sp._element)
+    return s, (left, top, width, height), s.slide_layout
+
+
 def replace_markers_preserving_format(slide, mapping: Dict[str, str]) -> None:
     for sp in slide.shapes:
         if not getattr(sp, "has_text_frame", False):
             continue
-        for p in sp.text_frame.paragraphs:
-            for r in p.runs:
-                txt = r.text or ""
-                new_txt = txt
-                for k, v in mapping.items():
-                    if k in new_txt:
-                        new_txt = new_txt.replace(k, str(v))
-                if new_txt != txt:
-                    r.text = new_txt
-        for p in sp.text_frame.paragraphs:
-            joined = "".join([r.text or "" for r in p.runs])
-            changed = False
+        replace_markers_in_shape(sp, mapping)
+
+
+def replace_markers_in_shape(sp, mapping: Dict[str, str]) -> None:
+    for p in sp.text_frame.paragraphs:
+        for r in p.runs:
+            txt = r.text or ""
+            new_txt = txt
             for k, v in mapping.items():
-                if k in joined and not all((r.text or "").strip() for r in p.runs):
-                    joined_new = joined.replace(k, str(v))
-                    if joined_new != joined and p.runs:
-                        p.runs[0].text = joined_new
-                        for r in p.runs[1:]:
-                            r.text = ""
-                        changed = True
-            if changed:
-                continue
-
-
-def fill_cover_fields(prs: Presentation, payload) -> None:
+                if k in new_txt:
+                    new_txt = new_txt.replace(k, str(v))
+            if new_txt != txt:
+                r.text = new_txt
+    for p in sp.text_frame.paragraphs:
+        joined = "".join([r.text or "" for r in p.runs])
+        changed = False
+        for k, v in mapping.items():
+            if k in joined and not all((r.text or "").strip() for r in p.runs):
+                joined_new = joined.replace(k, str(v))
+                if joined_new != joined and p.runs:
+                    p.runs[0].text = joined_new
+                    for r in p.runs[1:]:
+                        r.text = ""
+                    changed = True
+        if changed:
+            continue
+
+
+def fill_cover_fields(prs: Presentation, payload, marker_shapes: Optional[Sequence[Tuple[int, int]]] = None) -> None:
+    """Reemplaza los marcadores de portada. marker_shapes: (slide, forma) precalculadas
+    (template_pool); sin ellas se recorren todas las formas."""
     from datetime import datetime
     mapping = {
         TEXT_MARKERS["RAZON_SOCIAL"]: payload.company,
@@ -70,8 +87,13 @@ def fill_cover_fields(prs: Presentation, payload) -> None:
         TEXT_MARKERS["UBICACION"]: payload.location or "",
         TEXT_MARKERS["FECHA"]: datetime.now().strftime("%d/%m/%Y"),
     }
-    for s in prs.slides:
-        replace_markers_preserving_format(s, mapping)
+    if marker_shapes is None:
+        for s in prs.slides:
+            replace_markers_preserving_format(s, mapping)
+        return
+    slides = prs.slides
+    for slide_idx, shape_idx in marker_shapes:
+        replace_markers_in_shape(slides[slide_idx].shapes[shape_idx], mapping)
 
 
 def set_cell_margins_zero(cell) -> None:
@@ -0,0 +1,218 @@
+# app/services/docgen/images.py
+"""Imágenes de la cotización (GenerationRequest.images) como slides del PPT.
+
+Cada ImageCfg va en una slide propia, centrada y ajustada al área útil, después de la
+slide de la tabla. applicable_types limita la imagen a cotizaciones con alguno de esos
+tipos (ingreso / periodico / retiro); vacío = siempre.
+
+El base64 se decodifica una vez y la imagen se reduce a PPT_IMAGE_DPI sobre el área de
+destino; el resultado queda en un LRU por hash de contenido (PPT_IMAGE_CACHE_MAX_BYTES),
+así el mismo logo o diagrama no se vuelve a decodificar ni redimensionar en cada
+cotización. check_images() aplica los topes de tamaño sobre el texto base64, antes de
+decodificar nada (el router responde 413); el tope de píxeles solo se ve al leer la cabecera,
+ya en el render, y esa imagen se omite como una ilegible.
+"""
+import base64
+import binascii
+import hashlib
+import io
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, List, NamedTuple, Sequence
+
+from PIL import Image
+from pptx.util import Emu, Inches
+
+logger = logging.getLogger(__name__)
+
+PPT_IMAGE_DPI = int(os.getenv("PPT_IMAGE_DPI", "150"))
+PPT_IMAGE_MARGIN_INCHES = 0.5
+PPT_IMAGE_MAX_COUNT = int(os.getenv("PPT_IMAGE_MAX_COUNT", "20"))
+PPT_IMAGE_MAX_BYTES = int(os.getenv("PPT_IMAGE_MAX_BYTES", str(8 * 1024 * 1024)))          # por imagen (decodificada)
+PPT_IMAGE_MAX_TOTAL_BYTES = int(os.getenv("PPT_IMAGE_MAX_TOTAL_BYTES", str(24 * 1024 * 1024)))
+PPT_IMAGE_MAX_PIXELS = int(os.getenv("PPT_IMAGE_MAX_PIXELS", str(40_000_000)))            # bomba de descompresión
+PPT_IMAGE_CACHE_MAX_BYTES = int(os.getenv("PPT_IMAGE_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+
+_EMU_PER_INCH = 914400
+_KEEP_FORMATS = ("PNG", "JPEG", "GIF")  # python-pptx los inserta tal cual
+
+
+class ImagePayloadTooLarge(ValueError):
+    """Demasiadas imágenes o demasiado grandes (se detecta sin decodificar)."""
+
+
+class PreparedImage(NamedTuple):
+    """Imagen lista para insertar: bytes (PNG/JPEG/GIF) y tamaño en píxeles."""
+    blob: bytes
+    width: int
+    height: int
+
+
+def _b64_text(value: str) -> str:
+    """Quita el prefijo data URL (data:image/png;base64,...) si viene del navegador."""
+    if value.startswith("data:"):
+        _, _, value = value.partition(",")
+    return value
+
+
+def _decoded_size(b64: str) -> int:
+    return len(b64) * 3 // 4
+
+
+def check_images(images: Sequence) -> None:
+    """Topes de cantidad y tamaño sobre el base64 (sin decodificar). Lanza ImagePayloadTooLarge."""
+    images = [img for img in images or [] if getattr(img, "base64", None)]
+    if len(images) > PPT_IMAGE_MAX_COUNT:
+        raise ImagePayloadTooLarge(f"Máximo {PPT_IMAGE_MAX_COUNT} imágenes por cotización")
+    total = 0
+    for img in images:
+        size = _decoded_size(_b64_text(img.base64))
+        if size > PPT_IMAGE_MAX_BYTES:
+            raise ImagePayloadTooLarge(f"Cada imagen puede pesar hasta {PPT_IMAGE_MAX_BYTES // (1024 * 1024)} MB")
+        total += size
+    if total > PPT_IMAGE_MAX_TOTAL_BYTES:
+        raise ImagePayloadTooLarge(f"Las imágenes suman más de {PPT_IMAGE_MAX_TOTAL_BYTES // (1024 * 1024)} MB")
+
+
+def prepare_image(b64: str, max_width: int, max_height: int) -> PreparedImage:
+    """Decodifica y reduce (sin agrandar) para caber en max_width × max_height píxeles.
+    Si ya cabe y el formato es PNG/JPEG/GIF, se usan los bytes originales."""
+    try:
+        raw = base64.b64decode(_b64_text(b64), validate=False)
+    except (binascii.Error, ValueError) as e:
+        raise ValueError("Imagen base64 inválida") from e
+    with Image.open(io.BytesIO(raw)) as im:  # solo lee la cabecera
+        if im.width * im.height > PPT_IMAGE_MAX_PIXELS:
+            raise ImagePayloadTooLarge("Imagen con demasiados píxeles")
+        if im.width <= max_width and im.height <= max_height and im.format in _KEEP_FORMATS:
+            return PreparedImage(raw, im.width, im.height)
+        alpha = im.mode in ("RGBA", "LA", "PA") or (im.mode == "P" and "transparency" in im.info)
+        keep_png = alpha or im.format in ("PNG", "GIF")
+        im.draft("RGB", (max_width, max_height))  # JPEG: decodifica ya reducido
+        im = im.convert("RGBA" if alpha else "RGB")
+        im.thumbnail((max_width, max_height), Image.LANCZOS)
+        out = io.BytesIO()
+        if keep_png:
+            im.save(out, format="PNG")
+        else:
+            im.save(out, format="JPEG", quality=85, optimize=True)
+        return PreparedImage(out.getvalue(), im.width, im.height)
+
+
+class ImageCache:
+    """LRU thread-safe por bytes: (sha256 del base64, caja destino) -> PreparedImage."""
+
+    def __init__(self, max_bytes: int = PPT_IMAGE_CACHE_MAX_BYTES):
+        self.max_bytes = max(0, max_bytes)
+        self._entries: "OrderedDict[tuple, PreparedImage]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, b64: str, max_width: int, max_height: int) -> PreparedImage:
+        text = _b64_text(b64)
+        key = (hashlib.sha256(text.encode("ascii", "ignore")).hexdigest(), max_width, max_height)
+        with self._lock:
+            hit = self._entries.get(key)
+            if hit is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return hit
+            self.misses += 1
+        prepared = prepare_image(text, max_width, max_height)  # fuera del lock: es lo caro
+        size = len(prepared.blob)
+        if size <= self.max_bytes:
+            with self._lock:
+                if key not in self._entries:
+                    self._entries[key] = prepared
+                    self._bytes += size
+                while self._bytes > self.max_bytes:
+                    _, old = self._entries.popitem(last=False)
+                    self._bytes -= len(old.blob)
+                    self.evictions += 1
+        return prepared
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+image_cache = ImageCache()
+
+
+def applicable_images(images: Sequence, quoted_types: Iterable[str]) -> List:
+    """Imágenes con contenido que aplican a los tipos cotizados (sin applicable_types = todas)."""
+    quoted = set(quoted_types)
+    return [
+        img for img in images or []
+        if getattr(img, "base64", None)
+        and (not img.applicable_types or not quoted or quoted.intersection(img.applicable_types))
+    ]
+
+
+def _blank_layout(prs):
+    """Layout con menos placeholders (normalmente "En blanco")."""
+    return min(prs.slide_layouts, key=lambda layout: len(layout.placeholders))
+
+
+def _move_last_slide(prs, index: int) -> None:
+    """Lleva la última slide agregada a la posición index (orden de sldIdLst)."""
+    sld_ids = prs.slides._sldIdLst
+    last = sld_ids[-1]
+    sld_ids.remove(last)
+    sld_ids.insert(index, last)
+
+
+def add_image_slides(prs, images: Sequence, after_slide=None) -> int:
+    """Una slide por imagen, tras after_slide (o al final). Devuelve cuántas se agregaron;
+    una imagen ilegible o con más de PPT_IMAGE_MAX_PIXELS se omite con aviso en el log."""
+    if not images:
+        return 0
+    margin = Inches(PPT_IMAGE_MARGIN_INCHES)
+    box_w, box_h = prs.slide_width - 2 * margin, prs.slide_height - 2 * margin
+    max_w = max(1, box_w * PPT_IMAGE_DPI // _EMU_PER_INCH)
+    max_h = max(1, box_h * PPT_IMAGE_DPI // _EMU_PER_INCH)
+    position = None
+    if after_slide is not None:
+        position = list(prs.slides).index(after_slide) + 1
+    layout = _blank_layout(prs)
+    added = 0
+    for img in images:
+        try:
+            prepared = image_cache.get(img.base64, max_w, max_h)
+        except ImagePayloadTooLarge as e:  # bomba de descompresión: no se decodifica
+            logger.warning("Imagen de la cotización omitida: %s", e)
+            continue
+        except Exception:  # base64 o formato inválido
+            logger.warning("Imagen de la cotización ilegible; se omite", exc_info=True)
+            continue
+        scale = min(box_w / prepared.width, box_h / prepared.height)
+        width, height = int(prepared.width * scale), int(prepared.height * scale)
+        slide = prs.slides.add_slide(layout)
+        for ph in list(slide.placeholders):
+            ph._element.getparent().remove(ph._element)
+        slide.shapes.add_picture(
+            io.BytesIO(prepared.blob),
+            Emu((prs.slide_width - width) // 2), Emu((prs.slide_height - height) // 2),
+            Emu(width), Emu(height),
+        )
+        if position is not None:
+            _move_last_slide(prs, position + added)
+        added += 1
+    return added
@@ -1,6 +1,6 @@
 # app/services/docgen/table_builder.py
 """Construcción de tabla unificada para PPT."""
-from typing import Callable, List, Tuple
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
 
 from pptx.util import Inches, Pt
 from pptx.enum.text import PP_ALIGN
@@ -28,22 +28,32 @@ def _cra_cell_value(
     return values
 
 
-def add_unified_table(
-    slide,
-    anchor_rect,
+class TableLayout(NamedTuple):
+    """Dimensiones y tamaños de fuente de la tabla unificada (comunes a ambos constructores)."""
+    cols: int
+    total_rows: int
+    has_totals: bool
+    r2: int                 # filas de "Totales por clínica" (0 = sin sección)
+    r3: int                 # filas de C/R/A (0 = sin sección)
+    spacer: int
+    row_h_emu: int
+    table_height: int
+    font_header: int
+    font_data: int
+    font_small: int
+
+
+def table_layout(
     group_defs: List[Tuple[str, List[str]]],
     tests_with_meta: List[Tuple[str, str, bool]],
-    get_val,
-    get_num_val,
-    get_cra_price,
     skip_total_row: bool,
     clinic_totals: List,
     cra_items: List[CRAItemRow],
-) -> None:
-    left, top, width, _ = anchor_rect
+) -> Optional[TableLayout]:
+    """None si no hay columnas de tipo (no se dibuja tabla)."""
     total_type_cols = sum(len(tps) for _, tps in group_defs)
     if total_type_cols == 0:
-        return
+        return None
     cols = 1 + total_type_cols
     row_h_emu = int(Inches(config.ROW_HEIGHT_INCHES))
 
@@ -58,9 +68,43 @@ def add_unified_table(
     total_rows = r1 + spacer_after_r1 + r2 + spacer_before_cra + r3
     table_height = total_rows * Inches(config.ROW_HEIGHT_INCHES)
 
-    font_header = max(6, 10 - total_rows // 10)
-    font_data = max(5, 9 - total_rows // 12)
-    font_small = max(5, 8 - total_rows // 15)
+    return TableLayout(
+        cols=cols,
+        total_rows=total_rows,
+        has_totals=has_totals,
+        r2=r2,
+        r3=r3,
+        spacer=spacer,
+        row_h_emu=row_h_emu,
+        table_height=table_height,
+        font_header=max(6, 10 - total_rows // 10),
+        font_data=max(5, 9 - total_rows // 12),
+        font_small=max(5, 8 - total_rows // 15),
+    )
+
+
+def add_unified_table(
+    slide,
+    anchor_rect,
+    group_defs: List[Tuple[str, List[str]]],
+    tests_with_meta: List[Tuple[str, str, bool]],
+    get_val,
+    get_num_val,
+    get_cra_price,
+    skip_total_row: bool,
+    clinic_totals: List,
+    cra_items: List[CRAItemRow],
+    column_totals: Optional[Dict[Tuple[str, str], float]] = None,
+) -> None:
+    """column_totals: {(protocolo, tipo): total} ya calculado; si falta, se suma con get_num_val."""
+    left, top, width, _ = anchor_rect
+    layout = table_layout(group_defs, tests_with_meta, skip_total_row, clinic_totals, cra_items)
+    if layout is None:
+        return
+    cols, total_rows, has_totals = layout.cols, layout.total_rows, layout.has_totals
+    r2, r3, spacer = layout.r2, layout.r3, layout.spacer
+    row_h_emu, table_height = layout.row_h_emu, layout.table_height
+    font_header, font_data, font_small = layout.font_header, layout.font_data, layout.font_small
 
     shape = slide.shapes.add_table(rows=total_rows, cols=cols, left=left, top=top, width=width, height=table_height)
     table = shape.table
@@ -119,12 +163,15 @@ def add_unified_table(
         cur_col = 1
         for proto, tps in group_defs:
             for t in tps:
-                total = 0.0
-                for _, rn, is_cra in tests_with_meta:
-                    if not is_cra:
-                        v = get_num_val(rn, proto, t)
-                        if v is not None:
-                            total += v
+                if column_totals is not None:
+                    total = column_totals[(proto, t)]
+                else:
+                    total = 0.0
+                    for _, rn, is_cra in tests_with_meta:
+                        if not is_cra:
+                            v = get_num_val(rn, proto, t)
+                            if v is not None:
+                                total += v
                 cell = table.cell(out_row, cur_col)
                 cell.text = f"S/ {total:.2f}" if total else "-"
                 cell.text_frame.paragraphs[0].font.bold = True
@@ -0,0 +1,187 @@
+# app/services/docgen/table_xml.py
+"""Emisor directo de la tabla unificada: arma las filas <a:tr> como XML en una pasada.
+
+Produce el mismo árbol que table_builder.add_unified_table (celdas, fusiones, negrita,
+tamaños de fuente, márgenes 0, sin relleno en separadores) pero sin pasar por la API de
+objetos de python-pptx, donde cada table.cell(r, c) recorre todas las filas. Las
+propiedades se precalculan como fragmentos XML (pPr por tamaño/negrita, tcPr con
+márgenes 0); el marco y la rejilla de columnas los crea python-pptx como siempre.
+"""
+import re
+from typing import Dict, List, Optional, Tuple
+from xml.sax.saxutils import escape
+
+from pptx.oxml import parse_xml
+from pptx.oxml.ns import nsdecls
+
+from app.constants import TYPE_LABELS
+from .table_builder import CRAItemRow, _cra_cell_value, table_layout
+
+_CTRL_CHARS = re.compile(r"([\x00-\x08\x0B-\x1F])")  # como CT_RegularTextRun (salvo \t y \n)
+
+_TCPR_MARGINS_ZERO = '<a:tcPr marL="0" marR="0" marT="0" marB="0"/>'
+_TCPR_SPACER = '<a:tcPr marL="0" marR="0" marT="0" marB="0"><a:noFill/></a:tcPr>'
+_TC_SPANNED_EMPTY = '<a:tc {attr}="1"><a:txBody><a:bodyPr/><a:lstStyle/><a:p/></a:txBody><a:tcPr/></a:tc>'
+
+
+def _escape_text(s: str) -> str:
+    return escape(_CTRL_CHARS.sub(lambda m: "_x%04X_" % ord(m.group(1)), s))
+
+
+class _CellXml:
+    """Fragmentos precalculados: un pPr por (negrita, tamaño) y las celdas fijas."""
+
+    def __init__(self):
+        self._ppr: Dict[Tuple[bool, Optional[int]], str] = {}
+
+    def ppr(self, bold: bool, size: Optional[int]) -> str:
+        key = (bold, size)
+        frag = self._ppr.get(key)
+        if frag is None:
+            attrs = ('b="1" ' if bold else "") + (f'sz="{size * 100}"' if size is not None else "")
+            frag = f"<a:pPr><a:defRPr {attrs.strip()}/></a:pPr>" if attrs else ""
+            self._ppr[key] = frag
+        return frag
+
+    def paragraphs(self, text: Optional[str], bold: bool, size: Optional[int]) -> str:
+        """Como cell.text = text + paragraphs[0].font: un <a:p> por línea, <a:br/> por \\v."""
+        first_ppr = self.ppr(bold, size)
+        out = []
+        for i, p_text in enumerate((text or "").split("\n")):
+            parts = [first_ppr] if i == 0 else []
+            for j, run in enumerate(p_text.split("\v")):
+                if j > 0:
+                    parts.append("<a:br/>")
+                if run:
+                    parts.append(f"<a:r><a:t>{_escape_text(run)}</a:t></a:r>")
+            out.append(f"<a:p>{''.join(parts)}</a:p>" if parts else "<a:p/>")
+        return "".join(out)
+
+    def cell(
+        self,
+        text: Optional[str],
+        bold: bool = False,
+        size: Optional[int] = None,
+        wrap: bool = False,
+        span: str = "",
+        tcpr: str = _TCPR_MARGINS_ZERO,
+    ) -> str:
+        body_pr = '<a:bodyPr wrap="square"/>' if wrap else "<a:bodyPr/>"
+        return (
+            f"<a:tc{span}><a:txBody>{body_pr}<a:lstStyle/>{self.paragraphs(text, bold, size)}"
+            f"</a:txBody>{tcpr}</a:tc>"
+        )
+
+    def spanned(self, bold: bool = False, size: Optional[int] = None, attr: str = "hMerge") -> str:
+        """Celda cubierta por una fusión (sin márgenes; pPr solo si se le fijó fuente)."""
+        if not bold and size is None:
+            return _TC_SPANNED_EMPTY.format(attr=attr)
+        return (
+            f'<a:tc {attr}="1"><a:txBody><a:bodyPr/><a:lstStyle/><a:p>{self.ppr(bold, size)}</a:p>'
+            f"</a:txBody><a:tcPr/></a:tc>"
+        )
+
+
+def emit_unified_table(
+    slide,
+    anchor_rect,
+    group_defs: List[Tuple[str, List[str]]],
+    tests_with_meta: List[Tuple[str, str, bool]],
+    get_val,
+    get_num_val,
+    get_cra_price,
+    skip_total_row: bool,
+    clinic_totals: List,
+    cra_items: List[CRAItemRow],
+    column_totals: Optional[Dict[Tuple[str, str], float]] = None,
+) -> None:
+    """Misma firma y resultado que add_unified_table. Todo el XML se arma y valida antes de
+    tocar la slide: si algo falla, la slide queda intacta y se puede usar el constructor clásico."""
+    layout = table_layout(group_defs, tests_with_meta, skip_total_row, clinic_totals, cra_items)
+    if layout is None:
+        return
+    left, top, width, _ = anchor_rect
+    cols = layout.cols
+    fh, fd, fs = layout.font_header, layout.font_data, layout.font_small
+    type_cols = [(proto, t) for proto, tps in group_defs for t in tps]
+    labels = [TYPE_LABELS.get(t, t.upper()) for _, t in type_cols]
+    x = _CellXml()
+    rows: List[str] = []
+
+    def row(cells: List[str]) -> None:
+        rows.append(f'<a:tr h="{layout.row_h_emu}">{"".join(cells)}</a:tr>')
+
+    def full_width_title(text: str) -> None:
+        row([x.cell(text, True, fh, span=f' gridSpan="{cols}"')] + [x.spanned(True, fh)] * (cols - 1))
+
+    def spacer_rows() -> None:
+        for _ in range(layout.spacer):
+            row([x.cell("", span=f' gridSpan="{cols}"', tcpr=_TCPR_SPACER)] + [x.spanned()] * (cols - 1))
+
+    # Sección 1: Pruebas (cabecera de dos filas)
+    top_row = [x.cell("NOMBRE DE PRUEBA", True, fh, span=' rowSpan="2"')]
+    for proto, tps in group_defs:
+        if not tps:
+            continue
+        span = f' gridSpan="{len(tps)}"' if len(tps) > 1 else ""
+        top_row.append(x.cell(str(proto), True, fh, span=span))
+        top_row.extend([x.spanned()] * (len(tps) - 1))
+    row(top_row)
+    row([x.spanned(attr="vMerge")] + [x.cell(label, True, fh) for label in labels])
+
+    for display_name, raw_name, _ in tests_with_meta:
+        row(
+            [x.cell(display_name, size=fd, wrap=True)]
+            + [x.cell(str(get_val(raw_name, proto, t)), size=fd) for proto, t in type_cols]
+        )
+
+    if layout.has_totals:
+        cells = [x.cell("TOTAL", True, fd)]
+        for proto, t in type_cols:
+            if column_totals is not None:
+                total = column_totals[(proto, t)]
+            else:
+                total = 0.0
+                for _, rn, is_cra in tests_with_meta:
+                    if not is_cra:
+                        v = get_num_val(rn, proto, t)
+                        if v is not None:
+                            total += v
+            cells.append(x.cell(f"S/ {total:.2f}" if total else "-", True, fd))
+        row(cells)
+
+    if layout.r2 or layout.r3:
+        spacer_rows()
+
+    if clinic_totals:
+        full_width_title("Totales por clínica")
+        row([x.cell("Clínica", True, fh)] + [x.cell(label, True, fh) for label in labels])
+        for ct in clinic_totals:
+            cells = [x.cell(f"Total - {ct.clinic}", size=fs)]
+            for _, t in type_cols:
+                val = ct.ingreso if t == "ingreso" else ct.periodico if t == "periodico" else ct.retiro
+                cells.append(x.cell(f"S/ {val:.2f}" if val else "-", size=fs))
+            row(cells)
+        if layout.r3:
+            spacer_rows()
+
+    if cra_items:
+        full_width_title("Exámenes condicionales / adicionales / requisitos")
+        row([x.cell("NOMBRE DE PRUEBA", True, fh)] + [x.cell(label, True, fh) for label in labels])
+        for letter, name, category, desc, classification in cra_items:
+            values = _cra_cell_value(letter, name, classification, get_cra_price, group_defs)
+            row(
+                [x.cell(f"({letter}) {name} ({category}) — {desc}", size=fs, wrap=True)]
+                + [x.cell(v, size=fs) for v in values]
+            )
+
+    new_rows = parse_xml(f"<a:tbl {nsdecls('a')}>{''.join(rows)}</a:tbl>")
+    if len(new_rows) != layout.total_rows:
+        raise ValueError(f"Tabla XML con {len(new_rows)} filas; se esperaban {layout.total_rows}")
+
+    # Marco, tblPr y rejilla de columnas de python-pptx; las filas se sustituyen por las emitidas
+    shape = slide.shapes.add_table(rows=1, cols=cols, left=left, top=top, width=width, height=layout.table_height)
+    tbl = shape.table._tbl
+    for tr in tbl.tr_lst:
+        tbl.remove(tr)
+    tbl.extend(list(new_rows))
@@ -0,0 +1,125 @@
+# app/services/docgen/template_pool.py
+"""Plantilla PPT precargada en memoria.
+
+Se guarda el .pptx en bytes junto con lo que build_ppt buscaba en cada generación:
+slide y rect del marcador {{TABLA}} y las formas con marcadores de portada. Cada
+cotización abre un clon desde memoria (sin leer disco). Se recarga si cambia el mtime
+o el tamaño del archivo; si el checksum es el mismo, se reutiliza lo ya analizado.
+"""
+import hashlib
+import io
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from pptx import Presentation
+
+from .config import PPT_TABLE_MARKER, TEXT_MARKERS
+from .helpers import must_template
+
+logger = logging.getLogger(__name__)
+
+
+class TemplateSnapshot(NamedTuple):
+    """Plantilla analizada: bytes + ubicaciones precalculadas (índices en prs.slides / slide.shapes)."""
+    path: str
+    blob: bytes
+    mtime_ns: int
+    size: int
+    checksum: str
+    anchor_slide: Optional[int]                   # slide con {{TABLA}} (None = no hay marcador)
+    anchor_shape: Optional[int]                   # índice de la forma marcador en esa slide
+    anchor_rect: Optional[Tuple[int, int, int, int]]  # left, top, width, height (EMU)
+    marker_shapes: Tuple[Tuple[int, int], ...]    # (slide, forma) con marcadores de portada
+    load_ms: float                                # lectura + análisis de la plantilla
+
+
+def _paragraph_texts(sp) -> List[str]:
+    return ["".join(r.text or "" for r in p.runs) for p in sp.text_frame.paragraphs]
+
+
+def analyze_template(prs: Presentation) -> Tuple[Optional[int], Optional[int], Optional[Tuple], Tuple]:
+    """(slide ancla, forma ancla, rect ancla, formas con marcadores), con el mismo criterio
+    que find_table_anchor y replace_markers_preserving_format."""
+    anchor_slide = anchor_shape = anchor_rect = None
+    markers = tuple(TEXT_MARKERS.values())
+    marker_shapes = []
+    for si, slide in enumerate(prs.slides):
+        for shi, sp in enumerate(slide.shapes):
+            if not getattr(sp, "has_text_frame", False):
+                continue
+            if anchor_slide is None and PPT_TABLE_MARKER in (sp.text or ""):
+                anchor_slide, anchor_shape = si, shi
+                anchor_rect = (sp.left, sp.top, sp.width, sp.height)
+            if any(k in text for text in _paragraph_texts(sp) for k in markers):
+                marker_shapes.append((si, shi))
+    return anchor_slide, anchor_shape, anchor_rect, tuple(marker_shapes)
+
+
+class TemplatePool:
+    """Plantilla en memoria, thread-safe; get() revisa el archivo con un stat por llamada."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snapshot: Optional[TemplateSnapshot] = None
+        self.loads = 0      # análisis completos (checksum nuevo)
+        self.reloads = 0    # cambios de mtime/tamaño detectados
+        self.clones = 0
+
+    def get(self) -> TemplateSnapshot:
+        path = must_template()
+        st = os.stat(path)
+        snap = self._snapshot
+        if snap is not None and snap.path == path and snap.mtime_ns == st.st_mtime_ns and snap.size == st.st_size:
+            return snap
+        with self._lock:
+            snap = self._snapshot
+            if snap is not None and snap.path == path and snap.mtime_ns == st.st_mtime_ns and snap.size == st.st_size:
+                return snap
+            t0 = time.perf_counter()
+            blob = Path(path).read_bytes()
+            checksum = hashlib.sha256(blob).hexdigest()
+            if snap is not None:
+                self.reloads += 1
+            if snap is not None and snap.checksum == checksum:
+                # Solo cambió el mtime (p. ej. touch / redeploy): mismo contenido
+                snap = snap._replace(path=path, mtime_ns=st.st_mtime_ns, size=len(blob))
+            else:
+                analyzed = analyze_template(Presentation(io.BytesIO(blob)))
+                snap = TemplateSnapshot(
+                    path, blob, st.st_mtime_ns, len(blob), checksum, *analyzed,
+                    load_ms=(time.perf_counter() - t0) * 1000,
+                )
+                self.loads += 1
+                logger.info("Plantilla PPT cargada: %s (%.1f ms, %d bytes)", path, snap.load_ms, len(blob))
+            self._snapshot = snap
+            return snap
+
+    def open(self) -> Tuple[Presentation, TemplateSnapshot]:
+        """Presentation nueva clonada desde los bytes en memoria + su snapshot."""
+        snap = self.get()
+        prs = Presentation(io.BytesIO(snap.blob))
+        self.clones += 1
+        return prs, snap
+
+    def clear(self) -> None:
+        with self._lock:
+            self._snapshot = None
+
+    def stats(self) -> Dict[str, object]:
+        snap = self._snapshot
+        return {
+            "path": snap.path if snap else None,
+            "checksum": snap.checksum if snap else None,
+            "size": snap.size if snap else 0,
+            "load_ms": round(snap.load_ms, 2) if snap else None,
+            "loads": self.loads,
+            "reloads": self.reloads,
+            "clones": self.clones,
+        }
+
+
+template_pool = TemplatePool()
@@ -0,0 +1,236 @@
+# app/services/generation_jobs.py
+"""Cotizaciones en segundo plano (jobs) para no depender del timeout del proxy.
+
+POST /jobs encola la cotización y responde al instante con un id; hilos worker locales
+ejecutan el mismo pipeline que /create (generate_quote) y dejan el ZIP en memoria para
+descargarlo. La cola es acotada (GENERATOR_JOB_QUEUE_MAX): llena = JobQueueFull (503).
+Los jobs terminados caducan a los GENERATOR_JOB_TTL_SECONDS y como mucho se guardan
+GENERATOR_JOB_MAX_KEPT (se descartan primero los más antiguos).
+"""
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from app.models.schemas import GenerationRequest
+from app.services.generator_service import generate_quote, quote_zip_name
+from app.services.render_pool import RenderPoolBusy
+
+logger = logging.getLogger(__name__)
+
+JOB_WORKERS = int(os.getenv("GENERATOR_JOB_WORKERS", "2"))
+JOB_QUEUE_MAX = int(os.getenv("GENERATOR_JOB_QUEUE_MAX", "20"))
+JOB_TTL_SECONDS = float(os.getenv("GENERATOR_JOB_TTL_SECONDS", "900"))
+JOB_MAX_KEPT = int(os.getenv("GENERATOR_JOB_MAX_KEPT", "100"))
+
+STAGES = ("catalog", "render", "zip")
+FINISHED = ("done", "error", "expired")
+
+
+class JobQueueFull(RuntimeError):
+    """No hay hueco en la cola de cotizaciones."""
+
+
+class GenerationJob:
+    """Estado de una cotización encolada. status: queued → running → done | error (→ expired)."""
+
+    def __init__(self, payload: GenerationRequest, owner: str, zip_name: str):
+        self.id = uuid.uuid4().hex
+        self.owner = owner
+        self.payload = payload
+        self.zip_name = zip_name
+        self.status = "queued"
+        self.stage: Optional[str] = None
+        self.stage_ms: Dict[str, float] = {}
+        self.error: Optional[str] = None
+        self.artifact: Optional[bytes] = None
+        self.cached = False
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self._stage_t0 = 0.0
+
+    def enter_stage(self, stage: str) -> None:
+        now = time.perf_counter()
+        if self.stage is not None:
+            self.stage_ms[self.stage] = round((now - self._stage_t0) * 1000, 1)
+        self.stage = stage
+        self._stage_t0 = now
+
+    def finish(self, status: str, error: Optional[str] = None) -> None:
+        if self.stage is not None and self.stage not in self.stage_ms:
+            self.stage_ms[self.stage] = round((time.perf_counter() - self._stage_t0) * 1000, 1)
+        self.status = status
+        self.error = error
+        self.finished_at = time.time()
+        self.payload = None  # ya no hace falta; libera memoria mientras espera la descarga
+
+    def to_dict(self) -> dict:
+        """Estado público: avance por etapa (pending/running/done/error) y tiempos en ms."""
+        stages = []
+        for name in STAGES:
+            if self.status == "done":
+                state = "done"  # con acierto de caché el render no llega a correr
+            elif name in self.stage_ms:
+                state = "error" if self.status == "error" and name == self.stage else "done"
+            elif name == self.stage and self.status == "running":
+                state = "running"
+            else:
+                state = "pending"
+            stages.append({"name": name, "status": state, "ms": self.stage_ms.get(name)})
+        done = sum(1 for s in stages if s["status"] == "done")
+        end = self.finished_at or time.time()
+        return {
+            "id": self.id,
+            "status": self.status,
+            "stage": self.stage,
+            "progress": round(done / len(STAGES), 2),
+            "stages": stages,
+            "error": self.error,
+            "file_name": self.zip_name if self.status == "done" else None,
+            "size": len(self.artifact) if self.artifact is not None else None,
+            "cached": self.cached,
+            "created_at": self.created_at,
+            "queued_ms": round(((self.started_at or end) - self.created_at) * 1000, 1),
+            "total_ms": round((end - self.started_at) * 1000, 1) if self.started_at else None,
+            "expires_at": self.finished_at + JOB_TTL_SECONDS if self.finished_at else None,
+        }
+
+
+class GenerationJobQueue:
+    """Cola acotada + workers en hilos (arrancan con el primer job) + registro con caducidad."""
+
+    def __init__(self, workers: int = JOB_WORKERS, max_queued: int = JOB_QUEUE_MAX):
+        self.workers = max(1, workers)
+        self.max_queued = max(1, max_queued)
+        self._queue: "queue.Queue[Optional[GenerationJob]]" = queue.Queue(maxsize=self.max_queued)
+        self._jobs: "OrderedDict[str, GenerationJob]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._threads: List[threading.Thread] = []
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.expired = 0
+
+    def _ensure_workers(self) -> None:
+        with self._lock:
+            self._threads = [t for t in self._threads if t.is_alive()]
+            for i in range(len(self._threads), self.workers):
+                t = threading.Thread(target=self._worker, name=f"generation-job-{i}", daemon=True)
+                t.start()
+                self._threads.append(t)
+
+    def submit(self, payload: GenerationRequest, owner: str) -> GenerationJob:
+        self.sweep()
+        job = GenerationJob(payload, owner, quote_zip_name(payload))
+        self._ensure_workers()
+        with self._lock:
+            self._jobs[job.id] = job
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            with self._lock:
+                self._jobs.pop(job.id, None)
+                self.rejected += 1
+            raise JobQueueFull("Cola de cotizaciones llena")
+        return job
+
+    def get(self, job_id: str) -> Optional[GenerationJob]:
+        self.sweep()
+        return self._jobs.get(job_id)
+
+    def _worker(self) -> None:
+        while True:
+            job = self._queue.get()
+            try:
+                if job is None:
+                    return
+                self._run(job)
+            finally:
+                self._queue.task_done()
+
+    def _count(self, counter: str) -> None:
+        """Suma 1 a un contador de stats() bajo el lock (los workers terminan en paralelo)."""
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def _run(self, job: GenerationJob) -> None:
+        with self._lock:
+            self.running += 1
+        job.status = "running"
+        job.started_at = time.time()
+        try:
+            artifact = generate_quote(job.payload, on_stage=job.enter_stage)
+            job.enter_stage("zip")
+            job.artifact = b"".join(artifact.chunks)
+            job.cached = artifact.cached
+            job.finish("done")
+            self._count("completed")
+        except RenderPoolBusy:
+            job.finish("error", "Hay muchas cotizaciones en curso. Intenta de nuevo.")
+            self._count("failed")
+        except Exception:
+            logger.exception("Error en job de cotización %s", job.id)
+            job.finish("error", "Error al generar el documento. Intenta de nuevo.")
+            self._count("failed")
+        finally:
+            with self._lock:
+                self.running -= 1
+
+    def sweep(self) -> None:
+        """Caduca los terminados pasado el TTL y recorta los más antiguos sobre JOB_MAX_KEPT."""
+        now = time.time()
+        with self._lock:
+            finished = [j for j in self._jobs.values() if j.status in FINISHED]
+            for j in finished:
+                if j.finished_at and now - j.finished_at > JOB_TTL_SECONDS:
+                    self._drop(j)
+            finished = [j for j in self._jobs.values() if j.status in FINISHED]
+            for j in finished[: max(0, len(finished) - JOB_MAX_KEPT)]:
+                self._drop(j)
+
+    def _drop(self, job: GenerationJob) -> None:
+        self._jobs.pop(job.id, None)
+        job.artifact = None
+        if job.status != "expired":
+            job.status = "expired"
+            self.expired += 1
+
+    def shutdown(self, timeout: float = 5.0) -> None:
+        """Para los workers al terminar la app (los jobs en cola se descartan)."""
+        with self._lock:
+            threads, self._threads = self._threads, []
+        while True:
+            try:
+                self._queue.get_nowait()
+                self._queue.task_done()
+            except queue.Empty:
+                break
+        for _ in threads:
+            self._queue.put(None)
+        for t in threads:
+            t.join(timeout)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            statuses = [j.status for j in self._jobs.values()]
+            return {
+                "workers": self.workers,
+                "queue_max": self.max_queued,
+                "queue_depth": self._queue.qsize(),
+                "running": self.running,
+                "kept": len(statuses),
+                "ready": statuses.count("done"),
+                "completed": self.completed,
+                "failed": self.failed,
+                "rejected": self.rejected,
+                "expired": self.expired,
+            }
+
+
+generation_jobs = GenerationJobQueue()
@@ -1,14 +1,381 @@
+import hashlib
+import io
+import json
+import logging
+import os
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import date
 from pathlib import Path
-from app.models.schemas import GenerationRequest
-from app.services.docgen import build_ppt
+from tempfile import SpooledTemporaryFile
+from typing import BinaryIO, Callable, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from app.constants import CRA_CLASSIFICATIONS
+from app.models.schemas import BatchGenerationRequest, ClinicTotal, GenerationRequest, Selection
+from app.services.artifact_cache import artifact_cache, iter_file
+from app.services.audit_service import log_quote_generated
+from app.services.catalog_service import get_catalog, get_catalog_change_revision, get_catalogs_bulk
+from app.services.docgen import build_ppt, template_pool
+from app.services.price_matrix import MATRIX_AVAILABLE, PRICE_TYPES, compute_clinic_prices, compute_clinic_totals
+from app.services.render_pool import render_pool
 from app.utils.xlsx_generator import create_xlsx
+from app.utils.zip_stream import iter_zip
+
+logger = logging.getLogger(__name__)
+
+# Documentos en memoria hasta este tamaño; por encima, SpooledTemporaryFile pasa a disco
+SPOOL_MAX_BYTES = int(os.getenv("GENERATOR_SPOOL_MAX_BYTES", str(16 * 1024 * 1024)))
+# Propuestas de un lote renderizándose a la vez (con o sin pool de procesos)
+BATCH_RENDER_THREADS = int(os.getenv("GENERATOR_BATCH_THREADS", str(min(4, os.cpu_count() or 1))))
+
+
+class RenderedDocument(NamedTuple):
+    """Documento generado: nombre dentro del ZIP y contenido (posicionado al inicio)."""
+    name: str
+    data: BinaryIO
+
+
+def pptx_name(payload: GenerationRequest) -> str:
+    return f"cotizacion_{payload.proposal_number}.pptx"
+
+
+def xlsx_name(payload: GenerationRequest) -> str:
+    return f"resumen_{payload.proposal_number}.xlsx"
+
 
 def generate_pptx(payload: GenerationRequest, outdir: str) -> str:
-    out = Path(outdir) / f"cotizacion_{payload.proposal_number}.pptx"
+    out = Path(outdir) / pptx_name(payload)
     build_ppt(payload, str(out))
     return str(out)
 
 def generate_xlsx(payload: GenerationRequest, outdir: str) -> str:
-    out = Path(outdir) / f"resumen_{payload.proposal_number}.xlsx"
+    out = Path(outdir) / xlsx_name(payload)
     create_xlsx(payload, str(out))
     return str(out)
+
+
+def _spooled() -> SpooledTemporaryFile:
+    return SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES, mode="w+b")
+
+
+def render_documents(payload: GenerationRequest) -> List[RenderedDocument]:
+    """PPTX y XLSX en buffers (sin TEMP_DIR), listos para iter_zip.
+    Con RENDER_WORKERS > 0 ambos se generan a la vez en el pool de procesos."""
+    if render_pool.enabled:
+        pptx_bytes, xlsx_bytes = render_pool.render(payload)
+        return [
+            RenderedDocument(pptx_name(payload), io.BytesIO(pptx_bytes)),
+            RenderedDocument(xlsx_name(payload), io.BytesIO(xlsx_bytes)),
+        ]
+    docs: List[RenderedDocument] = []
+    try:
+        pptx = _spooled()
+        docs.append(RenderedDocument(pptx_name(payload), pptx))
+        build_ppt(payload, pptx)
+        xlsx = _spooled()
+        docs.append(RenderedDocument(xlsx_name(payload), xlsx))
+        create_xlsx(payload, xlsx)
+    except Exception:
+        for d in docs:
+            d.data.close()
+        raise
+    for d in docs:
+        d.data.seek(0)
+    return docs
+
+
+def _slug(s: str) -> str:
+    import re, unicodedata
+    s = unicodedata.normalize("NFKD", s).encode("ascii", "ignore").decode("ascii")
+    s = re.sub(r"[^A-Za-z0-9._-]+", "_", s).strip("_")
+    return s or "archivo"
+
+def compute_quote_clinic_totals(payload: GenerationRequest, catalogs_by_clinic: dict) -> list:
+    """Calcula totales por clínica (sedes provincia): ingreso, periodico, retiro excluyendo C/R/A.
+    catalogs_by_clinic: {clinic_name: catalog} precargados (solo sin NumPy; con NumPy usa PriceMatrix)."""
+    clinics = payload.clinics or []
+    if not clinics:
+        return []
+    if MATRIX_AVAILABLE:
+        totals = compute_clinic_totals(payload.selections or [], clinics, payload.margin or 20.0)
+        return [ClinicTotal(**t) for t in totals]
+    result = []
+    for clinic_name in clinics:
+        catalog = catalogs_by_clinic.get(clinic_name, [])
+        by_name = {t["name"]: t["prices"] for t in catalog}
+        ingreso = periodico = retiro = 0.0
+        for s in payload.selections or []:
+            if (getattr(s, "classification", None) or "").strip() in CRA_CLASSIFICATIONS:
+                continue
+            prices = by_name.get(s.name, {})
+            for t in s.types:
+                v = (s.overrides or {}).get(t, prices.get(t, 0.0))
+                try:
+                    v = float(v)
+                except (TypeError, ValueError):
+                    v = 0.0
+                if t == "ingreso":
+                    ingreso += v
+                elif t == "periodico":
+                    periodico += v
+                elif t == "retiro":
+                    retiro += v
+        result.append(ClinicTotal(clinic=clinic_name, ingreso=round(ingreso, 2), periodico=round(periodico, 2), retiro=round(retiro, 2)))
+    return result
+
+
+def compute_quote_clinic_prices(payload: GenerationRequest, catalogs_by_clinic: dict) -> dict:
+    """Precio por prueba seleccionada × sede × tipo para la comparación del XLSX
+    ({prueba: {sede: {tipo: precio}}}), mismas reglas que compute_quote_clinic_totals."""
+    clinics = payload.clinics or []
+    if not clinics:
+        return {}
+    if MATRIX_AVAILABLE:
+        return compute_clinic_prices(payload.selections or [], clinics, payload.margin or 20.0)
+    by_clinic = {c: {t["name"]: t["prices"] for t in catalogs_by_clinic.get(c, [])} for c in clinics}
+    result = {}
+    for s in payload.selections or []:
+        if s.name in result:
+            continue
+        overrides = s.overrides or {}
+        row = {}
+        for clinic_name in clinics:
+            prices = by_clinic[clinic_name].get(s.name, {})
+            row[clinic_name] = {t: float(overrides.get(t, prices.get(t, 0.0)) or 0.0) for t in PRICE_TYPES}
+        result[s.name] = row
+    return result
+
+
+def prepare_payload_for_docgen(payload: GenerationRequest, lima_catalog: list) -> GenerationRequest:
+    """
+    Retorna una copia del payload lista para docgen.
+    En Provincia: selecciones con precios Lima (sin mutar el original).
+    lima_catalog: catálogo Lima precargado.
+    """
+    if payload.location != "Provincia" or not payload.clinic_totals:
+        return payload
+    lima_by_name = {t["name"]: dict(t.get("prices", {})) for t in lima_catalog}
+    new_selections = []
+    for s in (payload.selections or []):
+        if s.name in lima_by_name:
+            new_selections.append(Selection(
+                id=s.id, testId=s.testId, name=s.name, category=s.category,
+                protocol=s.protocol, types=s.types,
+                prices=lima_by_name[s.name],
+                classification=s.classification, detail=s.detail or "",
+                overrides={},
+            ))
+        else:
+            new_selections.append(s)
+    return payload.model_copy(update={"selections": new_selections})
+
+
+def quote_zip_name(payload: GenerationRequest) -> str:
+    return f"cotizacion_{_slug(payload.company)}_{payload.proposal_number}.zip"
+
+
+def prepare_quote(payload: GenerationRequest) -> GenerationRequest:
+    """Completa clinic_totals y clinic_prices en payload (si hay sedes provincia) y devuelve la copia para docgen."""
+    # Precargar catálogos una sola vez (optimización: evita N llamadas a get_catalog)
+    margin = payload.margin or 20.0
+    lima_catalog = None
+    catalogs_by_clinic = {}
+    
+    if payload.clinics:
+        # Cargar catálogo Lima si es necesario para Provincia
+        if payload.location == "Provincia":
+            lima_catalog = get_catalog("Lima", None, 0)
+        # Sin NumPy: catálogos de todas las clínicas en una sola pasada (pruebas y máximos una vez)
+        if (not payload.clinic_totals or payload.clinic_prices is None) and not MATRIX_AVAILABLE:
+            catalogs_by_clinic = get_catalogs_bulk("Provincia", payload.clinics, margin)
+    
+    # Totales por clínica si hay sedes provincia seleccionadas
+    if not payload.clinics:
+        payload.clinic_totals = []
+        payload.clinic_prices = None
+    else:
+        if not payload.clinic_totals:
+            payload.clinic_totals = compute_quote_clinic_totals(payload, catalogs_by_clinic)
+        if payload.clinic_prices is None:
+            payload.clinic_prices = compute_quote_clinic_prices(payload, catalogs_by_clinic)
+
+    # Copia para docgen: en Provincia, primera tabla usa precios Lima (sin mutar payload)
+    if lima_catalog is None and payload.location == "Provincia" and payload.clinic_totals:
+        lima_catalog = get_catalog("Lima", None, 0)
+    docgen_payload = prepare_payload_for_docgen(payload, lima_catalog or [])
+    return docgen_payload
+
+
+# Sube al cambiar docgen/xlsx de forma que el mismo payload dé otro documento
+ARTIFACT_FORMAT = "3"
+# Campos que el frontend genera por fila y no salen en los documentos
+_VOLATILE_FIELDS = {"selections": {"__all__": {"id", "testId"}}}
+
+
+class QuoteArtifact(NamedTuple):
+    """ZIP de la cotización: nombre, bloques para enviar y si salió de la caché."""
+    name: str
+    chunks: Iterator[bytes]
+    cached: bool
+
+
+def quote_cache_key(docgen_payload: GenerationRequest) -> str:
+    """Hash de la cotización ya preparada (clinic_totals y precios Lima resueltos), sin campos
+    volátiles, junto con la revisión del catálogo, el checksum de la plantilla y la fecha de portada."""
+    canonical = json.dumps(
+        docgen_payload.model_dump(mode="json", exclude=_VOLATILE_FIELDS),
+        sort_keys=True, separators=(",", ":"), ensure_ascii=False,
+    )
+    parts = [
+        ARTIFACT_FORMAT,
+        str(get_catalog_change_revision()),
+        template_pool.get().checksum,
+        date.today().isoformat(),  # {{FECHA}} en la portada
+        canonical,
+    ]
+    return hashlib.sha256("\n".join(parts).encode("utf-8")).hexdigest()
+
+
+def generate_quote(
+    payload: GenerationRequest, on_stage: Optional[Callable[[str], None]] = None
+) -> QuoteArtifact:
+    """Pipeline completo de una cotización (endpoint síncrono y jobs): catálogos y totales,
+    caché de artefactos o render de PPTX + XLSX, y auditoría (también en aciertos de caché).
+    on_stage("catalog" | "render") marca el avance."""
+    if on_stage:
+        on_stage("catalog")
+    docgen_payload = prepare_quote(payload)
+    name = quote_zip_name(payload)
+    key = None
+    if artifact_cache.enabled:
+        try:
+            key = quote_cache_key(docgen_payload)
+        except Exception:
+            logger.exception("No se pudo calcular la clave de caché; se genera sin caché")
+        cached = artifact_cache.open(key) if key else None
+        if cached is not None:
+            log_quote_generated(payload, success=True)
+            return QuoteArtifact(name, iter_file(cached), True)
+    if on_stage:
+        on_stage("render")
+    try:
+        docs = render_documents(docgen_payload)
+    except Exception as e:
+        try:
+            log_quote_generated(payload, success=False, error_message=str(e))
+        except Exception:
+            pass
+        raise
+    log_quote_generated(payload, success=True)
+    chunks = iter_zip([(d.name, d.data) for d in docs])
+    if key:
+        chunks = artifact_cache.tee(key, chunks)
+    return QuoteArtifact(name, chunks, False)
+
+
+class BatchItemResult(NamedTuple):
+    """Resultado de una propuesta del lote: carpeta en el ZIP y error (None = generada)."""
+    folder: str
+    payload: GenerationRequest
+    docs: List[RenderedDocument]
+    error: Optional[str]
+
+
+def batch_payloads(batch: BatchGenerationRequest) -> List[GenerationRequest]:
+    """Un GenerationRequest por destinatario: cuerpo común + portada propia."""
+    shared = batch.model_dump(exclude={"recipients"})
+    return [
+        GenerationRequest(**{**shared, **r.model_dump(exclude_none=True)})
+        for r in batch.recipients
+    ]
+
+
+def _render_batch_item(item: GenerationRequest) -> Tuple[List[RenderedDocument], Optional[str]]:
+    try:
+        docs = render_documents(item)
+    except Exception as e:
+        logger.exception("Error en propuesta %s del lote", item.proposal_number)
+        return [], str(e) or e.__class__.__name__
+    return docs, None
+
+
+def generate_batch(batch: BatchGenerationRequest) -> Iterator[BatchItemResult]:
+    """Genera las propuestas del lote. Catálogos y clinic_totals se resuelven una vez, aquí
+    (solo dependen de pruebas, sedes y margen, no de la portada; un error sale antes de
+    empezar a enviar); la plantilla ya está en memoria. El render va en el iterador devuelto:
+    hasta BATCH_RENDER_THREADS propuestas a la vez y cada una se entrega (y audita) en cuanto
+    termina, así en memoria solo quedan las que están en curso o esperando al ZIP.
+    Un fallo en una propuesta se registra y no corta el resto."""
+    payloads = batch_payloads(batch)
+    base = payloads[0]
+    docgen_base = prepare_quote(base)
+    for p in payloads[1:]:
+        p.clinic_totals = base.clinic_totals  # también para la auditoría
+        p.clinic_prices = base.clinic_prices
+    items = [p.model_copy(update={"selections": docgen_base.selections}) for p in payloads]
+    return _render_batch(payloads, items)
+
+
+def _render_batch(payloads: List[GenerationRequest], items: List[GenerationRequest]) -> Iterator[BatchItemResult]:
+    threads = max(1, BATCH_RENDER_THREADS)
+    executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="batch-render")
+    queued = iter(enumerate(items))
+    running = {}
+
+    def submit_next() -> None:
+        for i, item in queued:
+            running[executor.submit(_render_batch_item, item)] = i
+            return
+
+    try:
+        for _ in range(threads):
+            submit_next()
+        while running:
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                i = running.pop(future)
+                submit_next()
+                docs, error = future.result()
+                payload = payloads[i]
+                folder = f"{i + 1:02d}_{_slug(payload.company)}_{_slug(payload.proposal_number)}"
+                try:
+                    log_quote_generated(payload, success=error is None, error_message=error)
+                except Exception:
+                    logger.exception("No se pudo auditar la propuesta %s del lote", payload.proposal_number)
+                yield BatchItemResult(folder, payload, docs, error)
+    finally:
+        # Cliente cortó la descarga: no se empiezan más y se liberan las ya renderizadas
+        executor.shutdown(wait=True, cancel_futures=True)
+        for future in running:
+            if not future.cancelled():
+                for d in future.result()[0]:
+                    d.data.close()
+
+
+def batch_zip_members(results: Iterable[BatchItemResult]) -> Iterator[Tuple[str, BinaryIO]]:
+    """Miembros del ZIP del lote, a medida que llegan las propuestas: una carpeta por propuesta
+    y al final resumen_lote.json con el estado de cada una (en orden de carpeta)."""
+    summary = []
+    results = iter(results)
+    unsent: List[RenderedDocument] = []
+    try:
+        for r in results:
+            summary.append({
+                "folder": r.folder,
+                "company": r.payload.company,
+                "proposal_number": r.payload.proposal_number,
+                "ok": r.error is None,
+                "error": r.error,
+            })
+            unsent = list(r.docs)
+            while unsent:
+                d = unsent.pop(0)
+                yield f"{r.folder}/{d.name}", d.data
+    finally:
+        for d in unsent:  # descarga cortada a mitad de una propuesta
+            d.data.close()
+        close = getattr(results, "close", None)
+        if close is not None:
+            close()
+    summary.sort(key=lambda item: item["folder"])
+    data = json.dumps(summary, ensure_ascii=False, indent=2).encode("utf-8")
+    yield "resumen_lote.json", io.BytesIO(data)
@@ -0,0 +1,297 @@
+# app/services/price_import_jobs.py
+"""Importación de precios en segundo plano (jobs) para archivos grandes de proveedores.
+
+POST /api/prices/import-jobs copia la subida a un archivo temporal, la encola y responde con
+un id. Un pool propio y acotado de hilos (PRICES_IMPORT_JOB_WORKERS, por defecto 1) corre
+import_prices_from_xlsx con su propia sesión, así una importación no ocupa hilos del
+threadpool de la API ni compite con otras importaciones. Cola llena = ImportQueueFull (503).
+
+El estado (filas leídas, celdas aplicadas, errores, filas/s) se actualiza en cada aviso de
+avance. Cancelar marca el job; el worker lo ve en el siguiente aviso y hace rollback de toda
+la transacción (nada queda a medias). Los errores van fila a fila a un CSV en disco
+(descargable) y en memoria solo se guardan los primeros. Los terminados caducan a los
+PRICES_IMPORT_JOB_TTL_SECONDS y se guardan como mucho PRICES_IMPORT_JOB_MAX_KEPT.
+"""
+import csv
+import logging
+import os
+import queue
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from app.database import SessionLocal
+from app.services.catalog_cache import bump_catalog_revision
+from app.services.price_import_service import (
+    ImportFileError,
+    PriceImporter,
+    import_prices_from_xlsx,
+    remove_quietly,
+)
+
+logger = logging.getLogger(__name__)
+
+IMPORT_JOB_WORKERS = int(os.getenv("PRICES_IMPORT_JOB_WORKERS", "1"))
+IMPORT_JOB_QUEUE_MAX = int(os.getenv("PRICES_IMPORT_JOB_QUEUE_MAX", "5"))
+IMPORT_JOB_TTL_SECONDS = float(os.getenv("PRICES_IMPORT_JOB_TTL_SECONDS", "3600"))
+IMPORT_JOB_MAX_KEPT = int(os.getenv("PRICES_IMPORT_JOB_MAX_KEPT", "50"))
+
+FINISHED = ("done", "error", "cancelled", "expired")
+NO_ROWS_ERROR = "El archivo no tiene filas de datos. Usa la plantilla con los encabezados indicados."
+
+
+class ImportQueueFull(RuntimeError):
+    """No hay hueco en la cola de importaciones."""
+
+
+class ImportCancelled(Exception):
+    """El usuario canceló la importación (se lanza desde el aviso de avance)."""
+
+
+class PriceImportJob:
+    """Estado de una importación. status: queued → running → done | error | cancelled (→ expired)."""
+
+    def __init__(self, path: str, owner: str, file_name: str):
+        self.id = uuid.uuid4().hex
+        self.owner = owner
+        self.file_name = file_name
+        self.path: Optional[str] = path
+        self.report_path: Optional[str] = None
+        self.status = "queued"
+        self.error: Optional[str] = None
+        self.rows_parsed = 0
+        self.cells_applied = 0
+        self.inserted = 0
+        self.updated = 0
+        self.tests_created = 0
+        self.error_count = 0
+        self.errors: List[str] = []
+        self.cancel_requested = threading.Event()
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+    def update(self, importer: PriceImporter) -> None:
+        self.rows_parsed = importer.rows_parsed
+        self.cells_applied = importer.cells_applied
+        self.inserted = importer.inserted
+        self.updated = importer.updated
+        self.tests_created = importer.tests_created
+        self.error_count = importer.error_count
+        self.errors = importer.errors[:]
+
+    def finish(self, status: str, error: Optional[str] = None) -> None:
+        self.status = status
+        self.error = error
+        self.finished_at = time.time()
+        remove_quietly(self.path)  # el XLSX ya no hace falta
+        self.path = None
+
+    def to_dict(self) -> dict:
+        """Estado público: contadores, throughput (filas/s) y tiempos."""
+        end = self.finished_at or time.time()
+        elapsed = (end - self.started_at) if self.started_at else 0.0
+        return {
+            "id": self.id,
+            "status": self.status,
+            "file_name": self.file_name,
+            "rows_parsed": self.rows_parsed,
+            "cells_applied": self.cells_applied,
+            "inserted": self.inserted,
+            "updated": self.updated,
+            "tests_created": self.tests_created,
+            "error_count": self.error_count,
+            "errors": self.errors,
+            "error": self.error,
+            "has_error_report": self.report_path is not None and self.error_count > 0,
+            "rows_per_second": round(self.rows_parsed / elapsed, 1) if elapsed > 0 else None,
+            "created_at": self.created_at,
+            "queued_ms": round(((self.started_at or end) - self.created_at) * 1000, 1),
+            "total_ms": round(elapsed * 1000, 1) if self.started_at else None,
+            "expires_at": self.finished_at + IMPORT_JOB_TTL_SECONDS if self.finished_at else None,
+        }
+
+
+class PriceImportJobQueue:
+    """Cola acotada + workers en hilos (arrancan con el primer job) + registro con caducidad."""
+
+    def __init__(self, workers: int = IMPORT_JOB_WORKERS, max_queued: int = IMPORT_JOB_QUEUE_MAX):
+        self.workers = max(1, workers)
+        self.max_queued = max(1, max_queued)
+        self._queue: "queue.Queue[Optional[PriceImportJob]]" = queue.Queue(maxsize=self.max_queued)
+        self._jobs: "OrderedDict[str, PriceImportJob]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._threads: List[threading.Thread] = []
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+        self.cancelled = 0
+        self.rejected = 0
+        self.expired = 0
+
+    def _ensure_workers(self) -> None:
+        with self._lock:
+            self._threads = [t for t in self._threads if t.is_alive()]
+            for i in range(len(self._threads), self.workers):
+                t = threading.Thread(target=self._worker, name=f"price-import-job-{i}", daemon=True)
+                t.start()
+                self._threads.append(t)
+
+    def submit(self, path: str, owner: str, file_name: str) -> PriceImportJob:
+        """Encola el XLSX ya copiado en path (el job pasa a ser su dueño y lo borra)."""
+        self.sweep()
+        job = PriceImportJob(path, owner, file_name)
+        self._ensure_workers()
+        with self._lock:
+            self._jobs[job.id] = job
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            with self._lock:
+                self._jobs.pop(job.id, None)
+                self.rejected += 1
+            remove_quietly(path)
+            raise ImportQueueFull("Cola de importaciones llena")
+        return job
+
+    def get(self, job_id: str) -> Optional[PriceImportJob]:
+        self.sweep()
+        return self._jobs.get(job_id)
+
+    def cancel(self, job: PriceImportJob) -> None:
+        """En cola: se cancela ya. En curso: el worker hace rollback en el siguiente aviso."""
+        with self._lock:
+            if job.status == "queued":
+                job.finish("cancelled")
+                self.cancelled += 1
+            elif job.status == "running":
+                job.cancel_requested.set()
+
+    def _worker(self) -> None:
+        while True:
+            job = self._queue.get()
+            try:
+                if job is None:
+                    return
+                if job.status == "queued":  # puede haberse cancelado en cola
+                    self._run(job)
+            finally:
+                self._queue.task_done()
+
+    def _progress(self, job: PriceImportJob, importer: PriceImporter) -> None:
+        job.update(importer)
+        if job.cancel_requested.is_set():
+            raise ImportCancelled()
+
+    def _count(self, counter: str) -> None:
+        """Suma 1 a un contador de stats() bajo el lock (los workers terminan en paralelo)."""
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def _run(self, job: PriceImportJob) -> None:
+        with self._lock:
+            if job.status != "queued":
+                return
+            self.running += 1
+            job.status = "running"
+        job.started_at = time.time()
+        fd, job.report_path = tempfile.mkstemp(prefix="errores_precios_", suffix=".csv")
+        db = SessionLocal()
+        try:
+            with os.fdopen(fd, "w", newline="", encoding="utf-8-sig") as report:
+                writer = csv.writer(report)
+                writer.writerow(["fila", "error"])
+                importer = import_prices_from_xlsx(
+                    db, job.path,
+                    on_progress=lambda imp: self._progress(job, imp),
+                    on_error=lambda row, message: writer.writerow([row or "", message]),
+                )
+            if not importer.rows_parsed:
+                db.rollback()
+                job.finish("error", NO_ROWS_ERROR)
+                self._count("failed")
+                return
+            db.commit()
+            bump_catalog_revision("tests", "prices")
+            job.finish("done")
+            self._count("completed")
+        except ImportCancelled:
+            db.rollback()
+            job.finish("cancelled")
+            self._count("cancelled")
+        except ImportFileError:
+            db.rollback()
+            job.finish("error", "El archivo no es válido.")
+            self._count("failed")
+        except Exception:
+            logger.exception("Error en importación de precios %s", job.id)
+            db.rollback()
+            job.finish("error", "Error al importar. Intenta de nuevo.")
+            self._count("failed")
+        finally:
+            db.close()
+            with self._lock:
+                self.running -= 1
+
+    def sweep(self) -> None:
+        """Caduca los terminados pasado el TTL y recorta los más antiguos sobre IMPORT_JOB_MAX_KEPT."""
+        now = time.time()
+        with self._lock:
+            finished = [j for j in self._jobs.values() if j.status in FINISHED]
+            for j in finished:
+                if j.finished_at and now - j.finished_at > IMPORT_JOB_TTL_SECONDS:
+                    self._drop(j)
+            finished = [j for j in self._jobs.values() if j.status in FINISHED]
+            for j in finished[: max(0, len(finished) - IMPORT_JOB_MAX_KEPT)]:
+                self._drop(j)
+
+    def _drop(self, job: PriceImportJob) -> None:
+        self._jobs.pop(job.id, None)
+        remove_quietly(job.report_path)
+        job.report_path = None
+        if job.status != "expired":
+            job.status = "expired"
+            self.expired += 1
+
+    def shutdown(self, timeout: float = 5.0) -> None:
+        """Para los workers al terminar la app: los de la cola se descartan y los que están
+        corriendo se cancelan (rollback)."""
+        with self._lock:
+            threads, self._threads = self._threads, []
+            jobs = list(self._jobs.values())
+        for job in jobs:
+            if job.status == "running":
+                job.cancel_requested.set()
+        while True:
+            try:
+                job = self._queue.get_nowait()
+                if job is not None and job.status == "queued":
+                    job.finish("cancelled")
+                self._queue.task_done()
+            except queue.Empty:
+                break
+        for _ in threads:
+            self._queue.put(None)
+        for t in threads:
+            t.join(timeout)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "queue_max": self.max_queued,
+                "queue_depth": self._queue.qsize(),
+                "running": self.running,
+                "kept": len(self._jobs),
+                "completed": self.completed,
+                "failed": self.failed,
+                "cancelled": self.cancelled,
+                "rejected": self.rejected,
+                "expired": self.expired,
+            }
+
+
+price_import_jobs = PriceImportJobQueue()
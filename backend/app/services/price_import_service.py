@@ -1,44 +1,155 @@
-"""Lógica compartida para importar precios (CSV/script y API XLSX)."""
-from typing import List, Dict, Any, Tuple
+"""Lógica compartida para importar precios (CSV/script y API XLSX).
 
+La API no lee el XLSX entero: spooled_upload() copia la subida a un archivo temporal,
+iter_xlsx_rows() recorre la hoja en modo read_only fila a fila y PriceImporter escribe
+por bloques de IMPORT_CHUNK_SIZE celdas, así la memoria no crece con el tamaño del archivo.
+"""
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+from typing import Any, BinaryIO, Callable, Container, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import insert, select
 from sqlalchemy.orm import Session
 
 from app.models.db_models import Test, Clinic, Price
+from app.services.catalog_changes_service import record_catalog_reset
+from app.services.price_upsert_service import UPSERT_CHUNK_SIZE, PriceCell, existing_price_keys, upsert_price_cells
+from app.services.provincia_max_service import rebuild_provincia_max
+
+# La importación no toca no_realiza de filas existentes (se edita desde la grilla)
+IMPORT_COLUMNS = ("ingreso", "periodico", "retiro")
+IMPORT_CHUNK_SIZE = int(os.getenv("PRICES_IMPORT_CHUNK_SIZE", "10000"))   # celdas por flush
+IMPORT_MAX_ERRORS = int(os.getenv("PRICES_IMPORT_MAX_ERRORS", "1000"))   # mensajes guardados (se cuentan todos)
+PREVIEW_DIFF_LIMIT = 200  # celdas del diff por página en /preview
+DIFF_STATUSES = ("inserted", "changed", "unchanged")
+IMPORT_PROGRESS_ROWS = 1000  # filas entre avisos de avance (y chequeos de cancelación)
+XLSX_COLUMNS = ("prueba", "categoria", "clinica", "ingreso", "periodico", "retiro")
+_SPOOL_CHUNK = 1024 * 1024
+
+
+class ImportFileError(ValueError):
+    """El archivo no se puede leer como XLSX."""
+
+
+def spool_to_temp(fileobj: BinaryIO, suffix: str = ".xlsx") -> str:
+    """Copia la subida a un archivo temporal por bloques de 1 MB. El llamador lo borra."""
+    fd, path = tempfile.mkstemp(prefix="precios_", suffix=suffix)
+    try:
+        with os.fdopen(fd, "wb") as out:
+            shutil.copyfileobj(fileobj, out, _SPOOL_CHUNK)
+    except BaseException:
+        remove_quietly(path)
+        raise
+    return path
+
+
+def remove_quietly(path: Optional[str]) -> None:
+    if path:
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+
+
+@contextmanager
+def spooled_upload(fileobj: BinaryIO, suffix: str = ".xlsx") -> Iterator[str]:
+    """spool_to_temp que se borra al salir del bloque."""
+    path = spool_to_temp(fileobj, suffix)
+    try:
+        yield path
+    finally:
+        remove_quietly(path)
 
 
-def validate_import_rows(db: Session, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+def iter_xlsx_rows(path: str) -> Iterator[Dict[str, Any]]:
+    """Filas de la hoja activa como dicts (keys de XLSX_COLUMNS + 'row', número de fila en Excel).
+    Lectura perezosa (read_only): nunca hay más de una fila en memoria. Sin columnas prueba y
+    categoria no devuelve nada; filas sin prueba se saltan."""
+    from openpyxl import load_workbook
+
+    try:
+        wb = load_workbook(path, read_only=True, data_only=True)
+    except Exception as e:
+        raise ImportFileError("El archivo no es válido.") from e
+    try:
+        ws = wb.active
+        if ws is None:
+            return
+        rows_iter = ws.iter_rows(values_only=True)
+        header = next(rows_iter, None)
+        if not header:
+            return
+        # Normalizar nombres de columna (minúsculas, sin espacios)
+        col_names = [str(h).strip().lower() if h is not None else "" for h in header]
+        idx = {name: col_names.index(name) for name in XLSX_COLUMNS if name in col_names}
+        if "prueba" not in idx or "categoria" not in idx:
+            return
+        last_col = max(idx.values())
+        for row_number, row in enumerate(rows_iter, start=2):
+            if not row or len(row) <= last_col:
+                continue
+            prueba = row[idx["prueba"]]
+            if prueba is None or (isinstance(prueba, str) and not prueba.strip()):
+                continue
+            out: Dict[str, Any] = {"row": row_number}
+            for name in XLSX_COLUMNS:
+                v = row[idx[name]] if name in idx else None
+                if name in ("ingreso", "periodico", "retiro"):
+                    out[name] = 0 if v is None else v
+                else:
+                    out[name] = "" if v is None else str(v)
+            yield out
+    finally:
+        wb.close()
+
+
+def validate_import_rows(db: Session, rows: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
     """
     Valida filas sin escribir en BD. Retorna lista de dicts con las mismas keys
     más 'valid' (bool) y 'error' (str opcional).
     """
+    return list(iter_validated_rows(db, rows))
+
+
+def iter_validated_rows(db: Session, rows: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+    """Versión perezosa de validate_import_rows (una fila a la vez)."""
     clinic_names = {c.name for c in db.query(Clinic).all()}
-    result = []
     for row in rows:
-        prueba = _norm(row.get("prueba", ""))
-        categoria = _norm(row.get("categoria", ""))
-        clinica = _norm_clinic(row.get("clinica", ""))
+        _, error = parse_import_row(row, clinic_names)
         out = dict(row)
-        out["valid"] = True
-        out["error"] = None
-        if not prueba or not categoria:
-            out["valid"] = False
-            out["error"] = "Falta prueba o categoría"
-            result.append(out)
-            continue
-        try:
-            float(row.get("ingreso", 0) or 0)
-            float(row.get("periodico", 0) or 0)
-            float(row.get("retiro", 0) or 0)
-        except (ValueError, TypeError):
-            out["valid"] = False
-            out["error"] = "Ingreso, periódico o retiro deben ser números"
-            result.append(out)
-            continue
-        if clinica not in ("Lima", "TODAS") and clinica not in clinic_names:
-            out["valid"] = False
-            out["error"] = f"Clínica no encontrada: {clinica}"
-        result.append(out)
-    return result
+        out["valid"] = error is None
+        out["error"] = error
+        yield out
+
+
+class ImportRow(NamedTuple):
+    """Fila normalizada: clinica es Lima, TODAS o el nombre de una sede existente."""
+    prueba: str
+    categoria: str
+    clinica: str
+    ingreso: float
+    periodico: float
+    retiro: float
+
+
+def parse_import_row(row: Dict[str, Any], clinic_names: Container[str]) -> Tuple[Optional[ImportRow], Optional[str]]:
+    """Normaliza y valida una fila: (ImportRow, None) o (None, mensaje de error).
+    Reglas únicas para validación, previsualización e importación: una fila con montos no
+    numéricos se rechaza (no se importa como 0)."""
+    prueba = _norm(row.get("prueba", ""))
+    categoria = _norm(row.get("categoria", ""))
+    clinica = _norm_clinic(row.get("clinica", ""))
+    if not prueba or not categoria:
+        return None, "Falta prueba o categoría"
+    try:
+        amounts = [float(row.get(k, 0) or 0) for k in IMPORT_COLUMNS]
+    except (ValueError, TypeError):
+        return None, "Ingreso, periódico o retiro deben ser números"
+    if clinica not in ("Lima", "TODAS") and clinica not in clinic_names:
+        return None, f"Clínica no encontrada: {clinica}"
+    return ImportRow(prueba, categoria, clinica, *amounts), None
 
 
 def _norm(s: str) -> str:
@@ -54,99 +165,263 @@ def _norm_clinic(c: str) -> str:
     return v
 
 
-def import_prices_from_rows(db: Session, rows: List[Dict[str, Any]]) -> Tuple[int, List[str]]:
+class PriceImporter:
+    """Motor único de importación (API y scripts/import_prices.py).
+
+    feed() normaliza filas y las deja en memoria por (prueba, categoría, sede), gana la
+    última; TODAS se expande a cada clínica provincia. flush() crea en bloque las pruebas
+    que faltan (INSERT ... RETURNING) y escribe los precios con upsert_price_cells
+    (ON CONFLICT por bloques). finish() reconstruye los máximos provincia y marca snapshot
+    para clientes delta-sync. Nada hace commit: la transacción es del llamador.
+    create_tests=False (dry run del script): una prueba inexistente es error y no se crea.
+    on_error(fila, mensaje) recibe todos los errores aunque errors se corte en max_errors.
+    track_sources=True (preview) guarda por celda pendiente su fila y si vino de TODAS.
+    cells_applied cuenta celdas aplicadas por flush: dentro de un bloque se deduplica, pero
+    una misma (prueba, sede) repetida en bloques distintos cuenta una vez por bloque.
+    """
+
+    def __init__(
+        self,
+        db: Session,
+        create_tests: bool = True,
+        max_errors: Optional[int] = None,
+        on_error: Optional[Callable[[Optional[int], str], None]] = None,
+        track_sources: bool = False,
+    ):
+        self.db = db
+        self.create_tests = create_tests
+        self.max_errors = max_errors
+        self.on_error = on_error
+        self.clinics = {c.name: c.id for c in db.query(Clinic).all()}
+        self.tests_by_key: Dict[Tuple[str, str], int] = {
+            (name, category): tid for tid, name, category in db.execute(select(Test.id, Test.name, Test.category))
+        }
+        self.pending: Dict[Tuple[str, str, Optional[int]], Tuple[float, float, float]] = {}
+        self.sources: Optional[Dict[Tuple[str, str, Optional[int]], Tuple[Optional[int], bool]]] = (
+            {} if track_sources else None
+        )
+        self.todas_rows = 0
+        self.errors: List[str] = []
+        self.error_count = 0
+        self.rows_parsed = 0
+        self.cells_applied = 0
+        self.tests_created = 0
+        self.inserted = 0
+        self.updated = 0
+
+    def _error(self, message: str, row_number: Optional[int]) -> None:
+        self.error_count += 1
+        if self.on_error:
+            self.on_error(row_number, message)
+        if self.max_errors is None or len(self.errors) < self.max_errors:
+            self.errors.append(f"Fila {row_number}: {message}" if row_number else message)
+
+    def add_row(self, row: Dict[str, Any]) -> Optional[str]:
+        """Una fila del archivo; 'row' (opcional) es su número para los mensajes de error.
+        Devuelve el error si la fila se descarta (mismas reglas que parse_import_row)."""
+        self.rows_parsed += 1
+        row_number = row.get("row")
+        parsed, error = parse_import_row(row, self.clinics)
+        if parsed is not None and not self.create_tests and (parsed.prueba, parsed.categoria) not in self.tests_by_key:
+            error = f"Prueba no existe (se crearía): {parsed.prueba} / {parsed.categoria}"
+        if error is not None:
+            self._error(error, row_number)
+            return error
+        if parsed.clinica == "Lima":
+            clinic_ids: Iterable[Optional[int]] = (None,)
+        elif parsed.clinica == "TODAS":
+            clinic_ids = self.clinics.values()
+        else:
+            clinic_ids = (self.clinics[parsed.clinica],)
+        values = (parsed.ingreso, parsed.periodico, parsed.retiro)
+        todas = parsed.clinica == "TODAS"
+        self.todas_rows += todas
+        for cid in clinic_ids:
+            key = (parsed.prueba, parsed.categoria, cid)
+            self.pending[key] = values
+            if self.sources is not None:
+                self.sources[key] = (row_number, todas)
+        return None
+
+    def feed(self, rows: Iterable[Dict[str, Any]]) -> None:
+        for row in rows:
+            self.add_row(row)
+
+    def _create_missing_tests(self) -> None:
+        missing = list(dict.fromkeys(
+            (name, category) for name, category, _ in self.pending if (name, category) not in self.tests_by_key
+        ))
+        if not missing:
+            return
+        tests = Test.__table__
+        returning = self.db.get_bind().dialect.insert_executemany_returning
+        for i in range(0, len(missing), UPSERT_CHUNK_SIZE):
+            chunk = [{"name": n, "category": c} for n, c in missing[i:i + UPSERT_CHUNK_SIZE]]
+            if returning:
+                created = self.db.execute(insert(tests).returning(tests.c.id, tests.c.name, tests.c.category), chunk)
+            else:
+                self.db.execute(insert(tests), chunk)
+                names = [r["name"] for r in chunk]
+                created = self.db.execute(select(tests.c.id, tests.c.name, tests.c.category).where(tests.c.name.in_(names)))
+            for tid, name, category in created:
+                self.tests_by_key.setdefault((name, category), tid)
+        self.tests_created += len(missing)
+
+    def flush(self) -> int:
+        """Escribe lo pendiente. Devuelve cuántas celdas de precio se escribieron."""
+        if not self.pending:
+            return 0
+        self._create_missing_tests()
+        cells = [
+            PriceCell(self.tests_by_key[(name, category)], cid, *values)
+            for (name, category, cid), values in self.pending.items()
+        ]
+        self.pending = {}
+        if self.sources is not None:
+            self.sources = {}
+        existing = existing_price_keys(self.db, (c.test_id for c in cells))
+        counts = upsert_price_cells(self.db, cells, existing=existing, columns=IMPORT_COLUMNS)
+        self.inserted += counts.inserted
+        self.updated += counts.updated
+        self.cells_applied += len(cells)
+        return len(cells)
+
+    def finish(self) -> None:
+        self.flush()
+        # Máximos provincia: reconstrucción completa tras carga masiva; clientes delta-sync -> snapshot
+        rebuild_provincia_max(self.db)
+        record_catalog_reset(self.db)
+
+
+def import_prices_from_rows(
+    db: Session, rows: List[Dict[str, Any]], create_tests: bool = True
+) -> Tuple[int, List[str]]:
     """
     Inserta/actualiza precios a partir de filas con keys: prueba, categoria, clinica, ingreso, periodico, retiro.
     clinica: vacío/Lima -> Lima; TODAS/* -> todas las clínicas; nombre -> esa clínica.
-    Retorna (filas procesadas, lista de errores).
-    Optimizado: batch de queries para evitar N+1.
+    Filas repetidas para la misma prueba y sede: gana la última.
+    Retorna (celdas aplicadas, lista de errores).
     """
-    clinics = {c.name: c.id for c in db.query(Clinic).all()}
-    tests_by_key = {}
-    for t in db.query(Test).all():
-        tests_by_key[(t.name, t.category)] = t.id
-
-    rows_done = 0
-    errors = []
-    
-    # 1) Parsear todas las filas y preparar (test_id, clinic_id) a actualizar/insertar
-    price_updates = []  # (test_id, clinic_id, ingreso, periodico, retiro)
-    
-    for row in rows:
-        prueba = _norm(row.get("prueba", ""))
-        categoria = _norm(row.get("categoria", ""))
-        clinica = _norm_clinic(row.get("clinica", ""))
-        try:
-            ingreso = float(row.get("ingreso", 0) or 0)
-        except (ValueError, TypeError):
-            ingreso = 0.0
-        try:
-            periodico = float(row.get("periodico", 0) or 0)
-        except (ValueError, TypeError):
-            periodico = 0.0
-        try:
-            retiro = float(row.get("retiro", 0) or 0)
-        except (ValueError, TypeError):
-            retiro = 0.0
+    importer = PriceImporter(db, create_tests=create_tests)
+    importer.feed(rows)
+    importer.finish()
+    return importer.cells_applied, importer.errors
 
-        if not prueba or not categoria:
-            errors.append(f"Fila sin prueba/categoria: {prueba!r} / {categoria!r}")
-            continue
 
-        key = (prueba, categoria)
-        if key not in tests_by_key:
-            test = Test(name=prueba, category=categoria)
-            db.add(test)
-            db.flush()
-            tests_by_key[key] = test.id
-        test_id = tests_by_key[key]
-
-        if clinica == "Lima":
-            clinic_ids = [None]
-        elif clinica == "TODAS":
-            clinic_ids = list(clinics.values())
-        else:
-            if clinica not in clinics:
-                errors.append(f"Clínica no encontrada: {clinica}")
-                continue
-            clinic_ids = [clinics[clinica]]
+def import_prices_from_xlsx(
+    db: Session,
+    path: str,
+    chunk_size: int = IMPORT_CHUNK_SIZE,
+    on_progress: Optional[Callable[[PriceImporter], None]] = None,
+    max_errors: Optional[int] = IMPORT_MAX_ERRORS,
+    on_error: Optional[Callable[[Optional[int], str], None]] = None,
+    progress_every: int = IMPORT_PROGRESS_ROWS,
+) -> PriceImporter:
+    """Importa el XLSX en streaming: filas perezosas y flush cada chunk_size celdas pendientes
+    (memoria acotada). on_progress(importer) se llama tras cada bloque, cada progress_every
+    filas leídas y al final; si lanza, la importación se corta ahí. Sin commit: ante un error
+    la transacción del llamador se descarta entera. Lanza ImportFileError si no es un XLSX."""
+    importer = PriceImporter(db, max_errors=max_errors, on_error=on_error)
+    for row in iter_xlsx_rows(path):
+        importer.add_row(row)
+        if len(importer.pending) >= chunk_size:
+            importer.flush()
+            if on_progress:
+                on_progress(importer)
+        elif on_progress and importer.rows_parsed % progress_every == 0:
+            on_progress(importer)
+    importer.finish()
+    if on_progress:
+        on_progress(importer)
+    return importer
 
-        for cid in clinic_ids:
-            price_updates.append((test_id, cid, ingreso, periodico, retiro))
-    
-    # 2) Cargar todos los precios existentes para (test_id, clinic_id) en una query
-    test_ids_set = {tid for tid, _, _, _, _ in price_updates}
-    existing_prices = (
-        db.query(Price)
-        .filter(Price.test_id.in_(test_ids_set))
-        .all()
-    )
-    existing_by_key = {(p.test_id, p.clinic_id): p for p in existing_prices}
-    
-    # 3) Aplicar updates/inserts en memoria
-    new_prices = []
-    for test_id, clinic_id, ingreso, periodico, retiro in price_updates:
-        key = (test_id, clinic_id)
-        if key in existing_by_key:
-            # Update
-            existing_by_key[key].ingreso = ingreso
-            existing_by_key[key].periodico = periodico
-            existing_by_key[key].retiro = retiro
+
+def preview_import_rows(
+    db: Session,
+    rows: Iterable[Dict[str, Any]],
+    diff_offset: int = 0,
+    diff_limit: int = PREVIEW_DIFF_LIMIT,
+    diff_status: Optional[str] = None,
+) -> Dict[str, Any]:
+    """Previsualización sin escribir: validación por fila (rows, validCount, invalidCount) y
+    diff por celda contra los precios actuales.
+
+    Todas las filas pasan por el mismo PriceImporter.add_row que la importación (validación,
+    TODAS expandido, gana la última), sin flush: valid/error de cada fila es lo que decidió. Los precios actuales se leen de una vez para las pruebas
+    afectadas (IN por bloques), nunca fila a fila. Cada celda es inserted (prueba o precio
+    nuevo), changed (con old → new y los campos que cambian) o unchanged; todas=True si vino
+    de una fila TODAS. diff.summary cuenta todo; diff.cells trae solo la página pedida
+    (diff_offset, diff_limit, filtro diff_status), así la UI pagina sin recibir el diff entero.
+    """
+    importer = PriceImporter(db, track_sources=True)
+    validated: List[Dict[str, Any]] = []
+    for row in rows:
+        error = importer.add_row(row)  # misma decisión que la importación: entra al diff o se descarta
+        out = dict(row)
+        out["valid"] = error is None
+        out["error"] = error
+        validated.append(out)
+    valid_count = sum(1 for r in validated if r["valid"])
+
+    test_ids = {importer.tests_by_key.get((name, category)) for name, category, _ in importer.pending}
+    test_ids.discard(None)
+    current: Dict[Tuple[int, Optional[int]], Tuple[float, float, float]] = {}
+    ids = sorted(test_ids)
+    for i in range(0, len(ids), UPSERT_CHUNK_SIZE):
+        q = select(Price.test_id, Price.clinic_id, Price.ingreso, Price.periodico, Price.retiro).where(
+            Price.test_id.in_(ids[i:i + UPSERT_CHUNK_SIZE])
+        )
+        for tid, cid, ingreso, periodico, retiro in db.execute(q):
+            current[(tid, cid)] = (float(ingreso or 0), float(periodico or 0), float(retiro or 0))
+
+    clinic_names = {cid: name for name, cid in importer.clinics.items()}
+    summary = {"cells": 0, "inserted": 0, "changed": 0, "unchanged": 0, "new_tests": 0,
+               "todas_rows": importer.todas_rows, "todas_cells": 0}
+    new_tests = set()
+    page: List[Dict[str, Any]] = []
+    matched = 0
+    for (name, category, cid), values in importer.pending.items():
+        row_number, todas = importer.sources[(name, category, cid)]
+        tid = importer.tests_by_key.get((name, category))
+        old = current.get((tid, cid)) if tid is not None else None
+        if tid is None:
+            new_tests.add((name, category))
+        if old is None:
+            status, changed = "inserted", []
         else:
-            # Insert
-            new_prices.append(
-                Price(
-                    test_id=test_id,
-                    clinic_id=clinic_id,
-                    ingreso=ingreso,
-                    periodico=periodico,
-                    retiro=retiro,
-                )
-            )
-        rows_done += 1
-    
-    # 4) Bulk insert de nuevos precios
-    if new_prices:
-        db.add_all(new_prices)
-
-    return rows_done, errors
+            changed = [f for f, o, n in zip(IMPORT_COLUMNS, old, values) if round(o, 4) != round(n, 4)]
+            status = "changed" if changed else "unchanged"
+        summary["cells"] += 1
+        summary[status] += 1
+        summary["todas_cells"] += todas
+        if diff_status and status != diff_status:
+            continue
+        if diff_offset <= matched < diff_offset + diff_limit:
+            page.append({
+                "row": row_number,
+                "prueba": name,
+                "categoria": category,
+                "test_id": tid,
+                "clinic_id": cid,
+                "clinica": "Lima" if cid is None else clinic_names.get(cid, ""),
+                "todas": todas,
+                "status": status,
+                "old": dict(zip(IMPORT_COLUMNS, old)) if old is not None else None,
+                "new": dict(zip(IMPORT_COLUMNS, values)),
+                "changed_fields": changed,
+            })
+        matched += 1
+    summary["new_tests"] = len(new_tests)
+    return {
+        "rows": validated,
+        "validCount": valid_count,
+        "invalidCount": len(validated) - valid_count,
+        "diff": {
+            "summary": summary,
+            "status": diff_status,
+            "total": matched,
+            "offset": diff_offset,
+            "limit": diff_limit,
+            "cells": page,
+        },
+    }
@@ -0,0 +1,294 @@
+# app/services/price_matrix.py
+"""Matriz densa de precios provincia (NumPy) para resolver catálogos y totales por clínica.
+
+Carga `prices` (solo sedes en provincia) una vez en un array tests × clinics × 3
+(ingreso, periodico, retiro) más las máscaras `present` (hay fila) y `no_realiza`.
+Las reglas son las de catalog_service._get_catalog_provincia, vectorizadas:
+  - precio de la sede si existe y no es todo 0;
+  - si no, el MAYOR entre sedes provincia (0 si ninguna tiene fila);
+  - margen % con redondeo a 2 decimales.
+Se reconstruye cuando cambia la revisión del catálogo. NumPy es opcional: si no
+está instalado, MATRIX_AVAILABLE es False y el catálogo usa las consultas SQL.
+"""
+import threading
+from typing import Any, Dict, List, Optional, Sequence
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.constants import CRA_CLASSIFICATIONS
+from app.database import SessionLocal
+from app.models.db_models import Clinic, Price, Test
+from app.services.catalog_cache import get_catalog_revision
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - numpy es opcional
+    np = None  # type: ignore
+
+MATRIX_AVAILABLE = np is not None
+
+PRICE_TYPES = ("ingreso", "periodico", "retiro")
+_TYPE_INDEX = {t: i for i, t in enumerate(PRICE_TYPES)}
+
+
+def _positions(ids: "np.ndarray", values: "np.ndarray") -> "np.ndarray":
+    """Posición de cada value dentro de ids (todos presentes)."""
+    order = np.argsort(ids, kind="stable")
+    return order[np.searchsorted(ids, values, sorter=order)]
+
+
+class PriceMatrix:
+    """Precios provincia en memoria: prices[test, clinic, type]."""
+
+    def __init__(self, revision: int, tests: Sequence, clinics: Sequence, rows: Sequence):
+        self.revision = revision
+        self.test_ids = [t.id for t in tests]
+        self.names = [t.name for t in tests]
+        self.categories = [t.category for t in tests]
+        self.test_index: Dict[int, int] = {tid: i for i, tid in enumerate(self.test_ids)}
+        # Mismo criterio que {t["name"]: ...} sobre el catálogo: a igual nombre, gana el último
+        self.name_index: Dict[str, int] = {n: i for i, n in enumerate(self.names)}
+        self.clinic_names = [c.name for c in clinics]
+        self.clinic_index: Dict[str, int] = {n: j for j, n in enumerate(self.clinic_names)}
+
+        n, m = len(self.test_ids), len(self.clinic_names)
+        self.prices = np.zeros((n, m, 3), dtype=np.float64)
+        self.present = np.zeros((n, m), dtype=bool)
+        self.no_realiza = np.zeros((n, m), dtype=bool)
+        if len(rows):
+            # rows: (test_id, clinic_id, ingreso, periodico, retiro, no_realiza)
+            data = np.array([tuple(r) for r in rows], dtype=np.float64).reshape(len(rows), 6)
+            ti = _positions(np.array(self.test_ids, dtype=np.int64), data[:, 0].astype(np.int64))
+            ci = _positions(np.array([c.id for c in clinics], dtype=np.int64), data[:, 1].astype(np.int64))
+            self.prices[ti, ci] = np.nan_to_num(data[:, 2:5])
+            self.present[ti, ci] = True
+            self.no_realiza[ti, ci] = np.nan_to_num(data[:, 5]) != 0
+
+        # Fallback: máximo por prueba solo entre filas existentes (como MAX() en SQL)
+        self.has_prov = self.present.any(axis=1)
+        masked = np.where(self.present[:, :, None], self.prices, -np.inf)
+        self.prov_max = np.where(self.has_prov[:, None], masked.max(axis=1, initial=-np.inf), 0.0)
+        # Costo "usable" de la sede: existe y no es todo 0
+        self.usable = self.present & (self.prices != 0).any(axis=2)
+
+    @classmethod
+    def load(cls, db: Session, revision: int) -> "PriceMatrix":
+        tests = db.query(Test.id, Test.name, Test.category).order_by(Test.category, Test.name).all()
+        clinics = db.query(Clinic.id, Clinic.name).order_by(Clinic.name).all()
+        # Core select (sin ORM): ~900k filas en 5k × 300 sedes
+        rows = db.execute(
+            select(Price.test_id, Price.clinic_id, Price.ingreso, Price.periodico, Price.retiro, Price.no_realiza)
+            .where(Price.clinic_id.isnot(None))
+        ).all()
+        return cls(revision, tests, clinics, rows)
+
+    def clinic_cols(self, clinic_names: Sequence[str]) -> List[Optional[int]]:
+        """Columna de cada sede (None = sede desconocida: solo fallback)."""
+        return [self.clinic_index.get(n) for n in clinic_names]
+
+    def resolve_base(self, clinic_cols: Sequence[Optional[int]], rows: Optional[Any] = None) -> "np.ndarray":
+        """Costo base (clinics × tests × 3) con fallback, sin margen. rows: subconjunto de filas."""
+        r = slice(None) if rows is None else rows
+        fallback = self.prov_max[r]
+        out = np.empty((len(clinic_cols),) + fallback.shape, dtype=np.float64)
+        for k, col in enumerate(clinic_cols):
+            if col is None:
+                out[k] = fallback
+            else:
+                out[k] = np.where(self.usable[r, col][:, None], self.prices[r, col], fallback)
+        return out
+
+    def resolve(
+        self, clinic_cols: Sequence[Optional[int]], margin: float, rows: Optional[Any] = None
+    ) -> "np.ndarray":
+        """Precio final (clinics × tests × 3) con fallback y margen. rows: subconjunto de filas."""
+        return _apply_margin(self.resolve_base(clinic_cols, rows), margin)
+
+    def catalogs(self, clinic_names: Sequence[str], margin: float) -> Dict[str, List[Dict[str, Any]]]:
+        """Catálogos provincia ({sede: catálogo}) con el mismo formato que get_catalog."""
+        names = list(dict.fromkeys(clinic_names))
+        resolved = self.resolve(self.clinic_cols(names), margin)
+        result = {}
+        for k, clinic_name in enumerate(names):
+            values = resolved[k].tolist()
+            result[clinic_name] = [
+                {
+                    "id": tid,
+                    "name": name,
+                    "category": cat,
+                    "prices": {"ingreso": v[0], "periodico": v[1], "retiro": v[2]},
+                }
+                for tid, name, cat, v in zip(self.test_ids, self.names, self.categories, values)
+            ]
+        return result
+
+    def selection_weights(self, selections: Sequence) -> tuple:
+        """(filas, pesos filas × 3, constante 3) de una selección: C/R/A excluidas;
+        overrides suman como constante (igual para todas las sedes)."""
+        weights: Dict[int, List[float]] = {}
+        const = [0.0, 0.0, 0.0]
+        for s in selections or []:
+            if (getattr(s, "classification", None) or "").strip() in CRA_CLASSIFICATIONS:
+                continue
+            row = self.name_index.get(s.name)
+            if row is None:
+                row = self.test_index.get(getattr(s, "testId", None))
+            overrides = s.overrides or {}
+            for t in s.types:
+                ti = _TYPE_INDEX.get(t)
+                if ti is None:
+                    continue
+                if t in overrides:
+                    try:
+                        const[ti] += float(overrides[t])
+                    except (TypeError, ValueError):
+                        pass
+                elif row is not None:
+                    weights.setdefault(row, [0.0, 0.0, 0.0])[ti] += 1.0
+        rows = np.fromiter(weights.keys(), dtype=np.intp, count=len(weights))
+        w = np.array(list(weights.values()), dtype=np.float64).reshape(len(weights), 3)
+        return rows, w, np.array(const, dtype=np.float64)
+
+    def clinic_totals(self, selections: Sequence, clinic_names: Sequence[str], margin: float) -> "np.ndarray":
+        """Totales (clinics × 3) ingreso/periodico/retiro por sede, sin redondear."""
+        rows, w, const = self.selection_weights(selections)
+        resolved = self.resolve(self.clinic_cols(clinic_names), margin, rows=rows)
+        return np.einsum("knt,nt->kt", resolved, w) + const
+
+    def simulate(self, selections: Sequence, clinic_names: Sequence[str], margins: Sequence[float]) -> Dict[str, Any]:
+        """Rejilla de totales margins × clinics × 3 en una pasada, más por sede cuántas pruebas
+        seleccionadas usan el fallback (sin costo propio) y cuántas marca como no_realiza."""
+        rows, w, const = self.selection_weights(selections)
+        cols = self.clinic_cols(clinic_names)
+        base = self.resolve_base(cols, rows=rows)  # clinics × rows × 3
+        factors = 1 + np.asarray(margins, dtype=np.float64) / 100
+        priced = round_prices(base[None, :, :, :] * factors[:, None, None, None])
+        totals = np.einsum("mknt,nt->mkt", priced, w) + const
+        fallback = np.zeros(len(cols), dtype=np.int64)
+        no_realiza = np.zeros(len(cols), dtype=np.int64)
+        for k, col in enumerate(cols):
+            if col is None:
+                fallback[k] = len(rows)
+            else:
+                fallback[k] = int((~self.usable[rows, col]).sum())
+                no_realiza[k] = int(self.no_realiza[rows, col].sum())
+        return {"totals": totals, "fallback": fallback, "no_realiza": no_realiza}
+
+
+def round_price(value: float) -> float:
+    """Redondeo de un precio a 2 decimales: round() de Python. Regla única de SQL y matriz."""
+    return round(value, 2)
+
+
+def round_prices(values: "np.ndarray") -> "np.ndarray":
+    """round_price elemento a elemento. np.round escala ×100 y desempata el medio centavo
+    distinto que round() (277.94 × 1.25 da 347.42 y no 347.43): esos casos se recalculan con
+    round_price; el resto coincide."""
+    out = np.round(values, 2)
+    scaled = values * 100
+    ties = np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6
+    if ties.any():
+        out[ties] = [round_price(v) for v in values[ties].tolist()]
+    return out
+
+
+def _apply_margin(values: "np.ndarray", margin: float) -> "np.ndarray":
+    """Como catalog_service._apply_margin: sin margen, valores tal cual; si no, redondeo a 2 decimales."""
+    if margin <= 0:
+        return values
+    return round_prices(values * (1 + margin / 100))
+
+
+_matrix_lock = threading.Lock()
+_matrix: Optional[PriceMatrix] = None
+
+
+def get_price_matrix() -> PriceMatrix:
+    """Matriz de la revisión actual del catálogo (se recarga si cambió)."""
+    global _matrix
+    revision = get_catalog_revision()
+    current = _matrix
+    if current is not None and current.revision == revision:
+        return current
+    with _matrix_lock:
+        if _matrix is None or _matrix.revision != revision:
+            with SessionLocal() as db:
+                _matrix = PriceMatrix.load(db, revision)
+        return _matrix
+
+
+def compute_clinic_totals(selections: Sequence, clinic_names: Sequence[str], margin: float) -> List[Dict[str, Any]]:
+    """Totales por sede provincia (mismas reglas que el catálogo; C/R/A excluidas)."""
+    margin_prov = max(margin or 0, 20.0)
+    totals = get_price_matrix().clinic_totals(selections, clinic_names, margin_prov)
+    return [
+        {"clinic": name, "ingreso": round(v[0], 2), "periodico": round(v[1], 2), "retiro": round(v[2], 2)}
+        for name, v in zip(clinic_names, totals.tolist())
+    ]
+
+
+def compute_clinic_prices(
+    selections: Sequence, clinic_names: Sequence[str], margin: float
+) -> Dict[str, Dict[str, Dict[str, float]]]:
+    """Precio de cada prueba seleccionada por sede y tipo ({prueba: {sede: {tipo: precio}}}),
+    con las reglas de compute_clinic_totals (fallback, margen, overrides)."""
+    margin_prov = max(margin or 0, 20.0)
+    matrix = get_price_matrix()
+    first: Dict[str, Any] = {}
+    for s in selections or []:
+        first.setdefault(s.name, s)
+    rows = []
+    for s in first.values():
+        row = matrix.name_index.get(s.name)
+        rows.append(row if row is not None else matrix.test_index.get(getattr(s, "testId", None)))
+    known = [r for r in rows if r is not None]
+    resolved = matrix.resolve(
+        matrix.clinic_cols(clinic_names), margin_prov, rows=np.array(known, dtype=np.intp)
+    ).tolist()
+    result: Dict[str, Dict[str, Dict[str, float]]] = {}
+    k = 0
+    for s, row in zip(first.values(), rows):
+        overrides = s.overrides or {}
+        by_clinic = {}
+        for j, clinic in enumerate(clinic_names):
+            values = resolved[j][k] if row is not None else (0.0, 0.0, 0.0)
+            by_clinic[clinic] = {
+                t: float(overrides[t]) if t in overrides else round(values[i], 2)
+                for i, t in enumerate(PRICE_TYPES)
+            }
+        if row is not None:
+            k += 1
+        result[s.name] = by_clinic
+    return result
+
+
+def simulate_quote(
+    selections: Sequence, clinic_names: Optional[Sequence[str]], margins: Sequence[float]
+) -> Dict[str, Any]:
+    """What-if de margen × sede para una selección. clinic_names None = todas las sedes.
+    Margen efectivo con el mínimo de provincia (20%). Filas ordenadas por total."""
+    matrix = get_price_matrix()
+    names = list(dict.fromkeys(clinic_names)) if clinic_names is not None else list(matrix.clinic_names)
+    effective = list(dict.fromkeys(max(m or 0, 20.0) for m in margins))
+    sim = matrix.simulate(selections, names, effective)
+    totals = sim["totals"].tolist()
+    fallback = sim["fallback"].tolist()
+    no_realiza = sim["no_realiza"].tolist()
+    grid = []
+    for mi, margin in enumerate(effective):
+        for k, name in enumerate(names):
+            ingreso, periodico, retiro = (round(v, 2) for v in totals[mi][k])
+            grid.append({
+                "clinic": name,
+                "known_clinic": name in matrix.clinic_index,
+                "margin": margin,
+                "ingreso": ingreso,
+                "periodico": periodico,
+                "retiro": retiro,
+                "total": round(ingreso + periodico + retiro, 2),
+                "fallback_tests": fallback[k],
+                "no_realiza_tests": no_realiza[k],
+            })
+    grid.sort(key=lambda r: (r["total"], r["clinic"], r["margin"]))
+    return {"margins": effective, "clinics": names, "rows": grid}
@@ -0,0 +1,163 @@
+# app/services/price_upsert_service.py
+"""Escritura masiva de precios con upsert nativo del dialecto.
+
+Sedes en provincia: INSERT ... ON CONFLICT (test_id, clinic_id) DO UPDATE (SQLite y
+PostgreSQL) en executemany por bloques. Lima (clinic_id NULL) no puede usar ON CONFLICT:
+en SQL dos NULL no chocan en el índice único, así que se separa con una consulta de las
+claves existentes en UPDATE + INSERT. Con otros dialectos provincia sigue ese mismo camino.
+Todo dentro de la transacción del llamador (sin commit).
+"""
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Set, Tuple
+
+from sqlalchemy import bindparam, insert, select, update
+from sqlalchemy.orm import Session
+
+from app.models.db_models import Clinic, Price, Test
+from app.services.catalog_changes_service import record_catalog_change
+from app.services.provincia_max_service import refresh_provincia_max
+
+UPSERT_CHUNK_SIZE = 500
+PRICE_COLUMNS = ("ingreso", "periodico", "retiro", "no_realiza")
+
+_prices = Price.__table__
+
+
+class PriceCell(NamedTuple):
+    """Precio de una prueba en una sede (clinic_id None = Lima)."""
+    test_id: int
+    clinic_id: Optional[int]
+    ingreso: float
+    periodico: float
+    retiro: float
+    no_realiza: bool = False
+
+
+class UpsertCounts(NamedTuple):
+    inserted: int
+    updated: int
+
+
+def _chunks(items: Sequence, size: int) -> Iterable[Sequence]:
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def _native_insert(db: Session):
+    """insert() con on_conflict_do_update del dialecto, o None si no lo soporta."""
+    name = db.get_bind().dialect.name
+    if name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    elif name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        return None
+    return dialect_insert
+
+
+def existing_price_keys(db: Session, test_ids: Iterable[int]) -> Set[Tuple[int, Optional[int]]]:
+    """(test_id, clinic_id) con fila en prices para esas pruebas (IN por bloques)."""
+    ids = sorted(set(test_ids))
+    keys: Set[Tuple[int, Optional[int]]] = set()
+    for chunk in _chunks(ids, UPSERT_CHUNK_SIZE):
+        keys.update(db.execute(select(Price.test_id, Price.clinic_id).where(Price.test_id.in_(chunk))).all())
+    return keys
+
+
+def upsert_price_cells(
+    db: Session,
+    cells: Sequence[PriceCell],
+    existing: Optional[Set[Tuple[int, Optional[int]]]] = None,
+    columns: Sequence[str] = PRICE_COLUMNS,
+    chunk_size: int = UPSERT_CHUNK_SIZE,
+) -> UpsertCounts:
+    """Inserta o actualiza cells (sin claves repetidas). columns: qué se pisa en filas
+    existentes (la importación no toca no_realiza). existing: claves ya consultadas."""
+    if not cells:
+        return UpsertCounts(0, 0)
+    if existing is None:
+        existing = existing_price_keys(db, (c.test_id for c in cells))
+    dialect_insert = _native_insert(db)
+    to_update: List[Dict] = []
+    to_insert: List[Dict] = []
+    native: List[Dict] = []
+    inserted = 0
+    for c in cells:
+        row = c._asdict()
+        is_new = (c.test_id, c.clinic_id) not in existing
+        inserted += is_new
+        if c.clinic_id is not None and dialect_insert is not None:
+            native.append(row)
+        elif is_new:
+            to_insert.append(row)
+        else:
+            to_update.append({"b_test_id": c.test_id, "b_clinic_id": c.clinic_id, **{k: row[k] for k in columns}})
+
+    if native:
+        stmt = dialect_insert(_prices)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["test_id", "clinic_id"], set_={k: stmt.excluded[k] for k in columns}
+        )
+        for chunk in _chunks(native, chunk_size):
+            db.execute(stmt, list(chunk))
+    if to_insert:
+        for chunk in _chunks(to_insert, chunk_size):
+            db.execute(insert(_prices), list(chunk))
+    if to_update:
+        lima = [r for r in to_update if r["b_clinic_id"] is None]
+        prov = [r for r in to_update if r["b_clinic_id"] is not None]
+        base = update(_prices).where(_prices.c.test_id == bindparam("b_test_id"))
+        for rows, stmt in (
+            (lima, base.where(_prices.c.clinic_id.is_(None))),
+            (prov, base.where(_prices.c.clinic_id == bindparam("b_clinic_id"))),
+        ):
+            for chunk in _chunks(rows, chunk_size):
+                db.execute(stmt, list(chunk))
+    return UpsertCounts(inserted, len(cells) - inserted)
+
+
+def apply_price_cells(db: Session, cells: Sequence[PriceCell]) -> Tuple[List[Dict], UpsertCounts]:
+    """Edición en bloque desde la grilla de precios. Claves foráneas validadas con dos consultas
+    por conjunto; las celdas válidas se escriben juntas (una celda repetida: gana la última).
+    Devuelve un resultado por celda, en el orden recibido: inserted | updated | duplicate | error."""
+    test_ids = {c.test_id for c in cells}
+    clinic_ids = {c.clinic_id for c in cells if c.clinic_id is not None}
+    known_tests = {tid for (tid,) in db.execute(select(Test.id).where(Test.id.in_(test_ids)))} if test_ids else set()
+    known_clinics = (
+        {cid for (cid,) in db.execute(select(Clinic.id).where(Clinic.id.in_(clinic_ids)))} if clinic_ids else set()
+    )
+
+    results: List[Dict] = []
+    last: Dict[Tuple[int, Optional[int]], int] = {}
+    for i, c in enumerate(cells):
+        result = {"index": i, "test_id": c.test_id, "clinic_id": c.clinic_id, "status": None, "error": None}
+        if c.test_id not in known_tests:
+            result.update(status="error", error="Prueba no encontrada.")
+        elif c.clinic_id is not None and c.clinic_id not in known_clinics:
+            result.update(status="error", error="Sede no encontrada.")
+        else:
+            key = (c.test_id, c.clinic_id)
+            if key in last:
+                results[last[key]].update(status="duplicate", error="Celda repetida; se aplica la última.")
+            last[key] = i
+        results.append(result)
+
+    valid = [
+        cells[i]._replace(
+            ingreso=max(0, float(cells[i].ingreso)),
+            periodico=max(0, float(cells[i].periodico)),
+            retiro=max(0, float(cells[i].retiro)),
+            no_realiza=bool(cells[i].no_realiza),
+        )
+        for i in last.values()
+    ]
+    existing = existing_price_keys(db, (c.test_id for c in valid))
+    for i in last.values():
+        key = (cells[i].test_id, cells[i].clinic_id)
+        results[i]["status"] = "updated" if key in existing else "inserted"
+    counts = upsert_price_cells(db, valid, existing=existing)
+    if valid:
+        touched = sorted({c.test_id for c in valid})
+        clinics = {c.clinic_id for c in valid}
+        refresh_provincia_max(db, touched)
+        record_catalog_change(db, "price", test_ids=touched, clinic_id=clinics.pop() if len(clinics) == 1 else None)
+    return results, counts
@@ -0,0 +1,57 @@
+# app/services/provincia_max_service.py
+"""Mantenimiento de provincia_max_prices (máximo por prueba entre sedes en provincia).
+
+El catálogo de provincia usa esta tabla como fallback en lugar de recalcular
+MAX() ... GROUP BY test_id en cada petición. Las escrituras de precios llaman a
+refresh_provincia_max con las pruebas tocadas; las importaciones masivas, a
+rebuild_provincia_max. Ambas dentro de la transacción del llamador (sin commit).
+"""
+from typing import Iterable
+
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.orm import Session
+
+from app.database import SessionLocal
+from app.models.db_models import Price, ProvinciaMaxPrice
+
+
+def _max_select():
+    return (
+        select(
+            Price.test_id,
+            func.max(Price.ingreso),
+            func.max(Price.periodico),
+            func.max(Price.retiro),
+        )
+        .where(Price.clinic_id.isnot(None))
+        .group_by(Price.test_id)
+    )
+
+
+_COLUMNS = ["test_id", "ingreso", "periodico", "retiro"]
+
+
+def refresh_provincia_max(db: Session, test_ids: Iterable[int]) -> None:
+    """Recalcula el máximo provincia solo de las pruebas indicadas."""
+    ids = sorted({tid for tid in test_ids if tid is not None})
+    if not ids:
+        return
+    db.flush()
+    db.execute(delete(ProvinciaMaxPrice).where(ProvinciaMaxPrice.test_id.in_(ids)))
+    db.execute(
+        insert(ProvinciaMaxPrice).from_select(_COLUMNS, _max_select().where(Price.test_id.in_(ids)))
+    )
+
+
+def rebuild_provincia_max(db: Session) -> None:
+    """Reconstruye la tabla completa (tras importaciones masivas)."""
+    db.flush()
+    db.execute(delete(ProvinciaMaxPrice))
+    db.execute(insert(ProvinciaMaxPrice).from_select(_COLUMNS, _max_select()))
+
+
+def ensure_provincia_max_prices() -> None:
+    """Al iniciar: reconstruye la tabla por si hubo escrituras externas (scripts, seed)."""
+    with SessionLocal() as db:
+        rebuild_provincia_max(db)
+        db.commit()
@@ -0,0 +1,158 @@
+# app/services/render_pool.py
+"""Render de PPTX y XLSX en procesos (ProcessPoolExecutor).
+
+Ambos documentos son CPU y mantienen el GIL: en el hilo de la petición van uno tras otro.
+Con RENDER_WORKERS > 0 se envían a la vez a un pool de procesos (la latencia queda en la
+del más lento y varias cotizaciones usan varios núcleos). Cada worker importa python-pptx y
+openpyxl y precarga la plantilla al arrancar. RENDER_MAX_IN_FLIGHT limita las cotizaciones
+renderizándose a la vez; el resto espera hasta RENDER_WAIT_SECONDS y luego RenderPoolBusy.
+RENDER_WORKERS=0 (por defecto) = render en el propio proceso, como antes.
+"""
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Optional, Tuple
+
+from app.models.schemas import GenerationRequest
+
+logger = logging.getLogger(__name__)
+
+RENDER_WORKERS = int(os.getenv("RENDER_WORKERS", "0"))
+RENDER_MAX_IN_FLIGHT = int(os.getenv("RENDER_MAX_IN_FLIGHT", str(max(1, RENDER_WORKERS))))
+RENDER_WAIT_SECONDS = float(os.getenv("RENDER_WAIT_SECONDS", "30"))
+
+
+class RenderPoolBusy(RuntimeError):
+    """Demasiadas cotizaciones en curso: no hubo hueco en RENDER_WAIT_SECONDS."""
+
+
+def _init_worker(template_path: str) -> None:
+    """Arranque de cada worker: imports pesados y plantilla en memoria una sola vez."""
+    import openpyxl  # noqa: F401
+    import pptx  # noqa: F401
+
+    from app.services.docgen import config, template_pool
+
+    config.PPT_TEMPLATE = template_path
+    try:
+        template_pool.get()
+    except FileNotFoundError:
+        pass  # se informará al generar, como en el proceso principal
+
+
+def _render_pptx(payload: GenerationRequest) -> bytes:
+    import io
+
+    from app.services.docgen import build_ppt
+
+    buf = io.BytesIO()
+    build_ppt(payload, buf)
+    return buf.getvalue()
+
+
+def _render_xlsx(payload: GenerationRequest) -> bytes:
+    import io
+
+    from app.utils.xlsx_generator import create_xlsx
+
+    buf = io.BytesIO()
+    create_xlsx(payload, buf)
+    return buf.getvalue()
+
+
+class RenderPool:
+    """Pool de procesos perezoso con tope de cotizaciones simultáneas."""
+
+    def __init__(self, workers: int = RENDER_WORKERS, max_in_flight: int = RENDER_MAX_IN_FLIGHT):
+        self.workers = max(0, workers)
+        self.max_in_flight = max(1, max_in_flight)
+        self._slots = threading.BoundedSemaphore(self.max_in_flight)
+        self._lock = threading.Lock()
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self.in_flight = 0
+        self.rendered = 0
+        self.rejected = 0
+        self.restarts = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.workers > 0
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                from app.services.docgen import config
+
+                # spawn: no hereda hilos ni conexiones del servidor (fork no es seguro aquí)
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                    initargs=(config.PPT_TEMPLATE,),
+                )
+            return self._executor
+
+    def start(self) -> None:
+        """Arranca los workers por adelantado (lifespan) para no pagar el spawn en la primera cotización."""
+        if self.enabled:
+            executor = self._get_executor()
+            for f in [executor.submit(time.sleep, 0) for _ in range(self.workers)]:
+                f.result()
+
+    def render(self, payload: GenerationRequest) -> Tuple[bytes, bytes]:
+        """(pptx, xlsx) renderizados en paralelo en el pool."""
+        if not self._slots.acquire(timeout=RENDER_WAIT_SECONDS):
+            with self._lock:
+                self.rejected += 1
+            raise RenderPoolBusy("Demasiadas cotizaciones en curso")
+        try:
+            with self._lock:
+                self.in_flight += 1
+            executor = self._get_executor()
+            try:
+                pptx_f = executor.submit(_render_pptx, payload)
+                xlsx_f = executor.submit(_render_xlsx, payload)
+                result = pptx_f.result(), xlsx_f.result()
+            except BrokenProcessPool:
+                # Un worker murió (p. ej. sin memoria): se recrea el pool para la siguiente
+                logger.exception("Pool de render roto; se reinicia")
+                self._reset()
+                raise
+            with self._lock:
+                self.rendered += 1
+            return result
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+            self._slots.release()
+
+    def _reset(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+            self.restarts += 1
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "max_in_flight": self.max_in_flight,
+                "in_flight": self.in_flight,
+                "rendered": self.rendered,
+                "rejected": self.rejected,
+                "restarts": self.restarts,
+            }
+
+
+render_pool = RenderPool()
@@ -0,0 +1,130 @@
+# app/services/test_search.py
+"""Búsqueda de pruebas por nombre, sin tildes y con índice de trigramas en memoria.
+
+Sustituye a Test.name.ilike('%q%') (sin índice y sensible a tildes). El índice se
+reconstruye cuando cambian las pruebas o las sedes; funciona igual en SQLite y
+PostgreSQL. Cada palabra de la búsqueda debe aparecer en el nombre normalizado
+(minúsculas, sin tildes); los candidatos salen de intersectar los trigramas.
+"""
+import heapq
+import re
+import threading
+import unicodedata
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple
+
+from app.database import SessionLocal
+from app.models.db_models import Clinic, Test
+from app.services.catalog_cache import get_table_revisions
+
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_text(s: str) -> str:
+    """Minúsculas, sin tildes ni diacríticos, espacios colapsados ("Hemoglobína" -> "hemoglobina")."""
+    decomposed = unicodedata.normalize("NFKD", s or "")
+    stripped = "".join(c for c in decomposed if not unicodedata.combining(c))
+    return _SPACES.sub(" ", stripped.casefold()).strip()
+
+
+def _grams(s: str, n: int) -> Set[str]:
+    return {s[i:i + n] for i in range(len(s) - n + 1)}
+
+
+class SearchEntry(NamedTuple):
+    id: int
+    name: str
+    category: str
+    norm: str
+
+
+class SearchIndex:
+    """Índice de trigramas sobre los nombres normalizados de todas las pruebas."""
+
+    def __init__(self, revision: tuple, tests: List[Tuple[int, str, str]], clinic_names: List[str]):
+        self.revision = revision
+        self.clinic_names = clinic_names  # orden alfabético (como en la BD)
+        entries = [SearchEntry(tid, name, category, normalize_text(name)) for tid, name, category in tests]
+        # Orden de desempate (nombre más corto, categoría, nombre): el índice de la entrada ya lo refleja
+        entries.sort(key=lambda e: (len(e.norm), e.category, e.name))
+        self.entries: List[SearchEntry] = entries
+        # Trigramas + bigramas (para búsquedas de 2 letras, p. ej. "hb")
+        self.postings: Dict[str, Set[int]] = {}
+        for i, e in enumerate(self.entries):
+            for g in _grams(e.norm, 3) | _grams(e.norm, 2):
+                self.postings.setdefault(g, set()).add(i)
+
+    def _candidates(self, token: str) -> Optional[Set[int]]:
+        """Entradas que contienen todos los n-gramas del token (None = token de 1 letra, sin filtro)."""
+        grams = _grams(token, 3) or _grams(token, 2)
+        if not grams:
+            return None
+        sets = sorted((self.postings.get(g, set()) for g in grams), key=len)
+        out = set(sets[0])
+        for s in sets[1:]:
+            out &= s
+            if not out:
+                break
+        return out
+
+    def search(self, q: str, limit: int = 50) -> List[SearchEntry]:
+        """Pruebas cuyo nombre contiene cada palabra de q, ordenadas por relevancia."""
+        query = normalize_text(q)
+        tokens = query.split(" ") if query else []
+        if not tokens:
+            return []
+        candidates: Optional[Set[int]] = None
+        for tok in tokens:
+            c = self._candidates(tok)
+            if c is None:
+                continue
+            candidates = c if candidates is None else candidates & c
+        pool = range(len(self.entries)) if candidates is None else candidates
+        buckets: List[List[int]] = [[] for _ in range(5)]
+        for i in pool:
+            norm = self.entries[i].norm
+            if len(tokens) > 1 and not all(tok in norm for tok in tokens):
+                continue
+            if len(tokens) == 1 and query not in norm:
+                continue
+            buckets[self._rank(norm, query)].append(i)
+        result: List[SearchEntry] = []
+        for bucket in buckets:
+            if len(result) >= limit:
+                break
+            for i in heapq.nsmallest(limit - len(result), bucket):
+                result.append(self.entries[i])
+        return result
+
+    @staticmethod
+    def _rank(norm: str, query: str) -> int:
+        """0 = exacto, 1 = empieza por la búsqueda, 2 = una palabra empieza por ella,
+        3 = contiene la frase, 4 = contiene todas las palabras."""
+        if norm == query:
+            return 0
+        if norm.startswith(query):
+            return 1
+        if (" " + query) in norm:
+            return 2
+        if query in norm:
+            return 3
+        return 4
+
+
+_index_lock = threading.Lock()
+_index: Optional[SearchIndex] = None
+
+
+def get_search_index() -> SearchIndex:
+    """Índice de la revisión actual de tests/clinics (los cambios de precios no lo invalidan)."""
+    global _index
+    revision = get_table_revisions("tests", "clinics")
+    current = _index
+    if current is not None and current.revision == revision:
+        return current
+    with _index_lock:
+        if _index is None or _index.revision != revision:
+            with SessionLocal() as db:
+                tests = [(t.id, t.name, t.category) for t in db.query(Test.id, Test.name, Test.category).all()]
+                clinics = [c.name for c in db.query(Clinic.name).order_by(Clinic.name).all()]
+            _index = SearchIndex(revision, tests, clinics)
+        return _index
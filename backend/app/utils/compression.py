@@ -0,0 +1,127 @@
+# app/utils/compression.py
+"""Compresión de respuestas negociada por Accept-Encoding: brotli (si está instalado) o gzip.
+
+Solo comprime respuestas de un único bloque (JSON, texto) con tipo comprimible y tamaño
+>= COMPRESSION_MIN_SIZE bytes. Las descargas en streaming (ZIP, PPTX, XLSX) pasan tal cual:
+ya van comprimidas y recomprimirlas solo gasta CPU.
+"""
+import gzip
+import os
+from typing import List, Optional, Tuple
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - brotli es opcional
+    brotli = None  # type: ignore
+
+BROTLI_AVAILABLE = brotli is not None
+
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "4"))
+
+COMPRESSIBLE_TYPES = ("application/json", "text/", "application/javascript", "image/svg+xml")
+
+
+def _accepted_encodings(accept_encoding: str) -> List[Tuple[str, float]]:
+    """[(codificación, q)] de Accept-Encoding, sin las de q=0."""
+    out = []
+    for part in accept_encoding.split(","):
+        token, _, params = part.strip().partition(";")
+        token = token.strip().lower()
+        if not token:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if q > 0:
+            out.append((token, q))
+    return out
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """"br" o "gzip" según Accept-Encoding (mayor q; a igual q, br). None = sin comprimir."""
+    supported = ["br", "gzip"] if BROTLI_AVAILABLE else ["gzip"]
+    best, best_q = None, 0.0
+    for token, q in _accepted_encodings(accept_encoding):
+        candidates = supported if token == "*" else [token] if token in supported else []
+        for enc in candidates:
+            if q > best_q or (q == best_q and best is not None and supported.index(enc) < supported.index(best)):
+                best, best_q = enc, q
+    return best
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+class CompressionMiddleware:
+    """Middleware ASGI: comprime respuestas de un bloque con br/gzip según el cliente."""
+
+    def __init__(self, app: ASGIApp, minimum_size: int = COMPRESSION_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start: Optional[Message] = None
+        passthrough = False
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal start, passthrough
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                content_type = headers.get("content-type", "")
+                if (
+                    "content-encoding" in headers
+                    or message["status"] < 200
+                    or message["status"] in (204, 304)
+                    or not content_type.startswith(COMPRESSIBLE_TYPES)
+                ):
+                    passthrough = True
+                    await send(message)
+                else:
+                    start = message  # se envía junto con el primer bloque
+                return
+            if passthrough or message["type"] != "http.response.body":
+                await send(message)
+                return
+            if start is None:  # ya enviado (streaming)
+                await send(message)
+                return
+            body = message.get("body", b"")
+            headers = MutableHeaders(raw=start["headers"])
+            headers.add_vary_header("Accept-Encoding")
+            if message.get("more_body", False) or len(body) < self.minimum_size:
+                # Streaming o respuesta pequeña: sin comprimir
+                await send(start)
+                start = None
+                await send(message)
+                return
+            compressed = compress(body, encoding)
+            headers["Content-Encoding"] = encoding
+            headers["Content-Length"] = str(len(compressed))
+            etag = headers.get("etag")
+            if etag and not etag.startswith("W/"):
+                headers["ETag"] = "W/" + etag  # otra representación: el ETag fuerte pasa a débil (como nginx)
+            await send(start)
+            start = None
+            await send({"type": "http.response.body", "body": compressed, "more_body": False})
+
+        await self.app(scope, receive, send_wrapper)
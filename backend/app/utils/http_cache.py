@@ -0,0 +1,43 @@
+# app/utils/http_cache.py
+"""ETag fuerte a partir de las revisiones por tabla y respuestas 304 condicionales.
+
+Las revisiones son las persistentes (catalog_changes): el mismo ETag en todos los workers y
+tras un reinicio, y cambia también con escrituras de scripts fuera de la API."""
+import hashlib
+from typing import Optional
+
+from fastapi import Request, Response
+
+from app.services.catalog_cache import get_persistent_revisions
+
+CACHE_CONTROL = "private, no-cache"
+
+
+def compute_etag(tables: tuple, *params) -> str:
+    """ETag de un recurso que depende de tables (tests, clinics, prices) y de los parámetros."""
+    revisions = get_persistent_revisions(*tables)
+    raw = "|".join([*(str(r) for r in revisions), *(repr(p) for p in params)])
+    return '"' + hashlib.sha1(raw.encode("utf-8")).hexdigest()[:20] + '"'
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    """Comparación débil de If-None-Match (RFC 9110): ignora el prefijo W/."""
+    if if_none_match.strip() == "*":
+        return True
+    for candidate in if_none_match.split(","):
+        c = candidate.strip()
+        if c.startswith("W/"):
+            c = c[2:]
+        if c == etag:
+            return True
+    return False
+
+
+def not_modified(request: Request, response: Response, etag: str) -> Optional[Response]:
+    """Fija ETag/Cache-Control en response. Si el cliente ya tiene esa versión, devuelve un 304."""
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = CACHE_CONTROL
+    inm = request.headers.get("if-none-match")
+    if inm and _etag_matches(inm, etag):
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": CACHE_CONTROL})
+    return None
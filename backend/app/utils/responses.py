@@ -0,0 +1,35 @@
+# app/utils/responses.py
+"""Respuesta JSON rápida (orjson) para payloads grandes: catálogo, listado y búsqueda de precios.
+
+Se devuelve directamente desde el endpoint (json_response) para saltar jsonable_encoder:
+el contenido ya son dicts/listas de tipos simples. Sin orjson, usa el json estándar.
+"""
+from typing import Any, Optional
+
+from fastapi import Response
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson es opcional
+    orjson = None  # type: ignore
+
+ORJSON_AVAILABLE = orjson is not None
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse serializada con orjson (claves no str permitidas, como en json estándar)."""
+
+    def render(self, content: Any) -> bytes:
+        if orjson is None:
+            return super().render(content)
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+
+
+def json_response(content: Any, response: Optional[Response] = None, status_code: int = 200) -> FastJSONResponse:
+    """FastJSONResponse con las cabeceras ya fijadas en el Response inyectado (p. ej. ETag):
+    FastAPI no las copia cuando el endpoint devuelve un Response propio."""
+    headers = None
+    if response is not None:
+        headers = {k: v for k, v in response.headers.items() if k.lower() != "content-length"}
+    return FastJSONResponse(content, status_code=status_code, headers=headers)
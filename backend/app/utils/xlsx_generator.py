@@ -1,21 +1,77 @@
+from typing import BinaryIO, Iterable, Iterator, List, Union
+
 from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
 from openpyxl.styles import Font, Alignment
+from app.constants import CRA_CLASSIFICATIONS
 from app.models.schemas import GenerationRequest
 
-def create_xlsx(req: GenerationRequest, out_path: str) -> str:
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Resumen"
-    headers = ["Protocolo","Prueba","Tipo","Precio","Clasificación","Detalle","Override","Suma?"]
-    ws.append(headers)
-    for c in ws[1]:
-        c.font = Font(bold=True); c.alignment = Alignment(horizontal="center")
+# Estilos compartidos por todas las cabeceras (openpyxl los registra una vez por libro)
+_HEADER_FONT = Font(bold=True)
+_HEADER_ALIGN = Alignment(horizontal="center")
+
+TYPE_NAMES = {"ingreso": "Ingreso", "periodico": "Periodico", "retiro": "Retiro"}
+
+
+def _header(ws, titles: Iterable[str]) -> List[WriteOnlyCell]:
+    cells = []
+    for title in titles:
+        c = WriteOnlyCell(ws, value=title)
+        c.font = _HEADER_FONT
+        c.alignment = _HEADER_ALIGN
+        cells.append(c)
+    return cells
 
+
+def _summary_rows(req: GenerationRequest) -> Iterator[list]:
     for s in req.selections or []:
         for t in s.types:
             price = (s.overrides or {}).get(t, s.prices.get(t, 0.0))
             suma = 0 if (s.classification in ("condicional","requisito","adicional")) else price
-            ws.append([s.protocol, s.name, t.capitalize(), price, s.classification or "", s.detail or "", (s.overrides or {}).get(t, ""), suma])
+            yield [s.protocol, s.name, t.capitalize(), price, s.classification or "", s.detail or "", (s.overrides or {}).get(t, ""), suma]
+
+
+def _comparison_rows(req: GenerationRequest, clinics: List[str]) -> Iterator[list]:
+    """Una fila por (prueba, tipo) seleccionada: precio en cada sede, mínimo, máximo y sede más barata."""
+    seen = set()
+    for s in req.selections or []:
+        by_clinic = (req.clinic_prices or {}).get(s.name, {})
+        for t in s.types:
+            if (s.name, t) in seen:
+                continue
+            seen.add((s.name, t))
+            values = [by_clinic.get(c, {}).get(t) for c in clinics]
+            known = [(v, c) for v, c in zip(values, clinics) if v is not None]
+            low = min(known) if known else (None, "")
+            high = max(v for v, _ in known) if known else None
+            cra = "Sí" if (s.classification or "").strip() in CRA_CLASSIFICATIONS else ""
+            yield [s.name, TYPE_NAMES.get(t, t), cra, *values, low[0], high, low[1]]
+
+
+def create_xlsx(req: GenerationRequest, out_path: Union[str, BinaryIO]) -> Union[str, BinaryIO]:
+    """Resumen de la cotización. Libro write_only: cada fila se escribe al archivo al agregarla
+    (sin objetos celda en memoria), así que el consumo no crece con el número de selecciones.
+    Con sedes provincia agrega "Totales por clínica" y "Comparación por clínica" (prueba × sede)."""
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Resumen")
+    ws.append(_header(ws, ["Protocolo","Prueba","Tipo","Precio","Clasificación","Detalle","Override","Suma?"]))
+    for row in _summary_rows(req):
+        ws.append(row)
+
+    if req.clinic_totals:
+        ws = wb.create_sheet("Totales por clínica")
+        ws.append(_header(ws, ["Clínica", "Ingreso", "Periodico", "Retiro", "Total"]))
+        for ct in req.clinic_totals:
+            ws.append([ct.clinic, ct.ingreso, ct.periodico, ct.retiro, round(ct.ingreso + ct.periodico + ct.retiro, 2)])
+
+    if req.clinic_prices:
+        clinics = list(req.clinics or [])
+        if not clinics:
+            clinics = list(dict.fromkeys(c for by_clinic in req.clinic_prices.values() for c in by_clinic))
+        ws = wb.create_sheet("Comparación por clínica")
+        ws.append(_header(ws, ["Prueba", "Tipo", "C/R/A", *clinics, "Mínimo", "Máximo", "Sede más barata"]))
+        for row in _comparison_rows(req, clinics):
+            ws.append(row)
 
     wb.save(out_path)
     return out_path
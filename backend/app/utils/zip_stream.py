@@ -0,0 +1,97 @@
+# app/utils/zip_stream.py
+"""ZIP generado al vuelo para StreamingResponse, sin archivo temporal.
+
+zipfile escribe sobre un sumidero no posicionable (usa descriptores de datos) y cada
+bloque escrito se entrega al cliente en cuanto está listo. Los OOXML (.pptx, .xlsx) ya
+van comprimidos: se guardan con ZIP_STORED para no volver a deflactarlos.
+"""
+import time
+import zipfile
+from typing import BinaryIO, Iterable, Iterator, List, Tuple
+from urllib.parse import quote
+
+CHUNK_SIZE = 64 * 1024
+
+# Extensiones que ya son ZIP/deflate por dentro
+PRECOMPRESSED_EXTENSIONS = (".pptx", ".xlsx", ".docx", ".zip", ".png", ".jpg", ".jpeg")
+
+
+class _ChunkSink:
+    """Destino de escritura para ZipFile: acumula bytes hasta que el generador los entrega."""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+
+    def write(self, data) -> int:
+        if data:
+            self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        out = b"".join(self._chunks)
+        self._chunks.clear()
+        return out
+
+
+def _compression_for(name: str) -> int:
+    return zipfile.ZIP_STORED if name.lower().endswith(PRECOMPRESSED_EXTENSIONS) else zipfile.ZIP_DEFLATED
+
+
+def iter_zip(members: Iterable[Tuple[str, BinaryIO]], chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    """Bloques del ZIP con members [(nombre, archivo abierto)]. members puede ser perezoso (un
+    generador): cada archivo se escribe en cuanto llega. Cierra los archivos al copiarlos y,
+    si el cliente corta la descarga, los que quedan (o cierra el generador)."""
+    pending = iter(members)
+    sink = _ChunkSink()
+    try:
+        with zipfile.ZipFile(sink, "w") as zf:
+            for name, fileobj in pending:
+                try:
+                    info = zipfile.ZipInfo(name, date_time=time.localtime()[:6])
+                    info.compress_type = _compression_for(name)
+                    info.external_attr = 0o644 << 16
+                    fileobj.seek(0, 2)
+                    info.file_size = fileobj.tell()  # decide ZIP64 de antemano
+                    fileobj.seek(0)
+                    with zf.open(info, "w") as dest:
+                        while True:
+                            block = fileobj.read(chunk_size)
+                            if not block:
+                                break
+                            dest.write(block)
+                            data = sink.drain()
+                            if data:
+                                yield data
+                    data = sink.drain()
+                    if data:
+                        yield data
+                finally:
+                    _close_quietly(fileobj)
+        data = sink.drain()  # directorio central
+        if data:
+            yield data
+    finally:
+        close = getattr(pending, "close", None)
+        if close is not None:
+            close()  # generador: libera lo que tenga en curso
+        else:
+            for _, fileobj in pending:
+                _close_quietly(fileobj)
+
+
+def _close_quietly(fileobj: BinaryIO) -> None:
+    try:
+        fileobj.close()
+    except Exception:
+        pass
+
+
+def attachment_header(filename: str) -> str:
+    """Content-Disposition de descarga (mismo criterio que FileResponse para nombres no ASCII)."""
+    quoted = quote(filename)
+    if quoted != filename:
+        return f"attachment; filename*=utf-8''{quoted}"
+    return f'attachment; filename="{filename}"'
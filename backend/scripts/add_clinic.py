@@ -20,6 +20,7 @@ except ImportError:
 
 from app.database import engine, Base
 from app.models.db_models import Clinic
+from app.services.catalog_changes_service import record_catalog_change
 from sqlalchemy.orm import Session
 
 
@@ -38,6 +39,8 @@ def add_clinic(name: str) -> None:
             sys.exit(1)
         clinic = Clinic(name=name)
         db.add(clinic)
+        db.flush()
+        record_catalog_change(db, "clinic", clinic_id=clinic.id)  # la API en marcha invalida su caché
         db.commit()
         db.refresh(clinic)
     print(f"Clínica creada: '{name}' (id={clinic.id})")
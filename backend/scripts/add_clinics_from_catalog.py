@@ -12,6 +12,7 @@ sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
 
 from app.database import engine, Base
 from app.models.db_models import Clinic
+from app.services.catalog_changes_service import record_catalog_change
 from sqlalchemy.orm import Session
 
 
@@ -33,6 +34,8 @@ def add_missing_clinics():
             if name not in existing:
                 db.add(Clinic(name=name))
                 added.append(name)
+        if added:
+            record_catalog_change(db, "clinic")  # la API en marcha invalida su caché
         db.commit()
 
     if added:
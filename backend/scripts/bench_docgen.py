@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+Benchmark de generación PPT (docgen).
+
+  - Plantilla: Presentation(archivo) + find_table_anchor por cotización (antes)
+    vs clon desde template_pool en memoria (ahora); la carga inicial se mide aparte.
+  - Valores de celda de la tabla unificada (--tests × --protocols, por defecto 400 × 6):
+    recorrido lineal de by_proto por celda (antes) vs SelectionLookup indexado.
+  - Tabla unificada completa (--table-tests × --protocols): API de objetos de python-pptx
+    (add_unified_table, cuadrática en filas) vs emisor XML directo (emit_unified_table).
+  - Imagen de --image-px (foto JPEG): decodificar + reducir a PPT_IMAGE_DPI en cada
+    cotización (prepare_image) vs acierto de image_cache.
+
+Usa PPT_TEMPLATE si existe; si no, genera una plantilla sintética de --slides slides.
+Ejecutar desde backend/:
+  python -m scripts.bench_docgen [--template ruta.pptx] [--slides 12] [--tests 400] [--protocols 6] [--table-tests 120]
+                                 [--image-px 4000]
+"""
+import argparse
+import base64
+import io
+import random
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from PIL import Image
+from pptx import Presentation
+from pptx.util import Inches
+
+from app.constants import CRA_CLASSIFICATIONS
+from app.models.schemas import Selection
+from app.services.docgen import config, template_pool
+from app.services.docgen.build import SelectionLookup
+from app.services.docgen.images import ImageCache, prepare_image
+from app.services.docgen.helpers import fill_cover_fields, find_table_anchor, take_table_anchor
+from app.services.docgen.table_builder import add_unified_table
+from app.services.docgen.table_xml import emit_unified_table
+
+
+def _timed(label: str, fn, repeat: int = 5):
+    best = None
+    result = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        dt = time.perf_counter() - t0
+        best = dt if best is None else min(best, dt)
+    print(f"  {label:<48} {best * 1000:9.1f} ms")
+    return result
+
+
+def _synthetic_template(path: Path, slides: int) -> str:
+    prs = Presentation()
+    cover = prs.slides.add_slide(prs.slide_layouts[6])
+    cover.shapes.add_textbox(Inches(1), Inches(1), Inches(6), Inches(1)).text_frame.text = (
+        "Propuesta {{x}} para {{RAZON_SOCIAL}} - {{FECHA}}"
+    )
+    for i in range(slides):
+        s = prs.slides.add_slide(prs.slide_layouts[6])
+        for k in range(15):
+            s.shapes.add_textbox(Inches(0.5), Inches(0.3 * k), Inches(8), Inches(0.3)).text_frame.text = f"Texto {i}.{k}"
+    prs.slides.add_slide(prs.slide_layouts[6]).shapes.add_textbox(
+        Inches(0.5), Inches(1), Inches(9), Inches(4)
+    ).text_frame.text = "{{TABLA}}"
+    prs.save(str(path))
+    return str(path)
+
+
+class _Payload:
+    company = recipient = executive = executive_title = "Bench"
+    proposal_number = "1"
+    location = "Lima"
+
+
+def _selections(n_tests: int, n_protocols: int, rng: random.Random):
+    sels = []
+    for p in range(n_protocols):
+        for t in range(n_tests):
+            cl = rng.choice([None] * 8 + list(CRA_CLASSIFICATIONS))
+            sels.append(Selection(
+                id=len(sels), testId=t, name=f"Prueba {t}", category="Lab", protocol=f"P{p}",
+                types=["ingreso", "periodico", "retiro"], classification=cl,
+                prices={"ingreso": round(rng.uniform(5, 300), 2), "periodico": 10.0, "retiro": 5.0},
+            ))
+    return sels
+
+
+def _linear_cells(by_proto, group_defs, tests_with_meta):
+    """Recorrido lineal anterior: by_proto[proto] por cada celda y otra vez por la fila TOTAL."""
+    def get_val(test_name, proto, t):
+        for s in by_proto.get(proto, []):
+            if s.name == test_name:
+                return "X" if t in s.types else "-"
+        return "-"
+
+    def get_num_val(test_name, proto, t):
+        for s in by_proto.get(proto, []):
+            if s.name == test_name:
+                return float((s.overrides or {}).get(t, s.prices.get(t, 0.0))) if t in s.types else None
+        return None
+
+    cells = [get_val(rn, p, t) for _, rn, _ in tests_with_meta for p, tps in group_defs for t in tps]
+    totals = [sum(v for _, rn, _ in tests_with_meta if (v := get_num_val(rn, p, t)) is not None)
+              for p, tps in group_defs for t in tps]
+    return cells, totals
+
+
+def _indexed_cells(by_proto, group_defs, tests_with_meta):
+    lookup = SelectionLookup(by_proto)
+    cells = [lookup.get_val(rn, p, t) for _, rn, _ in tests_with_meta for p, tps in group_defs for t in tps]
+    return cells, lookup.column_totals(group_defs, tests_with_meta)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--template", default=None)
+    parser.add_argument("--slides", type=int, default=12)
+    parser.add_argument("--tests", type=int, default=400)
+    parser.add_argument("--protocols", type=int, default=6)
+    parser.add_argument("--table-tests", type=int, default=120, help="filas de la tabla (python-pptx es lento)")
+    parser.add_argument("--image-px", type=int, default=4000, help="ancho de la foto de prueba (alto 3/4)")
+    args = parser.parse_args()
+
+    tmp = tempfile.TemporaryDirectory()
+    if args.template:
+        config.PPT_TEMPLATE = args.template
+    elif not Path(config.PPT_TEMPLATE).exists():
+        config.PPT_TEMPLATE = _synthetic_template(Path(tmp.name) / "plantilla.pptx", args.slides)
+        print(f"Plantilla sintética ({args.slides + 2} slides)")
+    payload = _Payload()
+
+    def reopen():
+        prs = Presentation(config.PPT_TEMPLATE)
+        fill_cover_fields(prs, payload)
+        return find_table_anchor(prs)
+
+    def clone():
+        prs, snap = template_pool.open()
+        fill_cover_fields(prs, payload, snap.marker_shapes)
+        return take_table_anchor(prs, snap.anchor_slide, snap.anchor_shape)
+
+    print("Plantilla por cotización")
+    template_pool.clear()
+    snap = template_pool.get()
+    print(f"  {'carga inicial template_pool (una vez)':<48} {snap.load_ms:9.1f} ms")
+    _timed("abrir archivo + portada + ancla (antes)", reopen)
+    _timed("clon en memoria + portada + ancla", clone)
+
+    sels = _selections(args.tests, args.protocols, random.Random(42))
+    by_proto = defaultdict(list)
+    for sel in sels:
+        by_proto[sel.protocol].append(sel)
+    group_defs = [(p, ["ingreso", "periodico", "retiro"]) for p in by_proto]
+    tests_with_meta = [(f"Prueba {t}", f"Prueba {t}", False) for t in range(args.tests)]
+    print(f"Valores de celda: {args.tests} pruebas × {args.protocols} protocolos × 3 tipos")
+    _timed("recorrido lineal por celda (antes)", lambda: _linear_cells(by_proto, group_defs, tests_with_meta), repeat=1)
+    _timed("SelectionLookup + totales por columna", lambda: _indexed_cells(by_proto, group_defs, tests_with_meta))
+
+    n = args.table_tests
+    lookup = SelectionLookup(by_proto)
+    table_kw = dict(
+        group_defs=group_defs, tests_with_meta=tests_with_meta[:n], get_val=lookup.get_val,
+        get_num_val=lookup.get_num_val, get_cra_price=lookup.get_cra_price, skip_total_row=False,
+        clinic_totals=[], cra_items=[],
+    )
+    table_kw["column_totals"] = lookup.column_totals(group_defs, table_kw["tests_with_meta"])
+
+    def draw(fn):
+        prs = Presentation()
+        slide = prs.slides.add_slide(prs.slide_layouts[6])
+        fn(slide, (Inches(0.5), Inches(1), Inches(9), Inches(4)), **table_kw)
+
+    print(f"Tabla unificada: {n} pruebas × {args.protocols} protocolos × 3 tipos")
+    _timed("python-pptx add_unified_table (antes)", lambda: draw(add_unified_table), repeat=1)
+    _timed("emisor XML emit_unified_table", lambda: draw(emit_unified_table))
+
+    w, h = args.image_px, args.image_px * 3 // 4
+    rng = random.Random(1)
+    photo = Image.frombytes("RGB", (w // 8, h // 8), bytes(rng.getrandbits(8) for _ in range(w // 8 * h // 8 * 3)))
+    buf = io.BytesIO()
+    photo.resize((w, h)).save(buf, format="JPEG", quality=90)
+    b64 = base64.b64encode(buf.getvalue()).decode("ascii")
+    cache = ImageCache()
+    box = (1350, 975)  # 9 × 6.5 in a 150 DPI
+    print(f"Imagen {w}×{h} JPEG ({len(buf.getvalue()) // 1024} KB) a caja {box[0]}×{box[1]} px")
+    _timed("decodificar + reducir por cotización (antes)", lambda: prepare_image(b64, *box), repeat=3)
+    cache.get(b64, *box)
+    _timed("image_cache (acierto por hash de contenido)", lambda: cache.get(b64, *box))
+    tmp.cleanup()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
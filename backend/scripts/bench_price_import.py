@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+Benchmark de la importación de precios: ORM fila a fila (antes) vs PriceImporter
+(pruebas nuevas con INSERT ... RETURNING, dedupe en memoria y upsert ON CONFLICT por bloques).
+
+Cada versión corre sobre una BD SQLite en archivo temporal con --clinics sedes y la
+mitad de las pruebas ya cargadas con precio (para que haya UPDATE e INSERT). Las filas
+mezclan Lima, sedes puntuales y un --todas de filas TODAS (cada una se expande a todas
+las sedes). Se incluye rebuild_provincia_max + commit, como en la API.
+Con --xlsx compara además el pico de memoria (tracemalloc) de la importación desde XLSX:
+archivo entero en bytes + lista de filas + una sola escritura (antes) vs subida copiada a
+archivo temporal, filas perezosas y flush por bloques (import_prices_from_xlsx).
+Ejecutar desde backend/:
+  python -m scripts.bench_price_import [--rows 50000] [--clinics 200] [--tests 10000] [--todas 0.01] [--xlsx]
+"""
+import argparse
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from sqlalchemy import create_engine, func, insert, select
+from sqlalchemy.orm import Session
+
+from app.database import Base
+from app.models.db_models import Clinic, Price, Test
+from app.services.price_import_service import (
+    PriceImporter,
+    _norm,
+    _norm_clinic,
+    import_prices_from_rows,
+    import_prices_from_xlsx,
+    iter_xlsx_rows,
+    spooled_upload,
+)
+from app.services.provincia_max_service import rebuild_provincia_max
+
+
+def _legacy_import(db: Session, rows) -> int:
+    """import_prices_from_rows anterior: flush por prueba nueva y Price ORM mutados uno a uno.
+    (El original fallaba con UNIQUE si el archivo repetía prueba + sede; aquí se reusa el objeto.)"""
+    clinics = {c.name: c.id for c in db.query(Clinic).all()}
+    tests_by_key = {(t.name, t.category): t.id for t in db.query(Test).all()}
+    updates = []
+    for row in rows:
+        prueba, categoria = _norm(row["prueba"]), _norm(row["categoria"])
+        clinica = _norm_clinic(row["clinica"])
+        key = (prueba, categoria)
+        if key not in tests_by_key:
+            test = Test(name=prueba, category=categoria)
+            db.add(test)
+            db.flush()
+            tests_by_key[key] = test.id
+        ids = [None] if clinica == "Lima" else list(clinics.values()) if clinica == "TODAS" else [clinics[clinica]]
+        for cid in ids:
+            updates.append((tests_by_key[key], cid, float(row["ingreso"]), float(row["periodico"]), float(row["retiro"])))
+    existing = {(p.test_id, p.clinic_id): p for p in db.query(Price).filter(Price.test_id.in_({u[0] for u in updates}))}
+    new = []
+    for tid, cid, ing, per, ret in updates:
+        p = existing.get((tid, cid))
+        if p is not None:
+            p.ingreso, p.periodico, p.retiro = ing, per, ret
+        else:
+            existing[(tid, cid)] = Price(test_id=tid, clinic_id=cid, ingreso=ing, periodico=per, retiro=ret)
+            new.append(existing[(tid, cid)])
+    db.add_all(new)
+    rebuild_provincia_max(db)
+    return len(updates)
+
+
+def _native_import(db: Session, rows) -> int:
+    importer = PriceImporter(db)
+    importer.feed(rows)
+    importer.finish()
+    return importer.cells_applied
+
+
+def _seed(path: Path, n_clinics: int, n_tests: int):
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(engine)
+    with Session(engine) as db:
+        db.execute(insert(Clinic), [{"name": f"Sede {j}"} for j in range(n_clinics)])
+        db.execute(insert(Test), [{"name": f"Prueba {i}", "category": "Lab"} for i in range(n_tests // 2)])
+        db.execute(insert(Price), [
+            {"test_id": i + 1, "clinic_id": (i % n_clinics) + 1, "ingreso": 1, "periodico": 1, "retiro": 1}
+            for i in range(n_tests // 2)
+        ])
+        db.commit()
+    return engine
+
+
+def _rows(n_rows: int, n_clinics: int, n_tests: int, todas: float):
+    rnd = random.Random(7)
+    for _ in range(n_rows):
+        r = rnd.random()
+        clinica = "TODAS" if r < todas else "Lima" if r < todas + 0.2 else f"Sede {rnd.randrange(n_clinics)}"
+        price = rnd.randrange(10, 200)
+        yield {"prueba": f"Prueba {rnd.randrange(n_tests)}", "categoria": "Lab", "clinica": clinica,
+               "ingreso": price, "periodico": price, "retiro": price}
+
+
+def _write_xlsx(path: Path, rows) -> None:
+    from openpyxl import Workbook
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Precios")
+    ws.append(["prueba", "categoria", "clinica", "ingreso", "periodico", "retiro"])
+    for r in rows:
+        ws.append([r["prueba"], r["categoria"], r["clinica"], r["ingreso"], r["periodico"], r["retiro"]])
+    wb.save(path)
+
+
+def _xlsx_whole(db: Session, path: Path) -> int:
+    """Como la API antes: bytes del archivo, todas las filas en una lista, una sola escritura."""
+    content = path.read_bytes()
+    with tempfile.NamedTemporaryFile(suffix=".xlsx") as tmp:
+        tmp.write(content)
+        tmp.flush()
+        rows = list(iter_xlsx_rows(tmp.name))
+    done, _ = import_prices_from_rows(db, rows)
+    return done
+
+
+def _xlsx_stream(db: Session, path: Path) -> int:
+    with open(path, "rb") as f, spooled_upload(f) as spooled:
+        return import_prices_from_xlsx(db, spooled).cells_applied
+
+
+def _bench_xlsx(tmp: str, args, rows) -> None:
+    xlsx = Path(tmp) / "precios.xlsx"
+    _write_xlsx(xlsx, rows)
+    print(f"\nXLSX {xlsx.stat().st_size / 1024 / 1024:.1f} MB")
+    print(f"{'versión':<34} {'s':>8} {'pico MB':>9}")
+    for i, (label, fn) in enumerate((("archivo y filas en memoria (antes)", _xlsx_whole),
+                                     ("streaming por bloques", _xlsx_stream))):
+        # Tiempo sin trazar y pico de memoria en otra pasada (tracemalloc ralentiza mucho)
+        for traced in (False, True):
+            engine = _seed(Path(tmp) / f"xlsx_{i}_{int(traced)}.db", args.clinics, args.tests)
+            with Session(engine) as db:
+                if traced:
+                    tracemalloc.start()
+                t0 = time.perf_counter()
+                fn(db, xlsx)
+                db.commit()
+                if traced:
+                    _, peak = tracemalloc.get_traced_memory()
+                    tracemalloc.stop()
+                else:
+                    dt = time.perf_counter() - t0
+            engine.dispose()
+        print(f"{label:<34} {dt:8.2f} {peak / 1024 / 1024:9.1f}")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=50_000)
+    parser.add_argument("--clinics", type=int, default=200)
+    parser.add_argument("--tests", type=int, default=10_000)
+    parser.add_argument("--todas", type=float, default=0.01, help="fracción de filas TODAS")
+    parser.add_argument("--skip-legacy", action="store_true")
+    parser.add_argument("--xlsx", action="store_true", help="medir también la importación desde XLSX")
+    args = parser.parse_args()
+    rows = list(_rows(args.rows, args.clinics, args.tests, args.todas))
+    n_todas = sum(1 for r in rows if r["clinica"] == "TODAS")
+    print(f"{args.rows} filas ({n_todas} TODAS × {args.clinics} sedes), {args.tests} pruebas (mitad nuevas)")
+    print(f"{'versión':<34} {'s':>8} {'celdas':>9} {'precios en BD':>14}")
+    runs = [("ORM fila a fila (antes)", _legacy_import), ("PriceImporter (upsert nativo)", _native_import)]
+    if args.skip_legacy:
+        runs = runs[1:]
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for i, (label, fn) in enumerate(runs):
+            engine = _seed(Path(tmp) / f"bench_{i}.db", args.clinics, args.tests)
+            with Session(engine) as db:
+                t0 = time.perf_counter()
+                cells = fn(db, rows)
+                db.commit()
+                dt = time.perf_counter() - t0
+                total = db.scalar(select(func.count()).select_from(Price))
+                results[label] = db.execute(
+                    select(Price.test_id, Price.clinic_id, Price.ingreso).order_by(Price.test_id, Price.clinic_id)
+                ).all()
+            engine.dispose()
+            print(f"{label:<34} {dt:8.2f} {cells:>9} {total:>14}")
+        if args.xlsx:
+            _bench_xlsx(tmp, args, rows)
+    if len(results) == 2:
+        a, b = results.values()
+        print("mismo contenido final:", "sí" if a == b else "NO")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Benchmark: PriceMatrix (NumPy) vs consultas SQL para catálogo provincia y totales por clínica.
+
+Crea una BD SQLite en memoria con datos sintéticos (por defecto 5000 pruebas × 300 sedes,
+~60% de celdas con precio) y mide:
+  - carga de la matriz;
+  - catálogo de 1 sede y de 30 sedes (SQL bulk vs matriz);
+  - totales de 300 sedes para una selección de 200 pruebas (catálogos + suma en Python vs matriz).
+
+No toca la BD real. Ejecutar desde backend/:
+  python -m scripts.bench_price_matrix [--tests 5000] [--clinics 300]
+"""
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.constants import CRA_CLASSIFICATIONS
+from app.database import Base
+from app.models.db_models import Clinic, Price, Test
+from app.models.schemas import Selection
+from app.services.catalog_service import _get_catalogs_provincia_bulk
+from app.services.price_matrix import MATRIX_AVAILABLE, PriceMatrix
+from app.services.provincia_max_service import rebuild_provincia_max
+
+
+def _timed(label: str, fn, repeat: int = 3):
+    best = None
+    result = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        dt = time.perf_counter() - t0
+        best = dt if best is None else min(best, dt)
+    print(f"  {label:<48} {best * 1000:9.1f} ms")
+    return result
+
+
+def _seed(db, n_tests: int, n_clinics: int, density: float, rng: random.Random) -> None:
+    db.execute(insert(Test), [{"name": f"Prueba {i}", "category": f"Cat {i % 25}"} for i in range(n_tests)])
+    db.execute(insert(Clinic), [{"name": f"Sede {j:03d}"} for j in range(n_clinics)])
+    test_ids = [t.id for t in db.query(Test.id).all()]
+    clinic_ids = [c.id for c in db.query(Clinic.id).all()]
+    rows = []
+    for tid in test_ids:
+        for cid in clinic_ids:
+            if rng.random() < density:
+                base = round(rng.uniform(5, 300), 2)
+                rows.append({"test_id": tid, "clinic_id": cid, "ingreso": base, "periodico": base, "retiro": base * 0.8})
+    db.execute(insert(Price), rows)
+    rebuild_provincia_max(db)
+    db.commit()
+
+
+def _totals_python(selections, clinics, catalogs):
+    out = []
+    for name in clinics:
+        by_name = {t["name"]: t["prices"] for t in catalogs[name]}
+        acc = {"ingreso": 0.0, "periodico": 0.0, "retiro": 0.0}
+        for s in selections:
+            if (s.classification or "") in CRA_CLASSIFICATIONS:
+                continue
+            prices = by_name.get(s.name, {})
+            for t in s.types:
+                acc[t] += float((s.overrides or {}).get(t, prices.get(t, 0.0)))
+        out.append(acc)
+    return out
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tests", type=int, default=5000)
+    parser.add_argument("--clinics", type=int, default=300)
+    parser.add_argument("--density", type=float, default=0.6)
+    args = parser.parse_args()
+    if not MATRIX_AVAILABLE:
+        print("numpy no está instalado: pip install numpy")
+        return 1
+
+    rng = random.Random(42)
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+    print(f"Generando {args.tests} pruebas × {args.clinics} sedes (densidad {args.density:.0%})...")
+    with Session() as db:
+        _seed(db, args.tests, args.clinics, args.density, rng)
+
+    clinic_names = [f"Sede {j:03d}" for j in range(args.clinics)]
+    some = clinic_names[:30]
+    with Session() as db:
+        tests = db.query(Test).limit(200).all()
+        selections = [
+            Selection(id=i, testId=t.id, name=t.name, category=t.category, protocol="P",
+                      types=["ingreso", "periodico", "retiro"], prices={})
+            for i, t in enumerate(tests)
+        ]
+
+        print("Carga")
+        matrix = _timed("PriceMatrix.load", lambda: PriceMatrix.load(db, revision=0), repeat=1)
+        print("Catálogo 1 sede")
+        _timed("SQL", lambda: _get_catalogs_provincia_bulk(db, some[:1], 20))
+        _timed("matriz", lambda: matrix.catalogs(some[:1], 20))
+        print("Catálogo 30 sedes")
+        _timed("SQL bulk", lambda: _get_catalogs_provincia_bulk(db, some, 20))
+        _timed("matriz", lambda: matrix.catalogs(some, 20))
+        print(f"Totales {args.clinics} sedes, selección de {len(selections)} pruebas")
+        _timed(
+            "catálogos SQL + suma Python",
+            lambda: _totals_python(selections, clinic_names, _get_catalogs_provincia_bulk(db, clinic_names, 20)),
+            repeat=1,
+        )
+        _timed("matriz (vectorizado)", lambda: matrix.clinic_totals(selections, clinic_names, 20))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
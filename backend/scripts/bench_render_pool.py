@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Benchmark: render de PPTX + XLSX en el hilo (secuencial) vs RenderPool (procesos).
+
+Mide la latencia de una cotización y el tiempo de --quotes cotizaciones simultáneas
+(hilos, como las peticiones de FastAPI). Plantilla sintética si no existe PPT_TEMPLATE.
+Ejecutar desde backend/:
+  python -m scripts.bench_render_pool [--tests 400] [--protocols 6] [--workers 4] [--quotes 4]
+"""
+import argparse
+import random
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.models.schemas import GenerationRequest
+from app.services.docgen import config
+from app.services.render_pool import RenderPool, _render_pptx, _render_xlsx
+from scripts.bench_docgen import _selections, _synthetic_template
+
+
+def _sequential(payload):
+    return _render_pptx(payload), _render_xlsx(payload)
+
+
+def _timed(label: str, fn) -> None:
+    t0 = time.perf_counter()
+    fn()
+    print(f"  {label:<48} {(time.perf_counter() - t0) * 1000:9.1f} ms")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tests", type=int, default=400)
+    parser.add_argument("--protocols", type=int, default=6)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--quotes", type=int, default=4)
+    args = parser.parse_args()
+
+    tmp = tempfile.TemporaryDirectory()
+    if not Path(config.PPT_TEMPLATE).exists():
+        config.PPT_TEMPLATE = _synthetic_template(Path(tmp.name) / "plantilla.pptx", 12)
+    payload = GenerationRequest(
+        company="Bench", recipient="Bench", executive="Bench", location="Lima", proposal_number="1",
+        protocols=[{"name": f"P{p}"} for p in range(args.protocols)],
+        selections=_selections(args.tests, args.protocols, random.Random(42)),
+    )
+    _sequential(payload)  # calentar imports y plantilla en este proceso
+
+    pool = RenderPool(workers=args.workers, max_in_flight=args.quotes)
+    pool.start()
+    pool.render(payload)  # calentar workers
+    print(f"1 cotización ({args.tests} pruebas × {args.protocols} protocolos)")
+    _timed("secuencial en el hilo (antes)", lambda: _sequential(payload))
+    _timed(f"RenderPool ({args.workers} workers)", lambda: pool.render(payload))
+
+    print(f"{args.quotes} cotizaciones simultáneas")
+    with ThreadPoolExecutor(args.quotes) as threads:
+        _timed("secuencial en hilos (GIL)", lambda: list(threads.map(lambda _: _sequential(payload), range(args.quotes))))
+        _timed(f"RenderPool ({args.workers} workers)", lambda: list(threads.map(lambda _: pool.render(payload), range(args.quotes))))
+    pool.shutdown()
+    tmp.cleanup()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
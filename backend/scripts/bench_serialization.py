@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Benchmark: serialización y compresión de un catálogo de N pruebas (por defecto 5000).
+
+Antes: jsonable_encoder + json estándar (camino por defecto de FastAPI), sin comprimir.
+Después: orjson directo (FastJSONResponse) + gzip / brotli (CompressionMiddleware).
+
+Datos sintéticos con la forma de GET /api/catalog; no toca la BD. Ejecutar desde backend/:
+  python -m scripts.bench_serialization [--tests 5000]
+"""
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from app.utils.compression import BROTLI_AVAILABLE, compress
+from app.utils.responses import ORJSON_AVAILABLE, FastJSONResponse
+
+
+def _timed(label: str, fn, repeat: int = 5):
+    best = None
+    result = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        dt = time.perf_counter() - t0
+        best = dt if best is None else min(best, dt)
+    size = f"{len(result) / 1024:9.1f} KB" if isinstance(result, bytes) else ""
+    print(f"  {label:<44} {best * 1000:8.1f} ms {size}")
+    return result
+
+
+def _catalog(n: int, rng: random.Random):
+    out = []
+    for i in range(n):
+        base = round(rng.uniform(5, 300), 2)
+        out.append({
+            "id": i + 1,
+            "name": f"Prueba de laboratorio número {i}",
+            "category": f"Categoría {i % 25}",
+            "prices": {"ingreso": base, "periodico": round(base * 1.2, 2), "retiro": round(base * 0.8, 2)},
+        })
+    return {"catalog": out}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tests", type=int, default=5000)
+    args = parser.parse_args()
+    content = _catalog(args.tests, random.Random(42))
+
+    print(f"Serialización de {args.tests} pruebas")
+    body = _timed("jsonable_encoder + json (antes)", lambda: JSONResponse(jsonable_encoder(content)).body)
+    fast = _timed(
+        "FastJSONResponse (orjson)" if ORJSON_AVAILABLE else "FastJSONResponse (json, sin orjson)",
+        lambda: FastJSONResponse(content).body,
+    )
+    assert len(body) > 0 and len(fast) > 0
+
+    print("Compresión del cuerpo")
+    _timed("gzip", lambda: compress(fast, "gzip"))
+    if BROTLI_AVAILABLE:
+        _timed("brotli", lambda: compress(fast, "br"))
+    else:
+        print("  brotli no está instalado (pip install brotli)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
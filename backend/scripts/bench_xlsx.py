@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Benchmark del resumen XLSX: Workbook normal + ws.append (antes) vs libro write_only.
+
+Mide tiempo (sin trazar) y pico de memoria Python (tracemalloc, en otra pasada) con
+--rows selecciones × 3 tipos. La versión nueva se mide solo con "Resumen" (mismo
+contenido que antes) y con las hojas de sedes (--clinics columnas en la comparación).
+Ejecutar desde backend/:
+  python -m scripts.bench_xlsx [--rows 500 5000] [--clinics 10]
+"""
+import argparse
+import io
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from openpyxl import Workbook
+from openpyxl.styles import Alignment, Font
+
+from app.models.schemas import ClinicTotal, GenerationRequest, Selection
+from app.utils.xlsx_generator import create_xlsx
+
+TYPES = ["ingreso", "periodico", "retiro"]
+
+
+def _legacy_xlsx(req: GenerationRequest, out) -> None:
+    """create_xlsx anterior: todas las celdas como objetos en memoria hasta save()."""
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "Resumen"
+    ws.append(["Protocolo","Prueba","Tipo","Precio","Clasificación","Detalle","Override","Suma?"])
+    for c in ws[1]:
+        c.font = Font(bold=True); c.alignment = Alignment(horizontal="center")
+    for s in req.selections or []:
+        for t in s.types:
+            price = (s.overrides or {}).get(t, s.prices.get(t, 0.0))
+            suma = 0 if (s.classification in ("condicional","requisito","adicional")) else price
+            ws.append([s.protocol, s.name, t.capitalize(), price, s.classification or "", s.detail or "", (s.overrides or {}).get(t, ""), suma])
+    wb.save(out)
+
+
+def _request(rows: int, n_clinics: int) -> GenerationRequest:
+    clinics = [f"Sede {j}" for j in range(n_clinics)]
+    sels = [
+        Selection(id=i, testId=i, name=f"Prueba {i}", category="Lab", protocol=f"P{i % 4}", types=TYPES,
+                  prices={t: 10.0 + i % 50 for t in TYPES}, detail="detalle de la prueba")
+        for i in range(rows)
+    ]
+    return GenerationRequest(
+        company="Bench", recipient="Bench", executive="Bench", location="Provincia", proposal_number="1",
+        protocols=[{"name": f"P{k}"} for k in range(4)], selections=sels, clinics=clinics,
+        clinic_totals=[ClinicTotal(clinic=c, ingreso=1.0, periodico=2.0, retiro=3.0) for c in clinics],
+        clinic_prices={s.name: {c: {t: 12.5 + j for t in TYPES} for j, c in enumerate(clinics)} for s in sels},
+    )
+
+
+def _measure(fn, req):
+    buf = io.BytesIO()
+    t0 = time.perf_counter()
+    fn(req, buf)
+    dt = time.perf_counter() - t0
+    tracemalloc.start()
+    fn(req, io.BytesIO())
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return dt * 1000, peak / 1024 / 1024, len(buf.getvalue()) / 1024
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[500, 5000])
+    parser.add_argument("--clinics", type=int, default=10)
+    args = parser.parse_args()
+    print(f"{'selecciones':>12} {'versión':<32} {'ms':>9} {'pico MB':>9} {'KB':>9}")
+    for rows in args.rows:
+        req = _request(rows, args.clinics)
+        plain = req.model_copy(update={"clinics": None, "clinic_totals": None, "clinic_prices": None})
+        runs = (
+            ("Workbook + append (antes)", _legacy_xlsx, plain),
+            ("write_only, solo Resumen", create_xlsx, plain),
+            ("write_only + hojas de sedes", create_xlsx, req),
+        )
+        for label, fn, r in runs:
+            ms, peak, size = _measure(fn, r)
+            print(f"{rows:>12} {label:<32} {ms:9.1f} {peak:9.1f} {size:9.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -19,6 +19,7 @@ except ImportError:
 
 from app.database import engine, Base
 from app.models.db_models import Clinic
+from app.services.catalog_changes_service import record_catalog_change
 from sqlalchemy.orm import Session
 
 
@@ -40,6 +41,7 @@ def main() -> None:
                 clinic.name = corrected
                 fixed.append((clinic.id, corrected))
         if fixed:
+            record_catalog_change(db, "clinic")  # la API en marcha invalida su caché
             db.commit()
             print("Nombres corregidos:")
             for id_, name in fixed:
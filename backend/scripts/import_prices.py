@@ -33,19 +33,14 @@ from pathlib import Path
 sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
 
 from app.database import engine
-from app.models.db_models import Test, Clinic, Price
+from app.services.price_import_service import PriceImporter
 from sqlalchemy.orm import Session
-def _norm(s: str) -> str:
-    return (s or "").strip()
 
 
-def _norm_clinic(c: str) -> str:
-    v = _norm(c)
-    if v.upper() in ("TODAS", "*", "ALL"):
-        return "TODAS"
-    if v.upper() in ("LIMA", ""):
-        return "Lima"
-    return v
+def _read_rows(reader: csv.DictReader):
+    for row in reader:
+        # Mapear por nombre normalizado (minúsculas, sin BOM)
+        yield {k.strip().lower(): v for k, v in row.items() if k}
 
 
 def run(csv_path: Path, dry_run: bool = False):
@@ -54,101 +49,34 @@ def run(csv_path: Path, dry_run: bool = False):
         return 1
 
     with Session(engine) as db:
-        clinics = {c.name: c.id for c in db.query(Clinic).all()}
-        tests_by_key = {}
-        for t in db.query(Test).all():
-            tests_by_key[(t.name, t.category)] = t.id
-
-        rows_done = 0
-        errors = []
-
+        # Mismo motor que la importación XLSX de la API: upsert nativo por bloques
+        importer = PriceImporter(db, create_tests=not dry_run)
         with open(csv_path, "r", encoding="utf-8-sig") as f:
             reader = csv.DictReader(f)
             if not reader.fieldnames:
                 print("CSV vacío o sin encabezados.")
                 return 1
-            # Normalizar nombres de columnas (minúsculas, sin BOM)
             fieldnames = [fn.strip().lower() for fn in reader.fieldnames]
             if "prueba" not in fieldnames or "categoria" not in fieldnames:
                 print("El CSV debe tener columnas: prueba, categoria, clinica, ingreso, periodico, retiro")
                 return 1
+            importer.feed(_read_rows(reader))
 
-            for row in reader:
-                # Mapear por nombre normalizado
-                row_norm = {k.strip().lower(): v for k, v in row.items() if k}
-                prueba = _norm(row_norm.get("prueba", ""))
-                categoria = _norm(row_norm.get("categoria", ""))
-                clinica = _norm_clinic(row_norm.get("clinica", ""))
-                try:
-                    ingreso = float(row_norm.get("ingreso", 0) or 0)
-                except ValueError:
-                    ingreso = 0.0
-                try:
-                    periodico = float(row_norm.get("periodico", 0) or 0)
-                except ValueError:
-                    periodico = 0.0
-                try:
-                    retiro = float(row_norm.get("retiro", 0) or 0)
-                except ValueError:
-                    retiro = 0.0
-
-                if not prueba or not categoria:
-                    errors.append(f"Fila sin prueba/categoria: {row}")
-                    continue
-
-                # Obtener o crear test
-                key = (prueba, categoria)
-                if key not in tests_by_key:
-                    if dry_run:
-                        errors.append(f"Prueba no existe (se crearía): {prueba} / {categoria}")
-                        continue
-                    test = Test(name=prueba, category=categoria)
-                    db.add(test)
-                    db.flush()
-                    tests_by_key[key] = test.id
-                test_id = tests_by_key[key]
-
-                if clinica == "Lima":
-                    clinic_ids = [None]
-                elif clinica == "TODAS":
-                    clinic_ids = list(clinics.values())
-                else:
-                    if clinica not in clinics:
-                        errors.append(f"Clínica no encontrada: {clinica}")
-                        continue
-                    clinic_ids = [clinics[clinica]]
-
-                for cid in clinic_ids:
-                    existing = (
-                        db.query(Price)
-                        .filter(Price.test_id == test_id, Price.clinic_id == cid)
-                        .first()
-                    )
-                    if existing:
-                        existing.ingreso = ingreso
-                        existing.periodico = periodico
-                        existing.retiro = retiro
-                    else:
-                        db.add(
-                            Price(
-                                test_id=test_id,
-                                clinic_id=cid,
-                                ingreso=ingreso,
-                                periodico=periodico,
-                                retiro=retiro,
-                            )
-                        )
-                    rows_done += 1
-
+        if dry_run:
+            importer.flush()  # se escribe en la transacción para validar y se descarta
+        else:
+            importer.finish()
+        errors, cells_applied = importer.errors, importer.cells_applied
         if errors:
             for e in errors:
                 print("  ", e)
-            print(f"Errores: {len(errors)}. Filas procesadas: {rows_done}")
+            print(f"Errores: {len(errors)}. Celdas aplicadas: {cells_applied}")
         if dry_run:
+            db.rollback()
             print("[DRY RUN] No se guardaron cambios.")
             return 0 if not errors else 1
         db.commit()
-        print(f"OK: {rows_done} precio(s) importado(s).")
+        print(f"OK: {cells_applied} precio(s) importado(s) ({importer.inserted} nuevos, {importer.updated} actualizados).")
         return 0
 
 
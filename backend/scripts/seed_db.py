@@ -11,7 +11,9 @@ from pathlib import Path
 sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
 
 from app.database import engine, Base
-from app.models.db_models import Test, Clinic, Price, User
+from app.models.db_models import Test, Clinic, Price, ProvinciaMaxPrice, User
+from app.services.catalog_changes_service import record_catalog_reset
+from app.services.provincia_max_service import rebuild_provincia_max
 from sqlalchemy.orm import Session
 import bcrypt
 
@@ -39,6 +41,7 @@ def seed():
             print("Usuario admin creado: admin@doktuz.com / admin123")
 
         # Limpiar datos existentes (tests, clinics, prices)
+        db.query(ProvinciaMaxPrice).delete()
         db.query(Price).delete()
         db.query(Test).delete()
         db.query(Clinic).delete()
@@ -93,6 +96,8 @@ def seed():
                     retiro=prices.get("retiro", 0),
                 ))
 
+        rebuild_provincia_max(db)
+        record_catalog_reset(db)
         db.commit()
     print("BD inicializada correctamente.")
 
@@ -2,11 +2,101 @@
 """Pytest fixtures."""
 import pytest
 from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
 
+from app.database import Base
 from app.main import app
+from app.models import db_models  # noqa: F401 - para registrar modelos
+from app.services import (
+    audit_service,
+    catalog_cache as catalog_cache_module,
+    catalog_service,
+    price_import_jobs,
+    price_matrix,
+    test_search,
+)
+from app.services.catalog_cache import catalog_cache
 
 
 @pytest.fixture
 def client():
     """Cliente HTTP para tests."""
     return TestClient(app)
+
+
+@pytest.fixture
+def session_factory():
+    """sessionmaker sobre SQLite en memoria con el esquema creado (caché de catálogo vacía)."""
+    catalog_cache.clear()
+    price_matrix._matrix = None
+    test_search._index = None
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    Base.metadata.create_all(bind=engine)
+    yield sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    engine.dispose()
+
+
+@pytest.fixture
+def db(session_factory):
+    """Sesión sobre la BD en memoria."""
+    with session_factory() as s:
+        yield s
+
+
+@pytest.fixture
+def use_memory_db(monkeypatch, session_factory):
+    """Los servicios que abren SessionLocal por su cuenta usan la BD en memoria.
+    La revisión persistente del catálogo se relee en cada lectura (sin esperar el intervalo)."""
+    for module in (audit_service, catalog_cache_module, catalog_service, price_import_jobs, price_matrix, test_search):
+        monkeypatch.setattr(module, "SessionLocal", session_factory)
+    monkeypatch.setattr(catalog_cache_module, "CATALOG_REVISION_CHECK_SECONDS", 0.0)
+    monkeypatch.setattr(catalog_cache_module, "_persistent", {})
+    return session_factory
+
+
+def make_ppt_template(path, extra_slides: int = 0) -> str:
+    """Plantilla mínima: portada con marcadores y una slide con {{TABLA}}."""
+    from pptx import Presentation
+    from pptx.util import Inches
+
+    prs = Presentation()
+    cover = prs.slides.add_slide(prs.slide_layouts[6])
+    box = cover.shapes.add_textbox(Inches(1), Inches(1), Inches(6), Inches(1))
+    box.text_frame.text = "Propuesta {{x}} para {{RAZON_SOCIAL}}"
+    p = box.text_frame.add_paragraph()
+    run = p.add_run()
+    run.text = "Atención: {{DESTI"
+    run = p.add_run()
+    run.text = "NATARIO}} - {{FECHA}}"
+    cover.shapes.add_textbox(Inches(1), Inches(3), Inches(6), Inches(1)).text_frame.text = "Texto fijo"
+    for _ in range(extra_slides):
+        prs.slides.add_slide(prs.slide_layouts[6]).shapes.add_textbox(
+            Inches(1), Inches(1), Inches(4), Inches(1)
+        ).text_frame.text = "Contenido"
+    table_slide = prs.slides.add_slide(prs.slide_layouts[6])
+    table_slide.shapes.add_textbox(Inches(0.5), Inches(1), Inches(9), Inches(4)).text_frame.text = "{{TABLA}}"
+    table_slide.shapes.add_textbox(Inches(0.5), Inches(6), Inches(9), Inches(1)).text_frame.text = "{{UBICACION}}"
+    prs.save(str(path))
+    return str(path)
+
+
+@pytest.fixture
+def ppt_template(tmp_path, monkeypatch):
+    """PPT_TEMPLATE apuntando a una plantilla sintética (el repo no incluye la real).
+    La caché de artefactos va a un directorio propio del test."""
+    from app.services import generator_service
+    from app.services.artifact_cache import ArtifactCache
+    from app.services.docgen import config, template_pool
+
+    path = make_ppt_template(tmp_path / "plantilla.pptx")
+    monkeypatch.setattr(config, "PPT_TEMPLATE", path)
+    monkeypatch.setattr(generator_service, "artifact_cache", ArtifactCache(str(tmp_path / "artifacts")))
+    template_pool.clear()
+    yield path
+    template_pool.clear()
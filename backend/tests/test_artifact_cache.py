@@ -0,0 +1,83 @@
+# tests/test_artifact_cache.py
+"""Caché de ZIPs de cotización: clave por contenido, LRU por bytes y auditoría en aciertos."""
+import io
+import zipfile
+
+import pytest
+
+from app.dependencies import require_user
+from app.main import app
+from app.models.db_models import AuditLog
+from app.models.schemas import GenerationRequest
+from app.services import generator_service
+from app.services.artifact_cache import ArtifactCache, iter_file
+from app.services.catalog_cache import bump_catalog_revision
+from app.services.catalog_changes_service import record_catalog_change
+
+BODY = {
+    "company": "ACME SAC", "recipient": "Ana", "executive": "Luis", "location": "Lima",
+    "proposal_number": "91", "protocols": [{"name": "P1"}], "images": [],
+    "selections": [{"id": 1, "testId": 1, "name": "Hemograma", "category": "Lab", "protocol": "P1",
+                    "types": ["ingreso"], "prices": {"ingreso": 10.0}}],
+}
+
+
+def test_lru_evicts_by_bytes(tmp_path):
+    cache = ArtifactCache(str(tmp_path), max_bytes=250)
+    cache.put("a", b"a" * 100)
+    cache.put("b", b"b" * 100)
+    assert b"".join(iter_file(cache.open("a"))) == b"a" * 100  # "a" pasa a ser la más reciente
+    cache.put("c", b"c" * 100)
+    assert cache.open("b") is None
+    assert cache.stats()["evictions"] == 1 and cache.stats()["bytes"] == 200
+
+    # El índice se rehace desde disco (otro proceso / reinicio)
+    again = ArtifactCache(str(tmp_path), max_bytes=250)
+    assert b"".join(iter_file(again.open("c"))) == b"c" * 100
+
+
+def test_tee_does_not_publish_partial_downloads(tmp_path):
+    cache = ArtifactCache(str(tmp_path), max_bytes=1000)
+    chunks = cache.tee("k", iter([b"1", b"2", b"3"]))
+    assert next(chunks) == b"1"
+    chunks.close()  # cliente corta la descarga
+    assert cache.open("k") is None
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_cache_key_ignores_volatile_fields_and_tracks_catalog(use_memory_db, ppt_template):
+    payload = GenerationRequest(**BODY)
+    key = generator_service.quote_cache_key(payload)
+    renumbered = BODY["selections"][0] | {"id": 99, "testId": 7}
+    assert generator_service.quote_cache_key(GenerationRequest(**(BODY | {"selections": [renumbered]}))) == key
+    assert generator_service.quote_cache_key(GenerationRequest(**(BODY | {"company": "Otra"}))) != key
+
+    with use_memory_db() as db:
+        record_catalog_change(db, "prices")
+        db.commit()
+    bump_catalog_revision("prices")
+    assert generator_service.quote_cache_key(payload) != key
+
+
+@pytest.fixture
+def authed_client(client, use_memory_db, ppt_template):
+    app.dependency_overrides[require_user] = lambda: ("1", "test@example.com")
+    yield client
+    app.dependency_overrides.pop(require_user, None)
+
+
+def test_repeated_create_is_served_from_cache(authed_client, use_memory_db, monkeypatch):
+    first = authed_client.post("/api/generator/create", json=BODY)
+    assert first.headers["x-artifact-cache"] == "miss"
+
+    def fail(*args, **kwargs):
+        raise AssertionError("no debería renderizar")
+
+    monkeypatch.setattr(generator_service, "render_documents", fail)
+    second = authed_client.post("/api/generator/create", json=BODY)
+    assert second.status_code == 200
+    assert second.headers["x-artifact-cache"] == "hit"
+    assert second.content == first.content
+    assert sorted(zipfile.ZipFile(io.BytesIO(second.content)).namelist()) == ["cotizacion_91.pptx", "resumen_91.xlsx"]
+    with use_memory_db() as db:
+        assert db.query(AuditLog).filter(AuditLog.success == 1).count() == 2
@@ -0,0 +1,63 @@
+# tests/test_catalog_cache.py
+"""Tests para la caché de catálogo."""
+from app.models.db_models import Clinic, Price, Test
+from app.services import catalog_service
+from app.services.catalog_cache import CatalogCache, bump_catalog_revision
+
+
+def test_lru_eviction_and_counters():
+    cache = CatalogCache(max_entries=2)
+    cache.put("a", 1, [])
+    cache.put("b", 1, [])
+    assert cache.get("a", 1) == []
+    cache.put("c", 1, [])  # expulsa "b" (menos usado)
+    assert cache.get("b", 1) is None
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["evictions"] == 1
+    assert stats["entries"] == 2
+
+
+def test_stale_revision_is_a_miss():
+    cache = CatalogCache()
+    cache.put("a", 1, [{"id": 1}])
+    assert cache.get("a", 2) is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_get_catalog_invalidated_on_revision(use_memory_db, db):
+    t = Test(name="Hemograma", category="Laboratorio")
+    c = Clinic(name="Sede Norte")
+    db.add_all([t, c])
+    db.flush()
+    db.add(Price(test_id=t.id, clinic_id=c.id, ingreso=10, periodico=10, retiro=10))
+    db.commit()
+    bump_catalog_revision()
+
+    first = catalog_service.get_catalog("Provincia", "Sede Norte", 20)
+    assert catalog_service.get_catalog("Provincia", "Sede Norte", 20) is first
+    assert first[0]["prices"]["ingreso"] == 12.0
+
+    db.query(Price).update({Price.ingreso: 50})
+    db.commit()
+    bump_catalog_revision()
+    assert catalog_service.get_catalog("Provincia", "Sede Norte", 20)[0]["prices"]["ingreso"] == 60.0
+
+
+def test_get_catalog_sees_writes_from_other_processes(use_memory_db, db):
+    from app.services.catalog_changes_service import record_catalog_change
+
+    t = Test(name="Hemograma", category="Laboratorio")
+    c = Clinic(name="Sede Norte")
+    db.add_all([t, c])
+    db.flush()
+    db.add(Price(test_id=t.id, clinic_id=c.id, ingreso=10, periodico=10, retiro=10))
+    db.commit()
+    assert catalog_service.get_catalog("Provincia", "Sede Norte", 20)[0]["prices"]["ingreso"] == 12.0
+
+    # Como scripts/import_prices.py: escribe y registra el cambio, sin bump en este proceso
+    db.query(Price).update({Price.ingreso: 50})
+    record_catalog_change(db, "price", test_ids=[t.id])
+    db.commit()
+    assert catalog_service.get_catalog("Provincia", "Sede Norte", 20)[0]["prices"]["ingreso"] == 60.0
@@ -0,0 +1,71 @@
+# tests/test_catalog_changes.py
+"""Tests para el delta-sync del catálogo (cambios desde la revisión N)."""
+import pytest
+
+from app.models.db_models import Clinic, Price, Test
+from app.services import catalog_changes_service, catalog_service
+from app.services.catalog_changes_service import record_catalog_change, record_catalog_reset
+from app.services.provincia_max_service import refresh_provincia_max
+
+
+@pytest.fixture
+def seeded(use_memory_db, db):
+    t1, t2 = Test(name="Hemograma", category="Laboratorio"), Test(name="Glucosa", category="Laboratorio")
+    a, b = Clinic(name="Sede A"), Clinic(name="Sede B")
+    db.add_all([t1, t2, a, b])
+    db.flush()
+    db.add(Price(test_id=t1.id, clinic_id=a.id, ingreso=10, periodico=10, retiro=10))
+    refresh_provincia_max(db, [t1.id])
+    record_catalog_change(db, "price", test_ids=[t1.id])
+    db.commit()
+    return db, t1, t2, a, b
+
+
+def test_changes_resolved_with_provincia_fallback(seeded):
+    db, t1, t2, a, b = seeded
+    rev = catalog_service.get_catalog_changes(0, "Provincia", "Sede B", 20)["revision"]
+
+    db.add(Price(test_id=t2.id, clinic_id=a.id, ingreso=50, periodico=0, retiro=0))
+    refresh_provincia_max(db, [t2.id])
+    record_catalog_change(db, "price", test_ids=[t2.id], clinic_id=a.id)
+    db.commit()
+
+    out = catalog_service.get_catalog_changes(rev, "Provincia", "Sede B", 20)
+    assert out["full"] is False
+    assert out["revision"] == rev + 1
+    assert [e["id"] for e in out["upserted"]] == [t2.id]
+    assert out["upserted"][0]["prices"]["ingreso"] == 60.0  # máximo provincia + 20%
+    assert out["deleted"] == []
+
+    lima = catalog_service.get_catalog_changes(rev, "Lima", None, 0)
+    assert lima["upserted"] == [] and lima["deleted"] == [t2.id]  # sin precio Lima
+
+
+def test_reset_or_truncation_returns_snapshot(seeded, monkeypatch):
+    db = seeded[0]
+    record_catalog_reset(db)
+    db.commit()
+    out = catalog_service.get_catalog_changes(0, "Provincia", "Sede A", 20)
+    assert out["full"] is True
+    assert len(out["catalog"]) == 2
+
+    monkeypatch.setattr(catalog_changes_service, "CATALOG_CHANGES_KEEP", 1)
+    record_catalog_change(db, "clinic")
+    db.commit()
+    rev = out["revision"]
+    assert catalog_service.get_catalog_changes(rev - 1, "Provincia", "Sede A", 20)["full"] is True
+    assert catalog_service.get_catalog_changes(rev, "Provincia", "Sede A", 20)["full"] is False
+
+
+def test_delta_entries_match_snapshot(seeded):
+    db, t1, t2, a, b = seeded
+    rev = catalog_service.get_catalog_changes(0, "Provincia", "Sede A", 25)["revision"]
+    db.add(Price(test_id=t2.id, clinic_id=a.id, ingreso=277.94, periodico=1.005, retiro=0))  # empates de medio centavo
+    refresh_provincia_max(db, [t2.id])
+    record_catalog_change(db, "price", test_ids=[t2.id], clinic_id=a.id)
+    db.commit()
+
+    delta = catalog_service.get_catalog_changes(rev, "Provincia", "Sede A", 25)["upserted"]
+    snapshot = {e["id"]: e for e in catalog_service.get_catalog("Provincia", "Sede A", 25)}
+    assert delta == [snapshot[t2.id]]
+    assert delta[0]["prices"]["ingreso"] == 347.43
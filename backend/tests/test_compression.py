@@ -0,0 +1,81 @@
+# tests/test_compression.py
+"""Tests para la negociación gzip/brotli y la respuesta orjson."""
+import gzip
+import json
+
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+
+from app.utils import compression
+from app.utils.compression import CompressionMiddleware, choose_encoding
+from app.utils.responses import FastJSONResponse, json_response
+
+BIG = {"catalog": [{"id": i, "name": f"Prueba {i}", "prices": {"ingreso": 10.5}} for i in range(200)]}
+
+
+def _app() -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(CompressionMiddleware, minimum_size=500)
+
+    @app.get("/big")
+    def big():
+        return FastJSONResponse(BIG, headers={"ETag": '"abc"'})
+
+    @app.get("/small")
+    def small():
+        return {"ok": True}
+
+    @app.get("/stream")
+    def stream():
+        return StreamingResponse(iter([b"x" * 1000, b"y" * 1000]), media_type="text/plain")
+
+    return app
+
+
+def test_choose_encoding(monkeypatch):
+    monkeypatch.setattr(compression, "BROTLI_AVAILABLE", False)
+    assert choose_encoding("") is None
+    assert choose_encoding("gzip, deflate, br") == "gzip"
+    assert choose_encoding("gzip;q=0, identity") is None
+    assert choose_encoding("*") == "gzip"
+    monkeypatch.setattr(compression, "BROTLI_AVAILABLE", True)
+    assert choose_encoding("gzip, deflate, br") == "br"
+    assert choose_encoding("br;q=0.5, gzip") == "gzip"
+
+
+def test_compresses_large_json_only():
+    client = TestClient(_app())
+    r = client.get("/big", headers={"Accept-Encoding": "gzip"})
+    assert r.headers["content-encoding"] == "gzip"
+    assert "Accept-Encoding" in r.headers["vary"]
+    assert r.headers["etag"] == 'W/"abc"'
+    assert r.json() == BIG  # httpx descomprime
+
+    raw = client.get("/big", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in raw.headers
+    assert raw.headers["etag"] == '"abc"'
+    assert json.loads(raw.content) == BIG
+
+    small = client.get("/small", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in small.headers
+
+    stream = client.get("/stream", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in stream.headers
+    assert len(stream.content) == 2000
+
+
+def test_gzip_body_roundtrip():
+    body = json.dumps(BIG).encode()
+    assert gzip.decompress(compression.compress(body, "gzip")) == body
+
+
+def test_json_response_keeps_injected_headers():
+    from fastapi import Response
+
+    injected = Response()
+    injected.headers["ETag"] = '"x"'
+    r = json_response({"a": [1, 2.5, "ñ"], 3: None}, injected)
+    assert r.headers["etag"] == '"x"'
+    assert json.loads(r.body) == {"a": [1, 2.5, "ñ"], "3": None}
+    assert r.headers["content-length"] == str(len(r.body))
@@ -0,0 +1,95 @@
+# tests/test_docgen_images.py
+"""Imágenes del PPT: topes antes de decodificar, reducción a DPI, caché por contenido y slides."""
+import base64
+import io
+
+import pytest
+from PIL import Image
+from pptx import Presentation
+
+from app.dependencies import require_user
+from app.main import app
+from app.models.schemas import GenerationRequest, ImageCfg
+from app.services.docgen import build_ppt, images
+from app.services.docgen.images import ImageCache, ImagePayloadTooLarge, applicable_images, check_images
+
+
+def _png_b64(size=(40, 20), color=(200, 30, 30)) -> str:
+    buf = io.BytesIO()
+    Image.new("RGB", size, color).save(buf, format="PNG")
+    return base64.b64encode(buf.getvalue()).decode("ascii")
+
+
+def test_check_images_caps_before_decoding(monkeypatch):
+    monkeypatch.setattr(images, "PPT_IMAGE_MAX_BYTES", 300)
+    check_images([ImageCfg(base64="A" * 400)])  # 300 bytes decodificados: justo en el tope
+    with pytest.raises(ImagePayloadTooLarge):
+        check_images([ImageCfg(base64="no-es-base64!" * 40)])  # no se intenta decodificar
+    monkeypatch.setattr(images, "PPT_IMAGE_MAX_COUNT", 1)
+    with pytest.raises(ImagePayloadTooLarge):
+        check_images([ImageCfg(base64="AAAA"), ImageCfg(base64="AAAA")])
+
+
+def test_cache_downscales_once_by_content():
+    cache = ImageCache(max_bytes=10 * 1024 * 1024)
+    b64 = "data:image/png;base64," + _png_b64((3000, 1500))
+    first = cache.get(b64, 600, 600)
+    assert (first.width, first.height) == (600, 300)
+    assert Image.open(io.BytesIO(first.blob)).size == (600, 300)
+    assert cache.get(b64, 600, 600) is first
+    small = cache.get(_png_b64((10, 10)), 600, 600)
+    assert (small.width, small.height) == (10, 10)  # no se agranda; bytes originales
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 2
+
+
+def test_applicable_types_filter():
+    imgs = [ImageCfg(base64="AAAA"), ImageCfg(base64="AAAA", applicable_types=["retiro"]), ImageCfg()]
+    assert len(applicable_images(imgs, {"ingreso"})) == 1
+    assert len(applicable_images(imgs, {"ingreso", "retiro"})) == 2
+
+
+def test_build_ppt_inserts_image_slides_after_table(ppt_template):
+    payload = GenerationRequest(
+        company="ACME", recipient="Ana", executive="Luis", location="Lima", proposal_number="3",
+        protocols=[{"name": "P1"}],
+        selections=[{"id": 1, "testId": 1, "name": "Hemograma", "category": "Lab", "protocol": "P1",
+                     "types": ["ingreso"], "prices": {"ingreso": 10.0}}],
+        images=[ImageCfg(base64=_png_b64()), ImageCfg(base64="////", applicable_types=["ingreso"])],
+    )
+    buf = io.BytesIO()
+    build_ppt(payload, buf)
+    prs = Presentation(io.BytesIO(buf.getvalue()))
+    slides = list(prs.slides)
+    assert len(slides) == 3  # portada, tabla, imagen (la ilegible se omite)
+    assert any(sh.has_table for sh in slides[1].shapes)
+    pics = [sh for sh in slides[2].shapes if sh.shape_type == 13]
+    assert len(pics) == 1
+    assert pics[0].left + pics[0].width // 2 == pytest.approx(prs.slide_width // 2, abs=2)
+
+
+def test_build_ppt_skips_decompression_bomb(ppt_template, monkeypatch):
+    monkeypatch.setattr(images, "PPT_IMAGE_MAX_PIXELS", 1000)
+    images.image_cache.clear()
+    payload = GenerationRequest(
+        company="ACME", recipient="Ana", executive="Luis", location="Lima", proposal_number="3",
+        protocols=[], selections=[],
+        images=[ImageCfg(base64=_png_b64((100, 100))), ImageCfg(base64=_png_b64((20, 20)))],
+    )
+    buf = io.BytesIO()
+    build_ppt(payload, buf)  # no lanza: la imagen de 10 000 px se omite
+    slides = list(Presentation(io.BytesIO(buf.getvalue())).slides)
+    assert sum(1 for sl in slides for sh in sl.shapes if sh.shape_type == 13) == 1
+
+
+def test_create_rejects_oversized_images(client, monkeypatch):
+    monkeypatch.setattr(images, "PPT_IMAGE_MAX_TOTAL_BYTES", 100)
+    app.dependency_overrides[require_user] = lambda: ("1", "test@example.com")
+    try:
+        r = client.post("/api/generator/create", json={
+            "company": "ACME", "recipient": "Ana", "executive": "Luis", "location": "Lima",
+            "proposal_number": "3", "protocols": [], "selections": [],
+            "images": [{"base64": "A" * 200}],
+        })
+    finally:
+        app.dependency_overrides.pop(require_user, None)
+    assert r.status_code == 413
@@ -0,0 +1,75 @@
+# tests/test_docgen_lookup.py
+"""SelectionLookup debe dar los mismos valores que el recorrido lineal de by_proto."""
+import random
+from collections import defaultdict
+
+from app.constants import CLASSIFICATION_LETTER, CRA_CLASSIFICATIONS
+from app.models.schemas import Selection
+from app.services.docgen.build import SelectionLookup
+
+
+def _linear(by_proto):
+    def get_val(name, proto, t):
+        for s in by_proto.get(proto, []):
+            if s.name == name:
+                if t not in s.types:
+                    return "-"
+                cl = s.classification or None
+                return CLASSIFICATION_LETTER.get(cl, "X") if cl in CRA_CLASSIFICATIONS else "X"
+        return "-"
+
+    def get_num_val(name, proto, t):
+        for s in by_proto.get(proto, []):
+            if s.name == name:
+                if t not in s.types:
+                    return None
+                ov = (s.overrides or {}).get(t)
+                return float(ov if ov is not None else s.prices.get(t, 0.0))
+        return None
+
+    def get_cra_price(name, proto, t):
+        for s in by_proto.get(proto, []):
+            if s.name == name and s.classification in CRA_CLASSIFICATIONS:
+                if t not in s.types:
+                    return "-"
+                ov = (s.overrides or {}).get(t)
+                return f"S/ {float(ov if ov is not None else s.prices.get(t, 0.0)):.2f}"
+        return "-"
+
+    return get_val, get_num_val, get_cra_price
+
+
+def test_lookup_matches_linear_scan():
+    rng = random.Random(7)
+    by_proto = defaultdict(list)
+    for i in range(400):
+        proto = f"P{rng.randrange(3)}"
+        # Nombres repetidos dentro del protocolo: gana la primera selección
+        by_proto[proto].append(Selection(
+            id=i, testId=i, name=f"T{rng.randrange(60)}", category="Lab", protocol=proto,
+            types=[t for t in ("ingreso", "periodico", "retiro") if rng.random() < 0.6],
+            prices={"ingreso": rng.uniform(1, 50), "periodico": 2.5},
+            classification=rng.choice([None, None, "condicional", "requisito", "adicional"]),
+            overrides={"retiro": 4.0} if rng.random() < 0.2 else None,
+        ))
+    lookup = SelectionLookup(by_proto)
+    get_val, get_num_val, get_cra_price = _linear(by_proto)
+    for proto in ("P0", "P1", "P2", "P9"):
+        for n in range(62):
+            for t in ("ingreso", "periodico", "retiro"):
+                args = (f"T{n}", proto, t)
+                assert lookup.get_val(*args) == get_val(*args)
+                assert lookup.get_num_val(*args) == get_num_val(*args)
+                assert lookup.get_cra_price(*args) == get_cra_price(*args)
+
+    group_defs = [("P0", ["ingreso", "retiro"]), ("P2", ["periodico"])]
+    rows = [(f"T{n}", f"T{n}", False) for n in range(62)]
+    totals = lookup.column_totals(group_defs, rows)
+    for proto, tps in group_defs:
+        for t in tps:
+            expected = 0.0
+            for _, rn, _ in rows:
+                v = get_num_val(rn, proto, t)
+                if v is not None:
+                    expected += v
+            assert totals[(proto, t)] == expected
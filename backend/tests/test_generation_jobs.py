@@ -0,0 +1,94 @@
+# tests/test_generation_jobs.py
+"""Cotizaciones en segundo plano: encolar, consultar estado y descargar el ZIP."""
+import io
+import time
+import zipfile
+
+import pytest
+
+from app.dependencies import require_user
+from app.main import app
+from app.models.schemas import GenerationRequest
+from app.services import generation_jobs as jobs_module
+from app.services.generation_jobs import GenerationJobQueue, JobQueueFull
+
+BODY = {
+    "company": "ACME SAC", "recipient": "Ana", "executive": "Luis", "location": "Lima",
+    "proposal_number": "88", "protocols": [{"name": "P1"}], "images": [],
+    "selections": [{"id": 1, "testId": 1, "name": "Hemograma", "category": "Lab", "protocol": "P1",
+                    "types": ["ingreso"], "prices": {"ingreso": 10.0}}],
+}
+
+
+@pytest.fixture
+def jobs(monkeypatch):
+    q = GenerationJobQueue(workers=1, max_queued=2)
+    monkeypatch.setattr("app.routers.generator.generation_jobs", q)
+    yield q
+    q.shutdown()
+
+
+@pytest.fixture
+def authed_client(client, use_memory_db, ppt_template):
+    user = {"id": "1"}
+    app.dependency_overrides[require_user] = lambda: (user["id"], "test@example.com")
+    client.user = user
+    yield client
+    app.dependency_overrides.pop(require_user, None)
+
+
+def _wait(client, job_id, timeout=30.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        data = client.get(f"/api/generator/jobs/{job_id}").json()
+        if data["status"] in ("done", "error"):
+            return data
+        time.sleep(0.05)
+    raise AssertionError("el job no terminó")
+
+
+def test_job_lifecycle_and_download(authed_client, jobs):
+    r = authed_client.post("/api/generator/jobs", json=BODY)
+    assert r.status_code == 202
+    job_id = r.json()["id"]
+
+    data = _wait(authed_client, job_id)
+    assert data["status"] == "done"
+    assert data["progress"] == 1.0
+    assert [s["name"] for s in data["stages"]] == ["catalog", "render", "zip"]
+    assert all(s["status"] == "done" and s["ms"] is not None for s in data["stages"])
+
+    r = authed_client.get(f"/api/generator/jobs/{job_id}/download")
+    assert r.status_code == 200
+    assert r.headers["content-disposition"] == 'attachment; filename="cotizacion_ACME_SAC_88.zip"'
+    assert sorted(zipfile.ZipFile(io.BytesIO(r.content)).namelist()) == ["cotizacion_88.pptx", "resumen_88.xlsx"]
+    assert authed_client.get("/api/generator/jobs/stats").json()["completed"] == 1
+
+    # Otro usuario no ve el job
+    authed_client.user["id"] = "2"
+    assert authed_client.get(f"/api/generator/jobs/{job_id}").status_code == 404
+
+
+def test_job_validates_before_queueing(authed_client, jobs):
+    r = authed_client.post("/api/generator/jobs", json={**BODY, "company": ""})
+    assert r.status_code == 400
+    assert jobs.stats()["kept"] == 0
+
+
+def test_bounded_queue_and_expiry(monkeypatch):
+    q = GenerationJobQueue(workers=1, max_queued=1)
+    monkeypatch.setattr(q, "_ensure_workers", lambda: None)  # sin workers: los jobs quedan en cola
+    payload = GenerationRequest(**BODY)
+    job = q.submit(payload, owner="1")
+    with pytest.raises(JobQueueFull):
+        q.submit(payload, owner="1")
+    stats = q.stats()
+    assert stats["queue_depth"] == 1 and stats["rejected"] == 1
+
+    job.finish("done")
+    job.artifact = b"zip"
+    monkeypatch.setattr(jobs_module, "JOB_TTL_SECONDS", 0.0)
+    job.finished_at -= 1
+    assert q.get(job.id) is None
+    assert job.status == "expired" and job.artifact is None
+    assert q.stats()["expired"] == 1
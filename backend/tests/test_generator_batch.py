@@ -0,0 +1,85 @@
+# tests/test_generator_batch.py
+"""Lote de cotizaciones: una carpeta por propuesta y fallos por propuesta sin cortar el lote."""
+import io
+import json
+import threading
+import zipfile
+
+import pytest
+
+from app.dependencies import require_user
+from app.main import app
+from app.models.db_models import AuditLog
+from app.services import generator_service
+
+BATCH = {
+    "executive": "Luis", "location": "Lima", "protocols": [{"name": "P1"}], "images": [],
+    "selections": [{"id": 1, "testId": 1, "name": "Hemograma", "category": "Lab", "protocol": "P1",
+                    "types": ["ingreso"], "prices": {"ingreso": 10.0}}],
+    "recipients": [
+        {"company": "ACME SAC", "recipient": "Ana", "proposal_number": "10"},
+        {"company": "Beta SRL", "recipient": "Bruno", "proposal_number": "11", "executive": "Carla"},
+        {"company": "Gamma SA", "recipient": "Gina", "proposal_number": "12"},
+    ],
+}
+
+
+@pytest.fixture
+def authed_client(client, use_memory_db, ppt_template):
+    app.dependency_overrides[require_user] = lambda: ("1", "test@example.com")
+    yield client
+    app.dependency_overrides.pop(require_user, None)
+
+
+def test_batch_zip_has_one_folder_per_proposal(authed_client, use_memory_db):
+    r = authed_client.post("/api/generator/batch", json=BATCH)
+    assert r.status_code == 200
+    zf = zipfile.ZipFile(io.BytesIO(r.content))
+    assert "01_ACME_SAC_10/cotizacion_10.pptx" in zf.namelist()
+    assert "02_Beta_SRL_11/resumen_11.xlsx" in zf.namelist()
+    summary = json.loads(zf.read("resumen_lote.json"))
+    assert [s["ok"] for s in summary] == [True, True, True]
+    with use_memory_db() as db:
+        executives = [a.executive for a in db.query(AuditLog).order_by(AuditLog.id)]
+    assert sorted(executives) == ["Carla", "Luis", "Luis"]  # se auditan al terminar cada una
+
+
+def test_batch_reports_item_failures(authed_client, use_memory_db, monkeypatch):
+    render = generator_service.render_documents
+
+    def flaky(payload):
+        if payload.proposal_number == "11":
+            raise RuntimeError("plantilla rota")
+        return render(payload)
+
+    monkeypatch.setattr(generator_service, "render_documents", flaky)
+    r = authed_client.post("/api/generator/batch", json=BATCH)
+    assert r.status_code == 200
+    zf = zipfile.ZipFile(io.BytesIO(r.content))
+    assert not any(n.startswith("02_") for n in zf.namelist())
+    summary = json.loads(zf.read("resumen_lote.json"))
+    assert [s["ok"] for s in summary] == [True, False, True]
+    assert summary[1]["error"] == "plantilla rota"
+    with use_memory_db() as db:
+        assert db.query(AuditLog).filter(AuditLog.success == 0).count() == 1
+
+
+def test_batch_renders_in_parallel_without_process_pool(authed_client, monkeypatch):
+    monkeypatch.setattr(generator_service, "BATCH_RENDER_THREADS", 3)
+    barrier = threading.Barrier(3, timeout=10)  # solo pasa si las 3 propuestas están a la vez
+    render = generator_service.render_documents
+
+    def together(payload):
+        barrier.wait()
+        return render(payload)
+
+    monkeypatch.setattr(generator_service, "render_documents", together)
+    r = authed_client.post("/api/generator/batch", json=BATCH)
+    assert r.status_code == 200
+    summary = json.loads(zipfile.ZipFile(io.BytesIO(r.content)).read("resumen_lote.json"))
+    assert [s["folder"][:2] for s in summary] == ["01", "02", "03"] and all(s["ok"] for s in summary)
+
+
+def test_batch_validates_recipients(authed_client):
+    r = authed_client.post("/api/generator/batch", json={**BATCH, "recipients": []})
+    assert r.status_code == 400
@@ -0,0 +1,73 @@
+# tests/test_generator_stream.py
+"""ZIP de la cotización generado en memoria y enviado en streaming."""
+import io
+import zipfile
+
+import pytest
+
+from app.dependencies import require_user
+from app.main import app
+from app.models.db_models import AuditLog
+from app.utils.zip_stream import attachment_header, iter_zip
+
+
+def test_iter_zip_stores_ooxml_members():
+    raw = b"PK\x03\x04" + b"x" * 200_000
+    pptx = io.BytesIO(raw)
+    txt = io.BytesIO(b"hola " * 1000)
+    chunks = list(iter_zip([("a.pptx", pptx), ("notas.txt", txt)], chunk_size=16 * 1024))
+    assert len(chunks) > 2  # se entrega por bloques
+    zf = zipfile.ZipFile(io.BytesIO(b"".join(chunks)))
+    assert zf.testzip() is None
+    assert zf.getinfo("a.pptx").compress_type == zipfile.ZIP_STORED
+    assert zf.getinfo("notas.txt").compress_type == zipfile.ZIP_DEFLATED
+    assert zf.read("a.pptx") == raw
+    assert pptx.closed and txt.closed
+
+
+def test_iter_zip_pulls_lazy_members_and_closes_on_abort():
+    produced, closed = [], []
+
+    def members():
+        try:
+            for i in range(3):
+                produced.append(i)
+                yield f"{i}.txt", io.BytesIO(b"x" * 100)
+        finally:
+            closed.append(True)
+
+    chunks = iter_zip(members(), chunk_size=10)
+    next(chunks)
+    assert produced == [0]  # el segundo miembro aún no se pidió
+    chunks.close()  # el cliente corta la descarga
+    assert closed == [True]
+
+
+def test_attachment_header():
+    assert attachment_header("cotizacion_ACME_1.zip") == 'attachment; filename="cotizacion_ACME_1.zip"'
+    assert attachment_header("cotización 1.zip") == "attachment; filename*=utf-8''cotizaci%C3%B3n%201.zip"
+
+
+@pytest.fixture
+def authed_client(client, use_memory_db, ppt_template):
+    app.dependency_overrides[require_user] = lambda: ("1", "test@example.com")
+    yield client
+    app.dependency_overrides.pop(require_user, None)
+
+
+def test_create_streams_zip_without_temp_files(authed_client, use_memory_db):
+    body = {
+        "company": "ACME SAC", "recipient": "Ana", "executive": "Luis", "location": "Lima",
+        "proposal_number": "77", "protocols": [{"name": "P1"}], "images": [],
+        "selections": [{"id": 1, "testId": 1, "name": "Hemograma", "category": "Lab", "protocol": "P1",
+                        "types": ["ingreso"], "prices": {"ingreso": 10.0}}],
+    }
+    r = authed_client.post("/api/generator/create", json=body)
+    assert r.status_code == 200
+    assert r.headers["content-type"] == "application/zip"
+    assert r.headers["content-disposition"] == 'attachment; filename="cotizacion_ACME_SAC_77.zip"'
+    zf = zipfile.ZipFile(io.BytesIO(r.content))
+    assert sorted(zf.namelist()) == ["cotizacion_77.pptx", "resumen_77.xlsx"]
+    assert all(i.compress_type == zipfile.ZIP_STORED for i in zf.infolist())
+    with use_memory_db() as db:
+        assert db.query(AuditLog).filter(AuditLog.success == 1).count() == 1
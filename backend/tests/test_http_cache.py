@@ -0,0 +1,53 @@
+# tests/test_http_cache.py
+"""Tests para ETag / If-None-Match en endpoints de catálogo."""
+import pytest
+
+from app.dependencies import require_user
+from app.main import app
+from app.services import catalog_service
+from app.services.catalog_changes_service import record_catalog_change
+
+
+@pytest.fixture
+def authed_client(client, use_memory_db):
+    app.dependency_overrides[require_user] = lambda: ("1", "test@example.com")
+    yield client
+    app.dependency_overrides.pop(require_user, None)
+
+
+def _record(entity):
+    """Escritura de otro proceso: solo queda en catalog_changes (sin bump en este)."""
+    with catalog_service.SessionLocal() as db:
+        record_catalog_change(db, entity)
+        db.commit()
+
+
+def test_clinics_304_until_clinics_change(authed_client):
+    r = authed_client.get("/api/catalog/clinics")
+    assert r.status_code == 200
+    etag = r.headers["etag"]
+
+    r2 = authed_client.get("/api/catalog/clinics", headers={"If-None-Match": etag})
+    assert r2.status_code == 304
+    assert r2.content == b""
+
+    _record("price")  # no afecta a la lista de clínicas
+    assert authed_client.get("/api/catalog/clinics", headers={"If-None-Match": etag}).status_code == 304
+
+    _record("clinic")
+    r3 = authed_client.get("/api/catalog/clinics", headers={"If-None-Match": etag})
+    assert r3.status_code == 200
+    assert r3.headers["etag"] != etag
+
+
+def test_catalog_etag_depends_on_params(authed_client):
+    a = authed_client.get("/api/catalog", params={"location": "Provincia", "clinic": "A"})
+    b = authed_client.get("/api/catalog", params={"location": "Provincia", "clinic": "B"})
+    assert a.status_code == b.status_code == 200
+    assert a.headers["etag"] != b.headers["etag"]
+    r = authed_client.get(
+        "/api/catalog",
+        params={"location": "Provincia", "clinic": "A"},
+        headers={"If-None-Match": f'W/{a.headers["etag"]}'},
+    )
+    assert r.status_code == 304
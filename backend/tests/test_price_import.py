@@ -0,0 +1,220 @@
+# tests/test_price_import.py
+"""Importación de precios: pruebas nuevas en bloque, TODAS expandido, dedupe (gana la última), XLSX en streaming y diff de la previsualización."""
+import pytest
+from sqlalchemy import event
+
+from app.database import get_db
+from app.dependencies import require_user
+from app.main import app
+from app.models.db_models import CatalogChange, Clinic, Price, ProvinciaMaxPrice, Test
+from app.services.price_import_service import (
+    ImportFileError,
+    PriceImporter,
+    import_prices_from_rows,
+    import_prices_from_xlsx,
+    iter_xlsx_rows,
+    preview_import_rows,
+)
+
+
+def _row(prueba, clinica, monto, categoria="Lab"):
+    return {"prueba": prueba, "categoria": categoria, "clinica": clinica,
+            "ingreso": monto, "periodico": monto, "retiro": monto}
+
+
+def _seed(db):
+    t = Test(name="Hemograma", category="Lab")
+    a, b = Clinic(name="Sede A"), Clinic(name="Sede B")
+    db.add_all([t, a, b])
+    db.flush()
+    db.add(Price(test_id=t.id, clinic_id=a.id, ingreso=1, periodico=1, retiro=1, no_realiza=True))
+    db.add(Price(test_id=t.id, clinic_id=None, ingreso=1, periodico=1, retiro=1))
+    db.commit()
+    return t, a, b
+
+
+def _prices(db, name):
+    return {
+        (p.clinic_id, p.ingreso) for p in db.query(Price).join(Test).filter(Test.name == name)
+    }
+
+
+def test_import_upserts_expands_and_dedupes(db):
+    t, a, b = _seed(db)
+    done, errors = import_prices_from_rows(db, [
+        _row("Hemograma", "Lima", 40),
+        _row("Hemograma", "todas", 30),
+        _row("Hemograma", "Sede B", 35),  # pisa la expansión anterior
+        _row("Marihuana", "*", 50, "Tox"),
+        _row("Marihuana", "", 55, "Tox"),
+        _row("Marihuana", "Sede X", 1, "Tox"),
+        _row("", "Lima", 1),
+    ])
+    db.commit()
+    db.expire_all()
+    assert done == 6
+    assert errors == ["Clínica no encontrada: Sede X", "Falta prueba o categoría"]
+    assert _prices(db, "Hemograma") == {(None, 40), (a.id, 30), (b.id, 35)}
+    assert _prices(db, "Marihuana") == {(None, 55), (a.id, 50), (b.id, 50)}
+    assert db.query(Test).filter(Test.name == "Marihuana").count() == 1
+    assert db.query(Price).filter(Price.clinic_id == a.id, Price.test_id == t.id).one().no_realiza is True
+    assert db.get(ProvinciaMaxPrice, t.id).ingreso == 35
+    assert db.query(CatalogChange).filter(CatalogChange.op == "reset").count() == 1
+
+
+def test_importer_without_creating_tests(db):
+    _seed(db)
+    importer = PriceImporter(db, create_tests=False)
+    importer.feed([_row("Nueva", "Lima", 10), _row("Hemograma", "Lima", 20)])
+    assert importer.flush() == 1
+    assert importer.errors == ["Prueba no existe (se crearía): Nueva / Lab"]
+    assert (importer.inserted, importer.updated, importer.tests_created) == (0, 1, 0)
+    assert db.query(Test).count() == 1
+
+
+def _xlsx(path, rows):
+    from openpyxl import Workbook
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Precios")
+    ws.append(["Prueba", "Categoria", "Clinica", "Ingreso", "Periodico", "Retiro"])
+    for r in rows:
+        ws.append(r)
+    wb.save(path)
+    return str(path)
+
+
+def test_xlsx_stream_chunks_and_row_numbers(db, tmp_path):
+    _, a, b = _seed(db)
+    path = _xlsx(tmp_path / "p.xlsx", [
+        ["Hemograma", "Lab", "Lima", 40, 40, 40],
+        [None, None, None, None, None, None],  # se salta, pero cuenta para la numeración
+        ["Glucosa", "Lab", "TODAS", 12, None, 3],
+        ["Urea", "Lab", "Sede X", 1, 1, 1],
+        ["Urea", "Lab", "Sede A", 9, 9, 9],
+    ])
+    progress = []
+    importer = import_prices_from_xlsx(db, path, chunk_size=2, on_progress=lambda imp: progress.append(imp.cells_applied))
+    db.commit()
+    assert importer.rows_parsed == 4 and importer.cells_applied == 4
+    assert importer.errors == ["Fila 5: Clínica no encontrada: Sede X"]
+    assert progress == [3, 4]  # flush al llenar el bloque (TODAS suma 2 celdas) y al final
+    assert _prices(db, "Glucosa") == {(a.id, 12), (b.id, 12)}
+
+
+def test_xlsx_rejects_non_xlsx(db, tmp_path):
+    path = tmp_path / "p.xlsx"
+    path.write_bytes(b"no es un zip")
+    with pytest.raises(ImportFileError):
+        list(iter_xlsx_rows(str(path)))
+
+
+def test_import_endpoint_streams_upload(client, db, tmp_path):
+    _seed(db)
+    path = _xlsx(tmp_path / "p.xlsx", [["Hemograma", "Lab", "Lima", 70, 70, 70], ["Hemograma", "Lab", "Nope", 1, 1, 1]])
+    app.dependency_overrides[require_user] = lambda: ("1", "test@example.com")
+    app.dependency_overrides[get_db] = lambda: db
+    try:
+        with open(path, "rb") as f:
+            r = client.post("/api/prices/import", files={"file": ("p.xlsx", f)})
+        empty = client.post("/api/prices/import", files={"file": ("v.xlsx", open(_xlsx(tmp_path / "v.xlsx", []), "rb"))})
+    finally:
+        app.dependency_overrides.pop(require_user, None)
+        app.dependency_overrides.pop(get_db, None)
+    assert r.status_code == 200
+    assert r.json() == {"imported": 1, "errors": ["Fila 3: Clínica no encontrada: Nope"], "errorCount": 1, "rowsParsed": 2}
+    assert empty.status_code == 400
+
+
+def test_preview_diff_set_wise(db):
+    t, a, b = _seed(db)
+    db.add(Price(test_id=t.id, clinic_id=b.id, ingreso=30, periodico=30, retiro=30))
+    db.commit()
+    rows = [
+        {"row": 2, **_row("Hemograma", "TODAS", 30)},   # A: 1 → 30 (changed), B: igual (unchanged)
+        {"row": 3, **_row("Hemograma", "Lima", 1)},     # unchanged
+        {"row": 4, **_row("Urea", "Sede A", 5)},        # prueba nueva
+        {"row": 5, **_row("Urea", "Sede Z", 5)},        # inválida: no entra al diff
+    ]
+    statements = []
+    listener = lambda conn, cursor, stmt, *args: statements.append(stmt)  # noqa: E731
+    event.listen(db.get_bind(), "before_cursor_execute", listener)
+    try:
+        preview = preview_import_rows(db, rows, diff_limit=2)
+    finally:
+        event.remove(db.get_bind(), "before_cursor_execute", listener)
+    assert sum(1 for st in statements if "FROM prices" in st) == 1
+    assert (preview["validCount"], preview["invalidCount"]) == (3, 1)
+    diff = preview["diff"]
+    assert diff["summary"] == {"cells": 4, "inserted": 1, "changed": 1, "unchanged": 2, "new_tests": 1,
+                               "todas_rows": 1, "todas_cells": 2}
+    assert diff["total"] == 4 and len(diff["cells"]) == 2
+    first = diff["cells"][0]
+    assert (first["row"], first["clinica"], first["status"], first["todas"]) == (2, "Sede A", "changed", True)
+    assert first["old"]["ingreso"] == 1 and first["new"]["ingreso"] == 30
+    assert first["changed_fields"] == ["ingreso", "periodico", "retiro"]
+
+    inserted = preview_import_rows(db, rows, diff_status="inserted")["diff"]
+    assert inserted["total"] == 1 and inserted["cells"][0]["test_id"] is None
+    assert db.query(Price).count() == 3  # no escribe nada
+
+
+def test_preview_endpoint_paginates_diff(client, db, tmp_path):
+    _seed(db)
+    path = _xlsx(tmp_path / "p.xlsx", [["Hemograma", "Lab", "TODAS", 9, 9, 9], ["Hemograma", "Lab", "Nope", 1, 1, 1]])
+    app.dependency_overrides[require_user] = lambda: ("1", "test@example.com")
+    app.dependency_overrides[get_db] = lambda: db
+    try:
+        with open(path, "rb") as f:
+            r = client.post("/api/prices/preview?diff_offset=1&diff_limit=1", files={"file": ("p.xlsx", f)})
+    finally:
+        app.dependency_overrides.pop(require_user, None)
+        app.dependency_overrides.pop(get_db, None)
+    assert r.status_code == 200
+    data = r.json()
+    assert (data["validCount"], data["invalidCount"]) == (1, 1)
+    assert data["rows"][1]["row"] == 3 and data["rows"][1]["valid"] is False
+    assert data["diff"]["summary"]["changed"] == 1 and data["diff"]["summary"]["inserted"] == 1
+    assert [c["clinica"] for c in data["diff"]["cells"]] == ["Sede B"]
+
+
+def test_non_numeric_amounts_are_rejected_with_row_number(db, tmp_path):
+    t, a, _ = _seed(db)
+    path = _xlsx(tmp_path / "p.xlsx", [
+        ["Hemograma", "Lab", "Sede A", "x", 5, 5],  # antes se importaba como 0
+        ["Hemograma", "Lab", "Lima", 45, 45, 45],
+    ])
+    reported = []
+    importer = import_prices_from_xlsx(db, path, on_error=lambda row, msg: reported.append((row, msg)))
+    db.commit()
+    db.expire_all()
+    assert importer.errors == ["Fila 2: Ingreso, periódico o retiro deben ser números"]
+    assert reported == [(2, "Ingreso, periódico o retiro deben ser números")]
+    assert _prices(db, "Hemograma") == {(a.id, 1), (None, 45)}  # el precio de Sede A no se pisa
+
+
+def test_preview_diff_matches_what_import_writes(db):
+    _, a, b = _seed(db)
+    rows = [
+        {"row": 2, **_row("Hemograma", "TODAS", 30)},
+        {"row": 3, **_row("Hemograma", "Sede A", "x")},  # monto inválido: ni diff ni importación
+        {"row": 4, **_row("Urea", "Lima", 7)},
+        {"row": 5, **_row("", "Lima", 7)},
+    ]
+    preview = preview_import_rows(db, rows, diff_limit=100)
+    assert [r["valid"] for r in preview["rows"]] == [True, False, True, False]
+    assert preview["rows"][1]["error"] == "Ingreso, periódico o retiro deben ser números"
+    planned = {(c["prueba"], c["clinica"], c["new"]["ingreso"]) for c in preview["diff"]["cells"]}
+
+    done, errors = import_prices_from_rows(db, rows)
+    db.commit()
+    db.expire_all()
+    names = {a.id: "Sede A", b.id: "Sede B", None: "Lima"}
+    written = {
+        (t.name, names[p.clinic_id], p.ingreso)
+        for p, t in db.query(Price, Test).join(Test, Price.test_id == Test.id)
+    }
+    assert done == preview["diff"]["summary"]["cells"] == len(planned)
+    assert planned <= written
+    assert written - planned == {("Hemograma", "Lima", 1)}  # precio previo que no se toca
+    assert errors == ["Fila 3: Ingreso, periódico o retiro deben ser números", "Fila 5: Falta prueba o categoría"]
@@ -0,0 +1,138 @@
+# tests/test_price_import_jobs.py
+"""Importación de precios en segundo plano: avance, reporte de errores, cancelación con rollback y cola acotada."""
+import csv
+import io
+import os
+import time
+
+import pytest
+from openpyxl import Workbook
+
+from app.dependencies import require_user
+from app.main import app
+from app.models.db_models import Clinic, Price, Test
+from app.services.price_import_jobs import ImportQueueFull, PriceImportJobQueue
+
+
+def _xlsx_bytes(rows):
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Precios")
+    ws.append(["prueba", "categoria", "clinica", "ingreso", "periodico", "retiro"])
+    for r in rows:
+        ws.append(r)
+    buf = io.BytesIO()
+    wb.save(buf)
+    return buf.getvalue()
+
+
+ROWS = [
+    ["Hemograma", "Lab", "Lima", 40, 40, 40],
+    ["Glucosa", "Lab", "TODAS", 12, 12, 12],
+    ["Urea", "Lab", "Sede X", 1, 1, 1],
+]
+
+
+@pytest.fixture
+def seeded(use_memory_db):
+    with use_memory_db() as db:
+        db.add_all([Clinic(name="Sede A"), Clinic(name="Sede B")])
+        db.commit()
+    return use_memory_db
+
+
+@pytest.fixture
+def jobs(monkeypatch):
+    q = PriceImportJobQueue(workers=1, max_queued=2)
+    monkeypatch.setattr("app.routers.prices.price_import_jobs", q)
+    yield q
+    q.shutdown()
+
+
+@pytest.fixture
+def authed_client(client):
+    user = {"id": "1"}
+    app.dependency_overrides[require_user] = lambda: (user["id"], "test@example.com")
+    client.user = user
+    yield client
+    app.dependency_overrides.pop(require_user, None)
+
+
+def _wait(client, job_id, timeout=30.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        data = client.get(f"/api/prices/import-jobs/{job_id}").json()
+        if data["status"] not in ("queued", "running"):
+            return data
+        time.sleep(0.05)
+    raise AssertionError("la importación no terminó")
+
+
+def _spooled(tmp_path, rows=ROWS):
+    path = tmp_path / "precios.xlsx"
+    path.write_bytes(_xlsx_bytes(rows))
+    return str(path)
+
+
+def test_import_job_lifecycle_and_error_report(authed_client, seeded, jobs):
+    r = authed_client.post("/api/prices/import-jobs", files={"file": ("proveedor.xlsx", _xlsx_bytes(ROWS))})
+    assert r.status_code == 202
+    job_id = r.json()["id"]
+
+    data = _wait(authed_client, job_id)
+    assert data["status"] == "done"
+    assert (data["rows_parsed"], data["cells_applied"], data["error_count"]) == (3, 3, 1)
+    assert data["tests_created"] == 2 and data["rows_per_second"] > 0
+    assert data["errors"] == ["Fila 4: Clínica no encontrada: Sede X"]
+    with seeded() as db:
+        assert db.query(Price).count() == 3
+
+    r = authed_client.get(f"/api/prices/import-jobs/{job_id}/errors")
+    assert r.status_code == 200
+    assert r.headers["content-disposition"] == 'attachment; filename="errores_proveedor.csv"'
+    rows = list(csv.reader(io.StringIO(r.content.decode("utf-8-sig"))))
+    assert rows == [["fila", "error"], ["4", "Clínica no encontrada: Sede X"]]
+    assert authed_client.post(f"/api/prices/import-jobs/{job_id}/cancel").status_code == 409
+    assert jobs.stats()["completed"] == 1
+
+    authed_client.user["id"] = "2"
+    assert authed_client.get(f"/api/prices/import-jobs/{job_id}").status_code == 404
+
+
+def test_import_job_rejects_bad_uploads(authed_client, seeded, jobs):
+    assert authed_client.post("/api/prices/import-jobs", files={"file": ("p.csv", b"a,b")}).status_code == 400
+    r = authed_client.post("/api/prices/import-jobs", files={"file": ("p.xlsx", b"no es xlsx")})
+    assert _wait(authed_client, r.json()["id"])["error"] == "El archivo no es válido."
+
+
+def test_cancel_running_rolls_back(seeded, monkeypatch, tmp_path):
+    q = PriceImportJobQueue(workers=1, max_queued=2)
+    monkeypatch.setattr(q, "_ensure_workers", lambda: None)
+    job = q.submit(_spooled(tmp_path), owner="1", file_name="precios.xlsx")
+    progress = q._progress
+
+    def cancel_on_progress(job, importer):
+        q.cancel(job)  # en curso: solo marca; el aviso lanza ImportCancelled
+        progress(job, importer)
+
+    monkeypatch.setattr(q, "_progress", cancel_on_progress)
+    q._run(job)
+    assert job.status == "cancelled" and job.cells_applied == 3
+    assert not os.path.exists(str(tmp_path / "precios.xlsx"))
+    with seeded() as db:
+        assert db.query(Price).count() == 0 and db.query(Test).count() == 0
+    assert q.stats()["cancelled"] == 1
+
+
+def test_bounded_queue_and_queued_cancel(monkeypatch, tmp_path):
+    q = PriceImportJobQueue(workers=1, max_queued=1)
+    monkeypatch.setattr(q, "_ensure_workers", lambda: None)  # sin workers: los jobs quedan en cola
+    first = q.submit(_spooled(tmp_path), owner="1", file_name="a.xlsx")
+    extra = tmp_path / "b.xlsx"
+    extra.write_bytes(b"x")
+    with pytest.raises(ImportQueueFull):
+        q.submit(str(extra), owner="1", file_name="b.xlsx")
+    assert not extra.exists()
+    q.cancel(first)
+    assert first.status == "cancelled" and first.path is None
+    q._run(first)  # el worker lo saltaría: no corre
+    assert q.stats()["rejected"] == 1 and q.stats()["running"] == 0
@@ -0,0 +1,112 @@
+# tests/test_price_matrix.py
+"""Tests para PriceMatrix: mismas reglas que el catálogo provincia por SQL."""
+import random
+
+import pytest
+
+from app.models.db_models import Clinic, Price, Test
+from app.models.schemas import Selection
+from app.services.catalog_service import _get_catalogs_provincia_bulk
+from app.services.price_matrix import MATRIX_AVAILABLE, PriceMatrix
+from app.services.provincia_max_service import rebuild_provincia_max
+
+pytestmark = pytest.mark.skipif(not MATRIX_AVAILABLE, reason="numpy no instalado")
+
+
+@pytest.fixture
+def random_prices(db):
+    rng = random.Random(7)
+    tests = [Test(name=f"Prueba {i}", category=f"Cat {i % 4}") for i in range(40)]
+    clinics = [Clinic(name=f"Sede {j}") for j in range(6)]
+    db.add_all(tests + clinics)
+    db.flush()
+    for t in tests:
+        for c in clinics:
+            roll = rng.random()
+            if roll < 0.4:
+                continue
+            vals = (0, 0, 0) if roll < 0.5 else tuple(rng.choice([0, 12.5, 33.3, 80]) for _ in range(3))
+            db.add(Price(test_id=t.id, clinic_id=c.id, ingreso=vals[0], periodico=vals[1], retiro=vals[2]))
+    rebuild_provincia_max(db)
+    db.commit()
+    return tests, clinics
+
+
+def test_catalogs_match_sql(db, random_prices):
+    names = [f"Sede {j}" for j in range(6)] + ["Sin sede"]
+    matrix = PriceMatrix.load(db, revision=0)
+    by_matrix = matrix.catalogs(names, 25)
+    by_sql = _get_catalogs_provincia_bulk(db, names, 25)
+    for n in names:
+        assert [e["id"] for e in by_matrix[n]] == [e["id"] for e in by_sql[n]]
+        for a, b in zip(by_matrix[n], by_sql[n]):
+            assert a["prices"] == pytest.approx(b["prices"])
+
+
+def test_clinic_totals_match_catalog_sum(db, random_prices):
+    tests, _ = random_prices
+    sels = [
+        Selection(id=i, testId=t.id, name=t.name, category=t.category, protocol="P",
+                  types=["ingreso", "retiro"], prices={},
+                  classification="adicional" if i == 3 else None,
+                  overrides={"retiro": 5.0} if i == 4 else None)
+        for i, t in enumerate(tests[:10])
+    ]
+    names = ["Sede 0", "Sede 5"]
+    matrix = PriceMatrix.load(db, revision=0)
+    totals = matrix.clinic_totals(sels, names, 20)
+    catalogs = _get_catalogs_provincia_bulk(db, names, 20)
+    for k, n in enumerate(names):
+        by_name = {e["name"]: e["prices"] for e in catalogs[n]}
+        expected = [0.0, 0.0, 0.0]
+        for s in sels:
+            if s.classification:
+                continue
+            for t in s.types:
+                v = (s.overrides or {}).get(t, by_name[s.name][t])
+                expected[("ingreso", "periodico", "retiro").index(t)] += v
+        assert totals[k].tolist() == pytest.approx(expected)
+
+
+def test_simulate_grid_matches_clinic_totals(db, random_prices):
+    from app.models.schemas import SimulationItem
+
+    tests, _ = random_prices
+    items = [SimulationItem(name=t.name, types=["ingreso", "periodico"]) for t in tests[:8]]
+    items.append(SimulationItem(name=tests[9].name, types=["ingreso"], classification="condicional"))
+    names = ["Sede 1", "Sede 2", "Desconocida"]
+    matrix = PriceMatrix.load(db, revision=0)
+    sim = matrix.simulate(items, names, [20, 35])
+    assert sim["totals"].shape == (2, 3, 3)
+    for mi, margin in enumerate([20, 35]):
+        expected = matrix.clinic_totals(items, names, margin)
+        assert sim["totals"][mi].ravel().tolist() == pytest.approx(expected.ravel().tolist())
+    assert sim["fallback"].tolist()[2] == 8  # sede desconocida: todo por fallback
+
+
+def test_half_cent_ties_round_like_sql(db):
+    # 277.94 × 1.25 = 347.425: np.round da 347.42, round() de Python 347.43
+    t = Test(name="Empate", category="Lab")
+    c = Clinic(name="Sede T")
+    db.add_all([t, c])
+    db.flush()
+    db.add(Price(test_id=t.id, clinic_id=c.id, ingreso=277.94, periodico=0.1, retiro=1.005))
+    rebuild_provincia_max(db)
+    db.commit()
+    matrix = PriceMatrix.load(db, revision=0)
+    by_sql = _get_catalogs_provincia_bulk(db, ["Sede T"], 25)["Sede T"]
+    assert by_sql[0]["prices"]["ingreso"] == 347.43
+    assert matrix.catalogs(["Sede T"], 25)["Sede T"] == by_sql
+    assert matrix.simulate([Selection(id=1, testId=t.id, name="Empate", category="Lab", protocol="P",
+                                      types=["ingreso"], prices={})], ["Sede T"], [25])["totals"][0, 0, 0] == 347.43
+
+
+def test_round_prices_matches_round_on_two_decimal_grid():
+    import numpy as np
+
+    from app.services.price_matrix import round_prices
+
+    values = np.arange(1, 100_001, dtype=np.float64) / 100
+    for margin in (20, 25, 35):
+        priced = values * (1 + margin / 100)
+        assert round_prices(priced).tolist() == [round(v, 2) for v in priced.tolist()]
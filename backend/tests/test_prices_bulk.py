@@ -0,0 +1,97 @@
+# tests/test_prices_bulk.py
+"""PATCH /api/prices/bulk: upsert nativo (provincia), UPDATE + INSERT para Lima, errores por celda."""
+from app.database import get_db
+from app.dependencies import require_user
+from app.main import app
+from app.models.db_models import CatalogChange, Clinic, Price, ProvinciaMaxPrice, Test
+from app.services.price_upsert_service import PriceCell, apply_price_cells, upsert_price_cells
+
+
+def _seed(db):
+    t1, t2 = Test(name="Hemograma", category="Lab"), Test(name="Audiometría", category="Aud")
+    a, b = Clinic(name="Sede A"), Clinic(name="Sede B")
+    db.add_all([t1, t2, a, b])
+    db.flush()
+    db.add_all([
+        Price(test_id=t1.id, clinic_id=a.id, ingreso=10, periodico=10, retiro=10),
+        Price(test_id=t1.id, clinic_id=None, ingreso=50, periodico=50, retiro=50),
+    ])
+    db.commit()
+    return t1, t2, a, b
+
+
+def _price(db, test_id, clinic_id):
+    q = db.query(Price).filter(Price.test_id == test_id)
+    q = q.filter(Price.clinic_id.is_(None)) if clinic_id is None else q.filter(Price.clinic_id == clinic_id)
+    return q.all()
+
+
+def test_upsert_cells_lima_and_provincia(db):
+    t1, t2, a, b = _seed(db)
+    counts = upsert_price_cells(db, [
+        PriceCell(t1.id, a.id, 11, 12, 13, True),
+        PriceCell(t1.id, b.id, 20, 20, 20),
+        PriceCell(t1.id, None, 55, 55, 55),
+        PriceCell(t2.id, None, 30, 30, 30),
+    ])
+    db.commit()
+    db.expire_all()
+    assert counts == (2, 2)
+    p = _price(db, t1.id, a.id)[0]
+    assert (p.ingreso, p.periodico, p.retiro, p.no_realiza) == (11, 12, 13, True)
+    assert len(_price(db, t1.id, None)) == 1 and _price(db, t1.id, None)[0].ingreso == 55
+    assert _price(db, t2.id, None)[0].retiro == 30
+    assert db.query(Price).count() == 4
+
+
+def test_upsert_cells_keeps_unlisted_columns(db):
+    t1, _, a, _ = _seed(db)
+    _price(db, t1.id, a.id)[0].no_realiza = True
+    db.commit()
+    upsert_price_cells(db, [PriceCell(t1.id, a.id, 1, 1, 1)], columns=("ingreso", "periodico", "retiro"))
+    db.commit()
+    db.expire_all()
+    assert _price(db, t1.id, a.id)[0].no_realiza is True
+
+
+def test_apply_cells_results_and_side_effects(db):
+    t1, t2, a, b = _seed(db)
+    results, counts = apply_price_cells(db, [
+        PriceCell(t1.id, a.id, 5, 5, 5),
+        PriceCell(t2.id, b.id, -3, 40, 40),
+        PriceCell(999, None, 1, 1, 1),
+        PriceCell(t1.id, 999, 1, 1, 1),
+        PriceCell(t1.id, a.id, 25, 25, 25),
+    ])
+    db.commit()
+    db.expire_all()
+    assert [r["status"] for r in results] == ["duplicate", "inserted", "error", "error", "updated"]
+    assert counts == (1, 1)
+    assert _price(db, t1.id, a.id)[0].ingreso == 25  # gana la última
+    assert _price(db, t2.id, b.id)[0].ingreso == 0  # negativos a 0
+    assert db.get(ProvinciaMaxPrice, t1.id).ingreso == 25
+    assert db.get(ProvinciaMaxPrice, t2.id).periodico == 40
+    assert {c.test_id for c in db.query(CatalogChange)} == {t1.id, t2.id}
+
+
+def test_bulk_endpoint(client, db):
+    t1, t2, a, _ = _seed(db)
+    app.dependency_overrides[require_user] = lambda: ("1", "test@example.com")
+    app.dependency_overrides[get_db] = lambda: db
+    try:
+        r = client.patch("/api/prices/bulk", json=[
+            {"test_id": t1.id, "clinic_id": None, "ingreso": 60, "periodico": 60, "retiro": 60},
+            {"test_id": t2.id, "clinic_id": a.id, "ingreso": 8, "periodico": 8, "retiro": 8, "no_realiza": True},
+            {"test_id": 999, "clinic_id": a.id},
+        ])
+        empty = client.patch("/api/prices/bulk", json=[])
+    finally:
+        app.dependency_overrides.pop(require_user, None)
+        app.dependency_overrides.pop(get_db, None)
+    assert r.status_code == 200
+    data = r.json()
+    assert (data["inserted"], data["updated"], data["errors"]) == (1, 1, 1)
+    assert data["results"][2]["error"] == "Prueba no encontrada."
+    db.expire_all()
+    assert _price(db, t1.id, None)[0].ingreso == 60
+    assert empty.status_code == 400
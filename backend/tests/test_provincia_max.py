@@ -0,0 +1,59 @@
+# tests/test_provincia_max.py
+"""Tests para la tabla materializada provincia_max_prices."""
+from app.models.db_models import Clinic, Price, ProvinciaMaxPrice, Test
+from app.services.catalog_service import _get_catalog_provincia
+from app.services.provincia_max_service import rebuild_provincia_max, refresh_provincia_max
+
+
+def _seed(db):
+    t1 = Test(name="Hemograma", category="Laboratorio")
+    t2 = Test(name="Audiometría", category="Audiometría")
+    a, b = Clinic(name="Sede A"), Clinic(name="Sede B")
+    db.add_all([t1, t2, a, b])
+    db.flush()
+    db.add_all([
+        Price(test_id=t1.id, clinic_id=a.id, ingreso=10, periodico=30, retiro=5),
+        Price(test_id=t1.id, clinic_id=b.id, ingreso=20, periodico=15, retiro=5),
+        Price(test_id=t1.id, clinic_id=None, ingreso=99, periodico=99, retiro=99),
+        Price(test_id=t2.id, clinic_id=None, ingreso=40, periodico=40, retiro=40),
+    ])
+    rebuild_provincia_max(db)
+    db.commit()
+    return t1, t2, a, b
+
+
+def test_rebuild_ignores_lima(db):
+    t1, t2, _, _ = _seed(db)
+    m = db.get(ProvinciaMaxPrice, t1.id)
+    assert (m.ingreso, m.periodico, m.retiro) == (20, 30, 5)
+    assert db.get(ProvinciaMaxPrice, t2.id) is None
+
+
+def test_refresh_only_touched_test(db):
+    t1, t2, a, _ = _seed(db)
+    db.add(Price(test_id=t2.id, clinic_id=a.id, ingreso=7, periodico=7, retiro=7))
+    refresh_provincia_max(db, [t2.id])
+    db.commit()
+    assert db.get(ProvinciaMaxPrice, t2.id).ingreso == 7
+    db.query(Price).filter(Price.test_id == t2.id, Price.clinic_id.isnot(None)).delete()
+    refresh_provincia_max(db, [t2.id])
+    db.commit()
+    assert db.get(ProvinciaMaxPrice, t2.id) is None
+
+
+def test_catalog_provincia_uses_fallback(db):
+    _seed(db)
+    catalog = {t["name"]: t["prices"] for t in _get_catalog_provincia(db, "Sede C", 0)}
+    assert catalog["Hemograma"] == {"ingreso": 20, "periodico": 30, "retiro": 5}
+    assert catalog["Audiometría"] == {"ingreso": 0, "periodico": 0, "retiro": 0}
+
+
+def test_bulk_matches_single_clinic(db):
+    from app.services.catalog_service import _get_catalogs_provincia_bulk
+
+    _seed(db)
+    names = ["Sede A", "Sede B", "Sede C", ""]
+    bulk = _get_catalogs_provincia_bulk(db, names, 20)
+    for n in names:
+        assert bulk[n] == _get_catalogs_provincia_bulk(db, [n], 20)[n]
+    assert {t["name"]: t["prices"]["ingreso"] for t in bulk["Sede A"]} == {"Hemograma": 12.0, "Audiometría": 0}
@@ -0,0 +1,45 @@
+# tests/test_render_pool.py
+"""Render de PPTX/XLSX en el pool de procesos."""
+import io
+
+import pytest
+from openpyxl import load_workbook
+from pptx import Presentation
+
+from app.models.schemas import GenerationRequest, Selection
+from app.services import render_pool as render_pool_module
+from app.services.render_pool import RenderPool, RenderPoolBusy
+
+
+def _payload() -> GenerationRequest:
+    return GenerationRequest(
+        company="ACME", recipient="Ana", executive="Luis", location="Lima", proposal_number="5",
+        protocols=[{"name": "P1"}],
+        selections=[Selection(id=1, testId=1, name="Hemograma", category="Lab", protocol="P1",
+                              types=["ingreso"], prices={"ingreso": 10.0})],
+    )
+
+
+def test_pool_renders_both_documents(ppt_template):
+    pool = RenderPool(workers=2, max_in_flight=2)
+    try:
+        pool.start()
+        pptx_bytes, xlsx_bytes = pool.render(_payload())
+    finally:
+        pool.shutdown()
+    prs = Presentation(io.BytesIO(pptx_bytes))
+    table = next(sp for s in prs.slides for sp in s.shapes if sp.has_table).table
+    assert table.cell(2, 0).text == "Hemograma"
+    assert "ACME" in prs.slides[0].shapes[0].text_frame.text
+    assert load_workbook(io.BytesIO(xlsx_bytes)).active["B2"].value == "Hemograma"
+    assert pool.stats()["rendered"] == 1 and pool.stats()["in_flight"] == 0
+
+
+def test_pool_rejects_when_full(monkeypatch):
+    monkeypatch.setattr(render_pool_module, "RENDER_WAIT_SECONDS", 0.01)
+    pool = RenderPool(workers=1, max_in_flight=1)
+    pool._slots.acquire()  # una cotización ya en curso
+    with pytest.raises(RenderPoolBusy):
+        pool.render(_payload())
+    assert pool.stats()["rejected"] == 1
+    pool._slots.release()
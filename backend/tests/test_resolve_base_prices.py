@@ -0,0 +1,47 @@
+# tests/test_resolve_base_prices.py
+"""Tests: resolve_base_prices (por lotes) == _get_base_prices_provincia (por prueba)."""
+import random
+
+from sqlalchemy import event
+
+from app.models.db_models import Clinic, Price, Test
+from app.services.catalog_service import _get_base_prices_provincia, resolve_base_prices
+from app.services.provincia_max_service import rebuild_provincia_max
+
+
+def _seed_random(db, seed: int):
+    rng = random.Random(seed)
+    tests = [Test(name=f"Prueba {i}", category="Laboratorio") for i in range(30)]
+    clinics = [Clinic(name=f"Sede {j}") for j in range(4)]
+    db.add_all(tests + clinics)
+    db.flush()
+    for t in tests:
+        for cid in [None] + [c.id for c in clinics]:
+            if rng.random() < 0.5:
+                continue
+            vals = [rng.choice([0, 0, 15.5, 40, 72.25]) for _ in range(3)]
+            db.add(Price(test_id=t.id, clinic_id=cid, ingreso=vals[0], periodico=vals[1], retiro=vals[2]))
+    rebuild_provincia_max(db)
+    db.commit()
+    return [t.id for t in tests], [c.id for c in clinics]
+
+
+def test_matches_scalar_version(db):
+    test_ids, clinic_ids = _seed_random(db, seed=3)
+    ids = test_ids + [999999]  # prueba inexistente -> None
+    for clinic_id in [None, 999999] + clinic_ids:
+        batched = resolve_base_prices(db, ids, clinic_id)
+        for tid in ids:
+            assert batched[tid] == _get_base_prices_provincia(db, tid, clinic_id), (tid, clinic_id)
+
+
+def test_at_most_three_queries(db):
+    test_ids, clinic_ids = _seed_random(db, seed=5)
+    statements = []
+    listener = lambda *args: statements.append(args[2])  # noqa: E731
+    event.listen(db.get_bind(), "before_cursor_execute", listener)
+    try:
+        resolve_base_prices(db, test_ids, clinic_ids[0])
+    finally:
+        event.remove(db.get_bind(), "before_cursor_execute", listener)
+    assert len(statements) <= 3
@@ -0,0 +1,92 @@
+# tests/test_table_xml.py
+"""Equivalencia visual: el emisor XML produce la misma tabla que el constructor python-pptx."""
+import pytest
+from lxml import etree
+from pptx import Presentation
+from pptx.util import Inches
+
+from app.models.schemas import ClinicTotal, GenerationRequest, Selection
+from app.services.docgen import build, build_ppt, config
+from app.services.docgen.table_builder import add_unified_table
+from app.services.docgen.table_xml import emit_unified_table
+
+RECT = (Inches(0.5), Inches(1), Inches(9), Inches(4))
+
+
+def _render(fn, **kw) -> bytes:
+    prs = Presentation()
+    slide = prs.slides.add_slide(prs.slide_layouts[6])
+    fn(slide, RECT, **kw)
+    return etree.tostring(slide.shapes[0]._element, method="c14n")
+
+
+def _args(n_tests=5, clinics=True, cra=True, group_defs=None):
+    names = [f"Prueba {i}" for i in range(n_tests)] + ["Línea 1\nLínea 2\vsalto & <x> \x07"]
+    return dict(
+        group_defs=group_defs or [("Operarios", ["ingreso", "periodico", "retiro"]), ("Admin", ["ingreso"])],
+        tests_with_meta=[(n, n, False) for n in names],
+        get_val=lambda n, p, t: "X" if (len(n) + len(t)) % 3 else "-",
+        get_num_val=lambda n, p, t: 12.5 if t != "retiro" else None,
+        get_cra_price=lambda n, p, t: "S/ 3.00",
+        skip_total_row=False,
+        clinic_totals=[ClinicTotal(clinic="Sede A", ingreso=10, periodico=0, retiro=2.5)] if clinics else [],
+        cra_items=[("C", "Rx tórax", "Imagen", "Según puesto", "condicional")] if cra else [],
+    )
+
+
+@pytest.mark.parametrize(
+    "kw",
+    [
+        _args(),
+        _args(clinics=False),
+        _args(cra=False),
+        _args(clinics=False, cra=False),
+        _args(n_tests=60, group_defs=[("P", ["retiro"])]),
+    ],
+)
+def test_xml_emitter_matches_pptx_builder(kw):
+    assert _render(emit_unified_table, **kw) == _render(add_unified_table, **kw)
+
+
+def test_xml_emitter_cell_properties():
+    prs = Presentation()
+    slide = prs.slides.add_slide(prs.slide_layouts[6])
+    emit_unified_table(slide, RECT, **_args())
+    table = slide.shapes[0].table
+    header = table.cell(0, 0)
+    assert header.text == "NOMBRE DE PRUEBA" and header.span_height == 2
+    assert header.text_frame.paragraphs[0].font.bold
+    assert table.cell(0, 1).span_width == 3 and table.cell(0, 2).is_spanned
+    assert table.cell(2, 0).margin_left == 0 and table.cell(2, 0).text_frame.word_wrap
+    assert table.cell(7, 0).text == "Línea 1\nLínea 2\vsalto & <x> _x0007_"
+
+
+def _payload():
+    return GenerationRequest(
+        company="ACME", recipient="Ana", executive="Luis", location="Lima", proposal_number="9",
+        protocols=[{"name": "P1"}],
+        selections=[Selection(id=1, testId=1, name="Hemograma", category="Lab", protocol="P1",
+                              types=["ingreso"], prices={"ingreso": 10.0})],
+    )
+
+
+def test_build_ppt_falls_back_to_pptx_builder(ppt_template, tmp_path, monkeypatch):
+    def broken(**kw):
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(build, "emit_unified_table", broken)
+    out = str(tmp_path / "out.pptx")
+    build_ppt(_payload(), out)
+    tables = [sp for s in Presentation(out).slides for sp in s.shapes if sp.has_table]
+    assert len(tables) == 1 and tables[0].table.cell(2, 0).text == "Hemograma"
+
+
+def test_build_ppt_same_output_with_either_emitter(ppt_template, tmp_path, monkeypatch):
+    outputs = []
+    for emitter in ("xml", "pptx"):
+        monkeypatch.setattr(config, "PPT_TABLE_EMITTER", emitter)
+        out = tmp_path / f"{emitter}.pptx"
+        build_ppt(_payload(), str(out))
+        table = next(sp for s in Presentation(str(out)).slides for sp in s.shapes if sp.has_table)
+        outputs.append(etree.tostring(table._element, method="c14n"))
+    assert outputs[0] == outputs[1]
@@ -0,0 +1,74 @@
+# tests/test_template_pool.py
+"""Tests para la plantilla PPT precargada en memoria."""
+import os
+
+from pptx import Presentation
+
+from app.models.schemas import GenerationRequest, Selection
+from app.services.docgen import build_ppt, template_pool
+from app.services.docgen.helpers import fill_cover_fields, find_table_anchor
+
+from .conftest import make_ppt_template
+
+
+def _payload(**kw) -> GenerationRequest:
+    data = dict(
+        company="ACME SAC", recipient="Ana", executive="Luis", location="Lima",
+        proposal_number="123", protocols=[{"name": "P1"}],
+        selections=[Selection(id=1, testId=1, name="Hemograma", category="Lab", protocol="P1",
+                              types=["ingreso"], prices={"ingreso": 10.0})],
+    )
+    data.update(kw)
+    return GenerationRequest(**data)
+
+
+def _texts(prs):
+    return [[sp.text_frame.text for sp in s.shapes if sp.has_text_frame] for s in prs.slides]
+
+
+def test_snapshot_locates_anchor_and_markers(ppt_template):
+    snap = template_pool.get()
+    assert snap.anchor_slide == 1 and snap.anchor_shape == 0
+    assert snap.marker_shapes == ((0, 0), (1, 1))
+    assert snap.load_ms > 0
+    assert template_pool.get() is snap  # sin cambios: sin recarga
+
+
+def test_pool_matches_reparsing_template(ppt_template):
+    payload = _payload()
+    prs, snap = template_pool.open()
+    fill_cover_fields(prs, payload, snap.marker_shapes)
+    ref = Presentation(ppt_template)
+    fill_cover_fields(ref, payload)
+    assert _texts(prs) == _texts(ref)
+    ref_slide, ref_rect, _ = find_table_anchor(ref)
+    assert ref_rect == snap.anchor_rect
+
+
+def test_build_ppt_uses_clone(ppt_template, tmp_path):
+    out = str(tmp_path / "out.pptx")
+    build_ppt(_payload(), out)
+    build_ppt(_payload(company="Otra"), out)
+    texts = _texts(Presentation(out))
+    assert "Propuesta 123 para Otra" in texts[0][0]
+    assert "{{TABLA}}" not in str(texts)
+    assert template_pool.stats()["clones"] >= 2
+    # La plantilla en memoria no se modifica
+    assert "{{RAZON_SOCIAL}}" in _texts(template_pool.open()[0])[0][0]
+
+
+def test_reload_on_file_change(ppt_template):
+    first = template_pool.get()
+    loads = template_pool.loads
+    st = os.stat(ppt_template)
+    os.utime(ppt_template, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    touched = template_pool.get()
+    assert touched.checksum == first.checksum and touched.mtime_ns != first.mtime_ns
+    assert template_pool.loads == loads  # mismo contenido: no se vuelve a analizar
+
+    make_ppt_template(ppt_template, extra_slides=1)
+    os.utime(ppt_template, ns=(st.st_atime_ns, st.st_mtime_ns + 2 * 10**9))
+    changed = template_pool.get()
+    assert changed.checksum != first.checksum
+    assert changed.anchor_slide == 2
+    assert template_pool.loads == loads + 1
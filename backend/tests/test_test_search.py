@@ -0,0 +1,30 @@
+# tests/test_test_search.py
+"""Tests para la búsqueda de pruebas sin tildes."""
+from app.services.test_search import SearchIndex, normalize_text
+
+
+def _index():
+    tests = [
+        (1, "Hemoglobína glicosilada", "Laboratorio"),
+        (2, "Hemograma completo", "Laboratorio"),
+        (3, "Perfil hemoglobina", "Laboratorio"),
+        (4, "Hemoglobina", "Laboratorio"),
+        (5, "Audiometría", "Audiometría"),
+    ]
+    return SearchIndex(0, tests, ["Sede A"])
+
+
+def test_normalize_text():
+    assert normalize_text("  Hemoglobína   GLICOSILADA ") == "hemoglobina glicosilada"
+
+
+def test_accent_insensitive_and_ranked():
+    ids = [e.id for e in _index().search("hemoglobina")]
+    assert ids == [4, 1, 3]  # exacta, prefijo, palabra
+    assert [e.id for e in _index().search("AUDIOMETRIA")] == [5]
+
+
+def test_every_word_must_match():
+    assert [e.id for e in _index().search("glicosilada hemo")] == [1]
+    assert [e.id for e in _index().search("hemo")] == [4, 2, 1, 3]
+    assert _index().search("xyz") == []
@@ -0,0 +1,89 @@
+# tests/test_xlsx_generator.py
+"""Resumen XLSX write_only: hoja de selecciones, totales por clínica y comparación prueba × sede."""
+import io
+
+import pytest
+from openpyxl import load_workbook
+
+from app.models.db_models import Clinic, Price, Test
+from app.models.schemas import ClinicTotal, GenerationRequest, Selection
+from app.services import generator_service
+from app.services.catalog_service import get_catalogs_bulk
+from app.services.price_matrix import MATRIX_AVAILABLE
+from app.services.provincia_max_service import rebuild_provincia_max
+from app.utils.xlsx_generator import create_xlsx
+
+
+def _sel(i, name, types, classification=None, overrides=None):
+    return Selection(id=i, testId=i, name=name, category="Lab", protocol="P1", types=types,
+                     prices={t: 10.0 * i for t in types}, classification=classification, overrides=overrides)
+
+
+def _request(**extra):
+    return GenerationRequest(
+        company="ACME", recipient="Ana", executive="Luis", location="Provincia", proposal_number="5",
+        protocols=[{"name": "P1"}],
+        selections=[_sel(1, "Hemograma", ["ingreso", "retiro"]), _sel(2, "Audiometría", ["ingreso"], "adicional")],
+        **extra,
+    )
+
+
+def _load(req):
+    buf = io.BytesIO()
+    create_xlsx(req, buf)
+    buf.seek(0)
+    return load_workbook(buf)
+
+
+def test_summary_only_without_clinics():
+    wb = _load(_request())
+    assert wb.sheetnames == ["Resumen"]
+    rows = list(wb["Resumen"].iter_rows(values_only=True))
+    assert rows[0] == ("Protocolo", "Prueba", "Tipo", "Precio", "Clasificación", "Detalle", "Override", "Suma?")
+    assert rows[1][:4] == ("P1", "Hemograma", "Ingreso", 10)
+    assert rows[3][-1] == 0  # adicional no suma
+    assert wb["Resumen"]["A1"].font.bold
+
+
+def test_clinic_sheets():
+    req = _request(
+        clinics=["Arequipa", "Cusco"],
+        clinic_totals=[ClinicTotal(clinic="Arequipa", ingreso=30, retiro=5), ClinicTotal(clinic="Cusco", ingreso=20)],
+        clinic_prices={
+            "Hemograma": {"Arequipa": {"ingreso": 30, "periodico": 0, "retiro": 5},
+                          "Cusco": {"ingreso": 20, "periodico": 0, "retiro": 8}},
+            "Audiometría": {"Arequipa": {"ingreso": 15, "periodico": 0, "retiro": 0},
+                            "Cusco": {"ingreso": 12, "periodico": 0, "retiro": 0}},
+        },
+    )
+    wb = _load(req)
+    assert wb.sheetnames == ["Resumen", "Totales por clínica", "Comparación por clínica"]
+    totals = list(wb["Totales por clínica"].iter_rows(values_only=True))
+    assert totals[1] == ("Arequipa", 30, 0, 5, 35)
+    cmp_rows = list(wb["Comparación por clínica"].iter_rows(values_only=True))
+    assert cmp_rows[0] == ("Prueba", "Tipo", "C/R/A", "Arequipa", "Cusco", "Mínimo", "Máximo", "Sede más barata")
+    assert cmp_rows[1] == ("Hemograma", "Ingreso", None, 30, 20, 20, 30, "Cusco")
+    assert cmp_rows[2] == ("Hemograma", "Retiro", None, 5, 8, 5, 8, "Arequipa")
+    assert cmp_rows[3][:3] == ("Audiometría", "Ingreso", "Sí")
+
+
+@pytest.mark.skipif(not MATRIX_AVAILABLE, reason="numpy no instalado")
+def test_clinic_prices_matrix_matches_catalogs(use_memory_db, monkeypatch):
+    with use_memory_db() as db:
+        tests = [Test(name="Hemograma", category="Lab"), Test(name="Audiometría", category="Aud")]
+        clinics = [Clinic(name="Arequipa"), Clinic(name="Cusco")]
+        db.add_all(tests + clinics)
+        db.flush()
+        db.add(Price(test_id=tests[0].id, clinic_id=clinics[0].id, ingreso=25, periodico=20, retiro=10))
+        db.add(Price(test_id=tests[1].id, clinic_id=clinics[1].id, ingreso=40, periodico=0, retiro=0))
+        rebuild_provincia_max(db)
+        db.commit()
+    req = _request(clinics=["Arequipa", "Cusco", "Sin sede"], margin=30)
+    req.selections[1].overrides = {"ingreso": 7.0}
+
+    by_matrix = generator_service.compute_quote_clinic_prices(req, {})
+    monkeypatch.setattr(generator_service, "MATRIX_AVAILABLE", False)
+    catalogs = get_catalogs_bulk("Provincia", req.clinics, req.margin)
+    assert generator_service.compute_quote_clinic_prices(req, catalogs) == by_matrix
+    assert by_matrix["Hemograma"]["Arequipa"]["ingreso"] == 32.5
+    assert by_matrix["Audiometría"]["Cusco"]["ingreso"] == 7.0
@@ -1,6 +1,6 @@
 import { api } from './client';
 import type { Test } from '@/types';
-import type { Location } from '@/types';
+import type { Location, PriceType } from '@/types';
 
 export type ClinicWithId = { id: number; name: string };
 
@@ -27,3 +27,61 @@ export async function getCatalog(params: {
   const r = await api.get<{ catalog: Test[] }>('/api/catalog', { params });
   return r.data?.catalog ?? [];
 }
+
+/** Catálogos de varias sedes en una sola llamada ({ sede: catálogo }). */
+export async function getCatalogsBulk(params: {
+  location: Location;
+  clinics: string[];
+  margin?: number;
+}): Promise<Record<string, Test[]>> {
+  const r = await api.get<{ catalogs: Record<string, Test[]> }>('/api/catalog/bulk', {
+    params,
+    paramsSerializer: { indexes: null },
+  });
+  return r.data?.catalogs ?? {};
+}
+
+export type CatalogChanges =
+  | { revision: number; full: true; catalog: Test[] }
+  | { revision: number; full: false; upserted: Test[]; deleted: number[] };
+
+/** Delta-sync: cambios del catálogo desde la revisión `since` (full=true => snapshot completo). */
+export async function getCatalogChanges(params: {
+  since: number;
+  location: Location;
+  clinic?: string;
+  margin?: number;
+}): Promise<CatalogChanges> {
+  const r = await api.get<CatalogChanges>('/api/catalog/changes', { params });
+  return r.data;
+}
+
+export type SimulationRow = {
+  clinic: string;
+  known_clinic: boolean;
+  margin: number;
+  ingreso: number;
+  periodico: number;
+  retiro: number;
+  total: number;
+  fallback_tests: number;
+  no_realiza_tests: number;
+};
+
+export type SimulationResult = { margins: number[]; clinics: string[]; rows: SimulationRow[] };
+
+/** What-if Provincia: totales de la selección por margen × sede (ordenados por total). */
+export async function simulateQuote(body: {
+  selections: Array<{
+    name: string;
+    testId?: number;
+    types: PriceType[];
+    classification?: string | null;
+    overrides?: Partial<Record<PriceType, number>> | null;
+  }>;
+  margins: number[];
+  clinics: string[] | 'all';
+}): Promise<SimulationResult> {
+  const r = await api.post<SimulationResult>('/api/catalog/simulate', body);
+  return r.data;
+}
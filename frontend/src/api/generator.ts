@@ -1,5 +1,5 @@
 import { api } from './client';
-import type { GenerationPayload } from '@/types';
+import type { BatchGenerationPayload, GenerationPayload } from '@/types';
 
 export async function createDocuments(payload: GenerationPayload): Promise<Blob> {
   const r = await api.post<Blob>('/api/generator/create', payload, {
@@ -7,3 +7,52 @@ export async function createDocuments(payload: GenerationPayload): Promise<Blob>
   });
   return r.data;
 }
+
+/** ZIP con una carpeta por propuesta y resumen_lote.json (fallos por propuesta incluidos). */
+export async function createBatchDocuments(payload: BatchGenerationPayload): Promise<Blob> {
+  const r = await api.post<Blob>('/api/generator/batch', payload, {
+    responseType: 'blob',
+    timeout: 0,
+  });
+  return r.data;
+}
+
+export type GenerationJobStage = {
+  name: 'catalog' | 'render' | 'zip';
+  status: 'pending' | 'running' | 'done' | 'error';
+  ms: number | null;
+};
+
+export type GenerationJob = {
+  id: string;
+  status: 'queued' | 'running' | 'done' | 'error' | 'expired';
+  stage: string | null;
+  progress: number;
+  stages: GenerationJobStage[];
+  error: string | null;
+  file_name: string | null;
+  size: number | null;
+  cached: boolean;
+  created_at: number;
+  queued_ms: number;
+  total_ms: number | null;
+  expires_at: number | null;
+};
+
+/** Encola la cotización (responde al instante); consultar con getGenerationJob. */
+export async function createGenerationJob(payload: GenerationPayload): Promise<GenerationJob> {
+  const r = await api.post<GenerationJob>('/api/generator/jobs', payload);
+  return r.data;
+}
+
+export async function getGenerationJob(id: string): Promise<GenerationJob> {
+  const r = await api.get<GenerationJob>(`/api/generator/jobs/${id}`);
+  return r.data;
+}
+
+export async function downloadGenerationJob(id: string): Promise<Blob> {
+  const r = await api.get<Blob>(`/api/generator/jobs/${id}/download`, {
+    responseType: 'blob',
+  });
+  return r.data;
+}
@@ -6,25 +6,58 @@ export {
   type RegisterPayload,
   type UserAuthResponse,
 } from './auth';
-export { getClinics, getClinicsWithIds, createClinic, getCatalog, type ClinicWithId } from './catalog';
+export {
+  getClinics,
+  getClinicsWithIds,
+  createClinic,
+  getCatalog,
+  getCatalogsBulk,
+  getCatalogChanges,
+  simulateQuote,
+  type CatalogChanges,
+  type SimulationResult,
+  type SimulationRow,
+  type ClinicWithId,
+} from './catalog';
 export { getNextProposalNumber } from './proposal';
-export { createDocuments } from './generator';
+export {
+  createDocuments,
+  createBatchDocuments,
+  createGenerationJob,
+  getGenerationJob,
+  downloadGenerationJob,
+  type GenerationJob,
+  type GenerationJobStage,
+} from './generator';
 export { getUsers, inviteUser, type UserItem } from './users';
 export {
   downloadPricesTemplate,
   getImportPreview,
   importPricesFile,
+  createPriceImportJob,
+  getPriceImportJob,
+  cancelPriceImportJob,
+  downloadPriceImportErrors,
   getPricesList,
   updatePrice,
+  updatePricesBulk,
   addPrice,
   deletePrice,
   searchTests,
   type ImportPricesResult,
+  type PriceImportJob,
   type ImportPreviewResult,
   type ImportPreviewRow,
+  type ImportPreviewOptions,
+  type ImportDiff,
+  type ImportDiffCell,
+  type ImportDiffStatus,
+  type ImportDiffSummary,
   type PricesListResult,
   type PriceRow,
   type PriceUpdatePayload,
+  type BulkPriceCellResult,
+  type BulkPriceUpdateResult,
   type AddPricePayload,
   type DeletePricePayload,
   type SearchTestResult,
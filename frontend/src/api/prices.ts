@@ -2,10 +2,15 @@ import { API_BASE } from './client';
 
 export type ImportPricesResult = {
   imported: number;
+  /** Mensajes "Fila N: ..." (hasta el tope del servidor); errorCount cuenta todos. */
   errors: string[];
+  errorCount: number;
+  rowsParsed: number;
 };
 
 export type ImportPreviewRow = {
+  /** Número de fila en la hoja de Excel. */
+  row?: number;
   prueba: string;
   categoria: string;
   clinica: string;
@@ -16,10 +21,58 @@ export type ImportPreviewRow = {
   error?: string | null;
 };
 
+export type ImportDiffStatus = 'inserted' | 'changed' | 'unchanged';
+
+export type ImportDiffPrices = { ingreso: number; periodico: number; retiro: number };
+
+/** Una celda (prueba × sede) que escribiría la importación. */
+export type ImportDiffCell = {
+  row: number | null;
+  prueba: string;
+  categoria: string;
+  /** null = prueba nueva (se creará). */
+  test_id: number | null;
+  clinic_id: number | null;
+  clinica: string;
+  /** true si viene de una fila TODAS expandida a esta sede. */
+  todas: boolean;
+  status: ImportDiffStatus;
+  old: ImportDiffPrices | null;
+  new: ImportDiffPrices;
+  changed_fields: (keyof ImportDiffPrices)[];
+};
+
+export type ImportDiffSummary = {
+  cells: number;
+  inserted: number;
+  changed: number;
+  unchanged: number;
+  new_tests: number;
+  todas_rows: number;
+  todas_cells: number;
+};
+
+/** Diff paginado: summary cuenta todo; cells es solo la página pedida. */
+export type ImportDiff = {
+  summary: ImportDiffSummary;
+  status: ImportDiffStatus | null;
+  total: number;
+  offset: number;
+  limit: number;
+  cells: ImportDiffCell[];
+};
+
 export type ImportPreviewResult = {
   rows: ImportPreviewRow[];
   validCount: number;
   invalidCount: number;
+  diff: ImportDiff | null;
+};
+
+export type ImportPreviewOptions = {
+  diffOffset?: number;
+  diffLimit?: number;
+  diffStatus?: ImportDiffStatus;
 };
 
 export type PriceRow = {
@@ -99,6 +152,34 @@ export async function updatePrice(payload: PriceUpdatePayload): Promise<{ id: nu
   return data;
 }
 
+export type BulkPriceCellResult = {
+  index: number;
+  test_id: number;
+  clinic_id: number | null;
+  status: 'inserted' | 'updated' | 'duplicate' | 'error';
+  error: string | null;
+};
+
+export type BulkPriceUpdateResult = {
+  results: BulkPriceCellResult[];
+  inserted: number;
+  updated: number;
+  errors: number;
+};
+
+/** Guarda varias celdas de la grilla en un solo envío (una transacción). Devuelve el resultado por celda. */
+export async function updatePricesBulk(cells: PriceUpdatePayload[]): Promise<BulkPriceUpdateResult> {
+  const res = await fetch(`${API_BASE}/api/prices/bulk`, {
+    method: 'PATCH',
+    headers: { 'Content-Type': 'application/json' },
+    credentials: 'include',
+    body: JSON.stringify(cells),
+  });
+  const data = await res.json().catch(() => ({}));
+  if (!res.ok) throw new Error(data.detail || 'No se pudo guardar.');
+  return data as BulkPriceUpdateResult;
+}
+
 export type AddPricePayload = {
   test_name: string;
   category: string;
@@ -158,11 +239,17 @@ export async function downloadPricesTemplate(): Promise<void> {
   URL.revokeObjectURL(url);
 }
 
-/** Envía el archivo XLSX y obtiene previsualización (filas válidas/inválidas) sin importar. */
-export async function getImportPreview(file: File): Promise<ImportPreviewResult> {
+/** Envía el archivo XLSX y obtiene previsualización (filas válidas/inválidas y diff por celda
+ * contra los precios actuales, paginado) sin importar. */
+export async function getImportPreview(file: File, options: ImportPreviewOptions = {}): Promise<ImportPreviewResult> {
   const form = new FormData();
   form.append('file', file);
-  const res = await fetch(`${API_BASE}/api/prices/preview`, {
+  const params = new URLSearchParams();
+  if (options.diffOffset != null) params.set('diff_offset', String(options.diffOffset));
+  if (options.diffLimit != null) params.set('diff_limit', String(options.diffLimit));
+  if (options.diffStatus) params.set('diff_status', options.diffStatus);
+  const query = params.toString() ? `?${params}` : '';
+  const res = await fetch(`${API_BASE}/api/prices/preview${query}`, {
     method: 'POST',
     body: form,
     credentials: 'include',
@@ -176,6 +263,7 @@ export async function getImportPreview(file: File): Promise<ImportPreviewResult>
     rows: data.rows ?? [],
     validCount: data.validCount ?? 0,
     invalidCount: data.invalidCount ?? 0,
+    diff: data.diff ?? null,
   };
 }
 
@@ -193,5 +281,68 @@ export async function importPricesFile(file: File): Promise<ImportPricesResult>
     const detail = typeof data?.detail === 'string' ? data.detail : 'No se pudo importar el archivo. Verifica el formato e intenta de nuevo.';
     throw new Error(detail);
   }
-  return { imported: data.imported ?? 0, errors: data.errors ?? [] };
+  return {
+    imported: data.imported ?? 0,
+    errors: data.errors ?? [],
+    errorCount: data.errorCount ?? (data.errors ?? []).length,
+    rowsParsed: data.rowsParsed ?? 0,
+  };
+}
+
+export type PriceImportJob = {
+  id: string;
+  status: 'queued' | 'running' | 'done' | 'error' | 'cancelled' | 'expired';
+  file_name: string;
+  rows_parsed: number;
+  cells_applied: number;
+  inserted: number;
+  updated: number;
+  tests_created: number;
+  error_count: number;
+  /** Primeros mensajes "Fila N: ..."; el reporte CSV trae todos. */
+  errors: string[];
+  error: string | null;
+  has_error_report: boolean;
+  rows_per_second: number | null;
+  created_at: number;
+  queued_ms: number;
+  total_ms: number | null;
+  expires_at: number | null;
+};
+
+async function importJobRequest(path: string, init: RequestInit, fallback: string): Promise<PriceImportJob> {
+  const res = await fetch(`${API_BASE}/api/prices/import-jobs${path}`, { credentials: 'include', ...init });
+  const data = await res.json().catch(() => ({}));
+  if (!res.ok) throw new Error(typeof data?.detail === 'string' ? data.detail : fallback);
+  return data as PriceImportJob;
+}
+
+/** Encola la importación de un XLSX grande; consultar con getPriceImportJob. */
+export async function createPriceImportJob(file: File): Promise<PriceImportJob> {
+  const form = new FormData();
+  form.append('file', file);
+  return importJobRequest('', { method: 'POST', body: form }, 'No se pudo iniciar la importación.');
+}
+
+/** Estado de la importación: filas leídas, escritas, errores y filas/s. */
+export async function getPriceImportJob(id: string): Promise<PriceImportJob> {
+  return importJobRequest(`/${id}`, { method: 'GET' }, 'No se pudo consultar la importación.');
+}
+
+/** Cancela la importación (si ya estaba escribiendo, no se guarda nada). */
+export async function cancelPriceImportJob(id: string): Promise<PriceImportJob> {
+  return importJobRequest(`/${id}/cancel`, { method: 'POST' }, 'No se pudo cancelar la importación.');
+}
+
+/** Descarga el reporte CSV (fila, error) de la importación. */
+export async function downloadPriceImportErrors(id: string, fileName = 'errores_importacion.csv'): Promise<void> {
+  const res = await fetch(`${API_BASE}/api/prices/import-jobs/${id}/errors`, { method: 'GET', credentials: 'include' });
+  if (!res.ok) throw new Error('No se pudo descargar el reporte de errores.');
+  const blob = await res.blob();
+  const url = URL.createObjectURL(blob);
+  const a = document.createElement('a');
+  a.href = url;
+  a.download = fileName;
+  a.click();
+  URL.revokeObjectURL(url);
 }
@@ -44,6 +44,8 @@ export async function proxyToBackend(request: NextRequest, pathSegments: string[
     Authorization: `Bearer ${BACKEND_API_SECRET}`,
     'Content-Type': request.headers.get('content-type') || 'application/json',
   };
+  const ifNoneMatch = request.headers.get('if-none-match');
+  if (ifNoneMatch) headers['If-None-Match'] = ifNoneMatch;
   if (session?.user?.id ?? session?.user?.email) {
     headers['X-User-Id'] = String(session.user.id ?? '');
     headers['X-User-Email'] = String(session.user.email ?? '');
@@ -72,6 +74,13 @@ export async function proxyToBackend(request: NextRequest, pathSegments: string[
 
   try {
     const res = await fetch(backendFullUrl, init);
+    const etag = res.headers.get('etag');
+    const cacheHeaders: Record<string, string> = etag
+      ? { ETag: etag, 'Cache-Control': res.headers.get('cache-control') || 'private, no-cache' }
+      : {};
+    if (res.status === 304) {
+      return new NextResponse(null, { status: 304, headers: cacheHeaders });
+    }
     const contentType = res.headers.get('content-type') || '';
     const isJson = contentType.includes('application/json');
     const isBlob =
@@ -92,7 +101,7 @@ export async function proxyToBackend(request: NextRequest, pathSegments: string[
 
     if (isJson) {
       const data = await res.json().catch(() => ({}));
-      return NextResponse.json(data, { status: res.status });
+      return NextResponse.json(data, { status: res.status, headers: cacheHeaders });
     }
 
     const text = await res.text();
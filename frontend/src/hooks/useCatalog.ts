@@ -1,7 +1,7 @@
 'use client';
 
 import { useEffect, useState } from 'react';
-import { getCatalog, getClinics } from '@/api';
+import { getCatalog, getCatalogsBulk, getClinics } from '@/api';
 import type { Location, Test } from '@/types';
 
 export function useCatalog(
@@ -55,14 +55,10 @@ export function useCatalog(
       setPricesByClinic({});
       return;
     }
-    Promise.all(
-      selectedClinics.map((clinicName) =>
-        getCatalog({ location, clinic: clinicName, margin })
-      )
-    ).then((results) => {
+    getCatalogsBulk({ location, clinics: selectedClinics, margin }).then((catalogs) => {
       const res: Record<string, Test[]> = {};
-      selectedClinics.forEach((name, i) => {
-        res[name] = results[i] ?? [];
+      selectedClinics.forEach((name) => {
+        res[name] = catalogs[name] ?? [];
       });
       setPricesByClinic(res);
     });
@@ -14,5 +14,17 @@ export type GenerationPayload = {
   clinics?: string[];         // sedes en provincia para totales por clínica
   margin?: number;            // margen % para sedes en provincia
 };
+/** Portada de una propuesta del lote (ejecutivo/puesto opcionales: si no, los del lote). */
+export type BatchRecipient = {
+  company: string;
+  recipient: string;
+  proposal_number: string;
+  executive?: string;
+  executive_title?: string;
+};
+/** Misma selección cotizada a varias empresas (POST /api/generator/batch). */
+export type BatchGenerationPayload = Omit<GenerationPayload, 'company' | 'recipient' | 'proposal_number'> & {
+  recipients: BatchRecipient[];
+};
 /** Lima = sede Lima de la clínica; Provincia = sedes en provincia */
 export type Location = 'Lima'|'Provincia';